@@ -2,7 +2,7 @@
 
 from pathlib import Path
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 from process_keyboard import ProcessConfiguration
 from process_keyboard import ProcessKeyboard
 import sys, getopt
@@ -15,6 +15,7 @@ def getProcessConfiguration():
     config = ProcessConfiguration()
 
     config.save_mountinghole_filename = base_path / "mounting-hold-data.pkl"
+    config.parse_cache_path = base_path / ".parse-cache"
 
     # Master input file, source of all truth.
     config.plate_layout_path = base_path / "case" / "plate"
@@ -41,8 +42,13 @@ def getProcessConfiguration():
     return config
 
 
-def dump():
+def dump(
+    max_depth: Optional[int], heads: Optional[List[str]], reference: Optional[str]
+):
     config = getProcessConfiguration()
+    config.dump_max_depth = max_depth
+    config.dump_heads = heads
+    config.dump_reference = reference
     process = ProcessKeyboard(config)
     process.run_wrapped(
         [
@@ -51,8 +57,17 @@ def dump():
     )
 
 
-def schematic():
+def record_changes(
+    config: ProcessConfiguration, dry_run: bool, save_changes: Optional[str]
+):
+    config.dry_run = dry_run
+    if save_changes is not None:
+        config.save_changes_filename = Path(save_changes)
+
+
+def schematic(dry_run: bool = False, save_changes: Optional[str] = None):
     config = getProcessConfiguration()
+    record_changes(config, dry_run, save_changes)
     process = ProcessKeyboard(config)
     process.run_wrapped(
         [
@@ -63,8 +78,9 @@ def schematic():
     )
 
 
-def pcb():
+def pcb(dry_run: bool = False, save_changes: Optional[str] = None):
     config = getProcessConfiguration()
+    record_changes(config, dry_run, save_changes)
     config.pcb_border_top = config.UNIT * 0
     process = ProcessKeyboard(config)
 
@@ -92,6 +108,12 @@ def case():
     )
 
 
+def apply_changes(filename: str, undo: bool):
+    config = getProcessConfiguration()
+    process = ProcessKeyboard(config)
+    process.apply_change_set(Path(filename), undo)
+
+
 def print_help():
     print(
         """
@@ -109,6 +131,18 @@ atari_a8.py [-c|--case] Generage the files needed for the case and plate.
 
 atari_a8.py [--dump] dump the schematic to stdout in a way that can be copy-pasted 
 into the app.
+  --depth=N       only print lists N levels deep, deeper ones show as [...]
+  --atom=NAME     only print nodes with this head atom, e.g. symbol (repeatable)
+  --reference=PAT only print nodes whose reference matches, e.g. "SW2*"
+
+With -s or -p:
+  --dry-run            print the changes to the PCB and schematic, and do
+                       not save them (other output files are still written)
+  --save-changes=FILE  also save the changes, for --apply-changes and
+                       --undo-changes
+
+atari_a8.py --apply-changes=FILE  make the saved changes again
+atari_a8.py --undo-changes=FILE   revert the saved changes
 """
     )
 
@@ -119,8 +153,31 @@ def main(argv: List[str]):
     run_pcb = False
     run_dump_schematic = False
     run_case = False
-
-    opts, args = getopt.getopt(argv, "hcspl", ["schematic", "pcb", "case", "dump"])
+    dump_max_depth: Optional[int] = None
+    dump_heads: Optional[List[str]] = None
+    dump_reference: Optional[str] = None
+    dry_run = False
+    save_changes: Optional[str] = None
+    change_set: Optional[str] = None
+    undo = False
+
+    opts, args = getopt.getopt(
+        argv,
+        "hcspl",
+        [
+            "schematic",
+            "pcb",
+            "case",
+            "dump",
+            "depth=",
+            "atom=",
+            "reference=",
+            "dry-run",
+            "save-changes=",
+            "apply-changes=",
+            "undo-changes=",
+        ],
+    )
     for opt, arg in opts:
         if opt == "-h":
             print_help()
@@ -133,9 +190,26 @@ def main(argv: List[str]):
             run_case = True
         elif opt == "--dump":
             run_dump_schematic = True
+        elif opt == "--depth":
+            dump_max_depth = int(arg)
+        elif opt == "--atom":
+            dump_heads = (dump_heads or []) + [arg]
+        elif opt == "--reference":
+            dump_reference = arg
+        elif opt == "--dry-run":
+            dry_run = True
+        elif opt == "--save-changes":
+            save_changes = arg
+        elif opt in ("--apply-changes", "--undo-changes"):
+            change_set = arg
+            undo = opt == "--undo-changes"
 
     if run_dump_schematic:
-        dump()
+        dump(dump_max_depth, dump_heads, dump_reference)
+        sys.exit()
+
+    if change_set is not None:
+        apply_changes(change_set, undo)
         sys.exit()
 
     if run_schematic == False and run_pcb == False and run_case == False:
@@ -148,11 +222,11 @@ def main(argv: List[str]):
 
     if run_pcb:
         print("Updating the PCB")
-        pcb()
+        pcb(dry_run, save_changes)
 
     if run_schematic:
         print("Updating the schematic")
-        schematic()
+        schematic(dry_run, save_changes)
 
     if run_case:
         print("Updating the case")
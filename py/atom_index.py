@@ -0,0 +1,269 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+from packed_pts import PackedPts
+from sexptype import SexpListType, SexpType, SexpTypeValue
+
+
+class IndexEntry:
+    """Where one list sits in an indexed tree."""
+
+    __slots__ = ("node", "head", "parent", "depth", "enter", "leave")
+
+    def __init__(
+        self,
+        node: SexpType,
+        parent: Optional[SexpType],
+        depth: int,
+        enter: int = 0,
+        leave: int = 0,
+    ):
+        self.node = node
+        head = node[0] if len(node) > 0 else None
+        self.head = head if isinstance(head, str) else None
+        self.parent = parent
+        self.depth = depth
+        # Numbers in document order: every list inside this one has an
+        # enter number between this one's enter and leave
+        self.enter = enter
+        self.leave = leave
+
+
+class AtomIndex:
+    """
+    Every list of a tree, found in one walk and filed under its head atom
+    together with its parent and depth.  A DEEP search for an atom below
+    any indexed node is then two binary searches, however big the tree is.
+
+    The index only knows about changes made through add() and remove(),
+    which KicadTool calls for its own edits.  Changing atoms is fine, but
+    lists added or removed behind its back leave it out of date.
+
+    Indexing a lazy tree parses all of it; the nodes stay clean, so the
+    tree is still written back by splicing.  With `lazy` the walk waits
+    until the first lookup, so a tree that is only edited, or only
+    searched near the top, is never parsed in full.  Packed pts blocks
+    are left packed, which means "xy" lists are not indexed.
+
+    parent_of does not build a lazy index.  It walks the tree once for the
+    parent of each list, which add() and remove() then keep up to date
+    until the index is built.
+    """
+
+    # Space left between neighbouring numbers, so that lists added later
+    # can be numbered in between without renumbering everything
+    GAP = 1 << 32
+
+    def __init__(self, root: SexpType, lazy: bool = False):
+        self.root = root
+        self._entries: Dict[int, IndexEntry] = {}
+        # Head atom -> (enter numbers, nodes), both in document order
+        self._heads: Dict[str, Tuple[List[int], SexpListType]] = {}
+        # Heads of lists that may be hidden inside packed blocks
+        self._unindexed: Set[str] = set()
+        # Each list and its parent by the id of the list, see parent_of
+        self._parents: Optional[Dict[int, Tuple[SexpType, SexpType]]] = None
+        self.built = False
+        if not lazy:
+            self._build()
+
+    def _build(self) -> None:
+        self.built = True
+        self._parents = None
+        self._entries.clear()
+        self._heads.clear()
+        self._unindexed.clear()
+
+        root_entry = IndexEntry(self.root, None, 0)
+        number = self._number(root_entry, 0, self.GAP)
+        # Plenty of room at the end, where most new lists are appended
+        root_entry.leave = number + self.GAP * self.GAP
+
+    def _number(self, top: IndexEntry, number: int, step: int) -> int:
+        """
+        Numbers and files `top` and every list inside it, counting up from
+        `number` in steps of `step`, and returns the last number used.
+        """
+        # Each item is [entry, iterator over the children left]
+        stack: List[list] = []
+
+        def enter(entry: IndexEntry) -> None:
+            nonlocal number
+            number += step
+            entry.enter = number
+            self._file(entry)
+            node = entry.node
+            if isinstance(node, PackedPts) and not node.loaded:
+                self._unindexed.add("xy")
+                number += step
+                entry.leave = number
+                return
+            stack.append([entry, iter(node)])
+
+        enter(top)
+        while stack:
+            item = stack[-1]
+            for child in item[1]:
+                if isinstance(child, list):
+                    enter(IndexEntry(child, item[0].node, item[0].depth + 1))
+                    break
+            else:
+                stack.pop()
+                number += step
+                item[0].leave = number
+
+        return number
+
+    def _file(self, entry: IndexEntry) -> None:
+        self._entries[id(entry.node)] = entry
+        if entry.head is not None:
+            numbers, nodes = self._heads.setdefault(entry.head, ([], []))
+            i = bisect_left(numbers, entry.enter)
+            numbers.insert(i, entry.enter)
+            nodes.insert(i, entry.node)
+
+    def _unfile(self, entry: IndexEntry) -> None:
+        del self._entries[id(entry.node)]
+        if entry.head is not None:
+            numbers, nodes = self._heads[entry.head]
+            i = bisect_left(numbers, entry.enter)
+            del numbers[i]
+            del nodes[i]
+
+    def entry(self, node: SexpTypeValue) -> Optional[IndexEntry]:
+        if not self.built:
+            self._build()
+        entry = self._entries.get(id(node))
+        if entry is None or entry.node is not node:
+            return None
+        return entry
+
+    def __contains__(self, node: SexpType) -> bool:
+        return self.entry(node) is not None
+
+    def parent_of(self, node: SexpType) -> Optional[SexpType]:
+        if self.built:
+            entry = self.entry(node)
+            return None if entry is None else entry.parent
+
+        parents = self._parents
+        if parents is None:
+            parents = self._parents = {}
+            self._map_parents(self.root)
+        found = parents.get(id(node))
+        if found is None or found[0] is not node:
+            return None
+        return found[1]
+
+    def _holds(self, node: SexpType) -> bool:
+        """Whether the parent map has been made and `node` is in it."""
+        if self._parents is None:
+            return False
+        return node is self.root or self.parent_of(node) is not None
+
+    def _map_parents(self, top: SexpType) -> None:
+        """Records the parent of every list inside `top`."""
+        parents = self._parents
+        assert parents is not None
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, PackedPts) and not node.loaded:
+                continue
+            for child in node:
+                if isinstance(child, list):
+                    parents[id(child)] = (child, node)
+                    stack.append(child)
+
+    def depth_of(self, node: SexpType) -> Optional[int]:
+        entry = self.entry(node)
+        return None if entry is None else entry.depth
+
+    def find(self, root: SexpType, atom: str) -> Optional[SexpListType]:
+        """
+        Returns `root` and every list inside it whose head is `atom`, in
+        document order, as a DEEP find_objects_by_atom would.  Returns
+        None if the index cannot answer, and the tree has to be walked.
+        """
+        entry = self.entry(root)
+        if entry is None or atom in self._unindexed:
+            return None
+        if atom not in self._heads:
+            return []
+        numbers, nodes = self._heads[atom]
+        lo = bisect_left(numbers, entry.enter)
+        hi = bisect_right(numbers, entry.leave)
+        return nodes[lo:hi]
+
+    def add(self, parent: SexpType, node: SexpType) -> None:
+        """Indexes `node`, which has just been put into `parent`."""
+        if not self.built:
+            # The walk will find it
+            if self._holds(parent) and isinstance(node, list):
+                self._parents[id(node)] = (node, parent)  # type: ignore[index]
+                self._map_parents(node)
+            return
+        parent_entry = self.entry(parent)
+        if parent_entry is None or not isinstance(node, list):
+            return
+
+        # Usually it has just been appended, so look from the end
+        i = len(parent) - 1
+        while i >= 0 and parent[i] is not node:
+            i -= 1
+        if i < 0:
+            return
+
+        # The new lists go between the list before it and the one after it
+        left = parent_entry.enter
+        for j in range(i - 1, -1, -1):
+            sibling = self.entry(parent[j])
+            if sibling is not None:
+                left = sibling.leave
+                break
+        right = parent_entry.leave
+        for j in range(i + 1, len(parent)):
+            sibling = self.entry(parent[j])
+            if sibling is not None:
+                right = sibling.enter
+                break
+
+        # Two numbers for each list, and some room on either side
+        count = 1 + sum(1 for _ in _lists_in(node))
+        step = min(self.GAP, (right - left) // (2 * count + 2))
+        if step == 0:
+            self._build()
+            return
+
+        entry = IndexEntry(node, parent, parent_entry.depth + 1)
+        self._number(entry, left, step)
+
+    def remove(self, node: SexpType) -> None:
+        """Forgets `node` and every list inside it."""
+        if not self.built:
+            if self._parents is not None and self.parent_of(node) is not None:
+                for e in [node, *_lists_in(node)]:
+                    self._parents.pop(id(e), None)
+            return
+        entry = self.entry(node)
+        if entry is None:
+            return
+        for e in [entry.node, *_lists_in(entry.node)]:
+            inner = self.entry(e)
+            if inner is not None:
+                self._unfile(inner)
+
+
+def _lists_in(node: SexpType):
+    """Yields every list inside `node`, without unpacking packed blocks."""
+    if isinstance(node, PackedPts) and not node.loaded:
+        return
+    stack = [iter(node)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, list):
+                yield child
+                if not (isinstance(child, PackedPts) and not child.loaded):
+                    stack.append(iter(child))
+                break
+        else:
+            stack.pop()
@@ -0,0 +1,148 @@
+import math
+from array import array
+from typing import TYPE_CHECKING, Collection, Iterable, List, Optional, Tuple
+from packed_pts import PackedPts
+from sexptype import SexpListType, SexpType
+
+if TYPE_CHECKING:
+    from kicad_tools import KicadTool
+
+# Lists whose first two atoms are an x, y pair
+COORDINATE_HEADS = ("at", "start", "end", "mid", "center", "xy")
+
+# KiCad keeps coordinates to the nanometre
+DECIMALS = 6
+
+
+class CoordinateBuffer:
+    """
+    Every x, y pair under some nodes, gathered in one walk into a single
+    array('d') of x, y pairs, with a reference back to the list or packed
+    pts block each one came from.  Translating, rotating or measuring the
+    nodes is then a loop over floats instead of a walk that turns strings
+    into Decimals and back, and write_back() puts the changed pairs back
+    in one pass.
+
+    Numbers are written back as KiCad writes them, rounded to DECIMALS
+    places; pairs that did not change keep their text.  A packed block
+    that changed is replaced by a new one in its parent.
+    """
+
+    def __init__(
+        self, nodes: Iterable[SexpType], heads: Collection[str] = COORDINATE_HEADS
+    ):
+        self.coords = array("d")
+        # The list of each pair from a list, and where its x is in coords
+        self.lists: SexpListType = []
+        self._list_offsets: List[int] = []
+        # Each packed block, the list it is in, and where its first x is
+        # in coords
+        self._packed: List[Tuple[PackedPts, SexpType, int]] = []
+
+        for node in nodes:
+            self._gather(node, heads)
+        self._original = array("d", self.coords)
+
+    def _gather(self, top: SexpType, heads: Collection[str]) -> None:
+        coords = self.coords
+        add_list = self.lists.append
+        add_offset = self._list_offsets.append
+        gather_packed = "xy" in heads
+
+        def walk(node: SexpType) -> None:
+            if len(node) >= 3 and node[0] in heads:
+                x, y = node[1], node[2]
+                if isinstance(x, str) and isinstance(y, str):
+                    add_list(node)
+                    add_offset(len(coords))
+                    # float() reads the text of a NumberAtom as well
+                    coords.append(float(x))
+                    coords.append(float(y))
+
+            for e in node:
+                if isinstance(e, list):
+                    if isinstance(e, PackedPts) and not e.loaded:
+                        if gather_packed:
+                            self._packed.append((e, node, len(coords)))
+                            coords.extend(e.coords)  # type: ignore[arg-type]
+                    else:
+                        walk(e)
+
+        walk(top)
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def translate(self, dx: float, dy: float) -> None:
+        coords = self.coords
+        for i in range(0, len(coords), 2):
+            coords[i] += dx
+            coords[i + 1] += dy
+
+    def rotate(self, degrees: float, cx: float = 0, cy: float = 0) -> None:
+        """
+        Rotates every pair by `degrees` about (cx, cy), counterclockwise
+        as KiCad shows it, with y pointing down.
+        """
+        a = math.radians(degrees)
+        cos_a, sin_a = math.cos(a), math.sin(a)
+        coords = self.coords
+        for i in range(0, len(coords), 2):
+            x = coords[i] - cx
+            y = coords[i + 1] - cy
+            coords[i] = cx + x * cos_a + y * sin_a
+            coords[i + 1] = cy - x * sin_a + y * cos_a
+
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        """(min x, min y, max x, max y) of all pairs, or None if there are none."""
+        coords = self.coords
+        if len(coords) == 0:
+            return None
+        xs = coords[0::2]
+        ys = coords[1::2]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def write_back(self, tool: Optional["KicadTool"] = None) -> None:
+        """
+        Writes the changed pairs back into their lists, through `tool`'s
+        set_atom, delete_item and insert_item if one is given, so its
+        indexes and journal see the changes.
+        """
+        coords, original = self.coords, self._original
+        for node, i in zip(self.lists, self._list_offsets):
+            for k in (0, 1):
+                if coords[i + k] == original[i + k]:
+                    continue
+                text = number_text(coords[i + k])
+                if tool is None:
+                    node[k + 1] = text
+                else:
+                    tool.set_atom(node, k + 1, text)
+
+        for n, (packed, parent, i) in enumerate(self._packed):
+            count = len(packed.coords)  # type: ignore[arg-type]
+            if coords[i : i + count] == original[i : i + count]:
+                continue
+            for j, e in enumerate(parent):
+                if e is packed:
+                    break
+            else:
+                continue  # No longer in the tree
+
+            block = PackedPts(
+                array("d", (round(v, DECIMALS) for v in coords[i : i + count]))
+            )
+            if tool is None:
+                parent[j] = block
+            else:
+                tool.delete_item(parent, j)
+                tool.insert_item(parent, j, block)
+            self._packed[n] = (block, parent, i)
+
+        self._original = array("d", coords)
+
+
+def number_text(v: float) -> str:
+    """`v` rounded to DECIMALS places, as KiCad writes it: 90, not 90.000000."""
+    text = f"{v:.{DECIMALS}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
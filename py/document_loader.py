@@ -0,0 +1,51 @@
+import marshal
+from pathlib import Path
+from typing import Iterable, List, Optional
+from kicad_parser import KiCadParser, ScanMode, SourceSexp
+from parse_cache import ParseCache
+from sexptype import SexpType
+
+
+class DocumentLoader:
+    """
+    Loads KiCad documents for reading.  Documents already in the cache are
+    read from it; the rest are parsed and added to it.
+
+    Documents that are to be changed and saved again are loaded with
+    load_for_editing instead.
+    """
+
+    def __init__(self, cache: Optional[ParseCache] = None):
+        self.cache = cache
+
+    @staticmethod
+    def _read(names: Iterable[Path | str]) -> List[str]:
+        texts: List[str] = []
+        for name in names:
+            with open(name, "r") as f:
+                texts.append(f.read())
+        return texts
+
+    def load(self, names: Iterable[Path | str]) -> List[SexpType]:
+        """Returns the trees of the files `names`, in the same order."""
+        texts = self._read(names)
+
+        trees: List[SexpType] = []
+        for text in texts:
+            tree = self.cache.lookup(text) if self.cache else None
+            if tree is None:
+                tree = KiCadParser(text).to_list(ScanMode.SLICE)
+                if self.cache:
+                    self.cache.store(text, marshal.dumps(tree))
+            trees.append(tree)
+        return trees
+
+    def load_for_editing(self, names: Iterable[Path | str]) -> List[SourceSexp]:
+        """
+        Returns typed lazy trees of the files `names`, in the same order,
+        for KiCadWriter(splice=True) to save again.  Only the skeleton of
+        each document is parsed here, and the trees have to stay with their
+        source text, so the cache is not used.
+        """
+        texts = self._read(names)
+        return [KiCadParser(text).to_lazy_list(typed=True) for text in texts]
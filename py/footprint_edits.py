@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import TYPE_CHECKING, Optional
+from views import Footprint
+
+if TYPE_CHECKING:
+    from kicad_tools import KicadTool, Layer
+
+
+class FootprintEdit(ABC):
+    """
+    One change to a footprint, for KicadTool.edit_footprints, which finds
+    every footprint to change in one pass and hands each edit its view.
+    """
+
+    @abstractmethod
+    def apply(self, tool: "KicadTool", footprint: Footprint) -> None:
+        pass
+
+
+@dataclass
+class PlaceFootprint(FootprintEdit):
+    """As KicadTool.set_object_location."""
+
+    x: Decimal
+    y: Decimal
+    rotation: Decimal = Decimal(0)
+    reference_rotation: Optional[Decimal] = None
+
+    def apply(self, tool: "KicadTool", footprint: Footprint) -> None:
+        tool.place_footprint(
+            footprint, self.x, self.y, self.rotation, self.reference_rotation
+        )
+
+
+@dataclass
+class SetTextHidden(FootprintEdit):
+    """As KicadTool.set_hidden_footprint_text_by_reference."""
+
+    type: str
+    hidden: bool = True
+
+    def apply(self, tool: "KicadTool", footprint: Footprint) -> None:
+        footprint.texts[self.type].hidden = self.hidden
+
+
+@dataclass
+class MoveTextToLayer(FootprintEdit):
+    """As KicadTool.move_text_to_layer."""
+
+    type: str
+    layer: "Layer"
+
+    def apply(self, tool: "KicadTool", footprint: Footprint) -> None:
+        footprint.texts[self.type].layer = self.layer
+
+
+@dataclass
+class CopyToBackSilkscreen(FootprintEdit):
+    """As KicadTool.copy_to_back_silkscreen."""
+
+    type: str
+
+    def apply(self, tool: "KicadTool", footprint: Footprint) -> None:
+        tool.copy_text_to_back_silkscreen(footprint, self.type)
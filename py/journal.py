@@ -0,0 +1,174 @@
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+from packed_pts import PackedPts, float_text
+from sexptype import SexpType, SexpTypeValue
+
+
+class ChangeKind(Enum):
+    # An atom of a list replaced by another
+    SET = "set"
+    # An atom or list put into a list
+    INSERT = "insert"
+    # An atom or list taken out of a list
+    DELETE = "delete"
+
+
+class Change:
+    """
+    One edit of a document: the list at `path` in document number
+    `document` had item `index` set, inserted or deleted.
+
+    `old` is the atom replaced or the item deleted and `new` the atom or
+    item put in, the very objects while the journal is being kept.
+    `value` is a plain copy of an inserted or deleted list as it was at
+    the time, which is what export() writes out.
+    """
+
+    __slots__ = ("kind", "document", "path", "index", "old", "new", "value")
+
+    def __init__(
+        self,
+        kind: ChangeKind,
+        document: int,
+        path: Tuple[int, ...],
+        index: int,
+        old: Optional[SexpTypeValue] = None,
+        new: Optional[SexpTypeValue] = None,
+        value: Optional[SexpTypeValue] = None,
+    ):
+        self.kind = kind
+        self.document = document
+        self.path = path
+        self.index = index
+        self.old = old
+        self.new = new
+        self.value = value
+
+    def __repr__(self) -> str:
+        where = "/".join(str(i) for i in (self.document, *self.path, self.index))
+        if self.kind == ChangeKind.SET:
+            return f"set {where}: {_brief(self.old)} -> {_brief(self.new)}"
+        if self.kind == ChangeKind.INSERT:
+            return f"insert {where}: {_brief(self.new)}"
+        return f"delete {where}: {_brief(self.old)}"
+
+
+class Journal:
+    """
+    The edits KicadTool made to a set of documents, in order, see
+    KicadTool.record_changes.  Edits to lists that are not inside one of
+    the documents, such as a symbol being built before it is appended,
+    are not recorded: the insert that adds it records all of it.
+
+    A journal can be exported to plain lists and strings, saved, and
+    loaded again with load() to be applied to, or undone on, the same
+    documents read in by a later run.
+    """
+
+    def __init__(self, roots: List[SexpType]):
+        self.roots = roots
+        self.changes: List[Change] = []
+        self._documents: Dict[int, int] = {id(root): i for i, root in enumerate(roots)}
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def document_of(self, root: SexpType) -> Optional[int]:
+        """The number of the document `root` is, or None."""
+        i = self._documents.get(id(root))
+        if i is None or self.roots[i] is not root:
+            return None
+        return i
+
+    def record(
+        self,
+        kind: ChangeKind,
+        document: int,
+        path: Tuple[int, ...],
+        index: int,
+        old: Optional[SexpTypeValue] = None,
+        new: Optional[SexpTypeValue] = None,
+    ) -> None:
+        item = new if kind == ChangeKind.INSERT else old
+        value = _plain(item) if isinstance(item, list) else None
+        self.changes.append(Change(kind, document, path, index, old, new, value))
+
+    def changed(self, root: SexpType) -> bool:
+        """Whether anything in the document `root` was changed."""
+        document = self.document_of(root)
+        return any(change.document == document for change in self.changes)
+
+    def summary(self) -> List[Dict[ChangeKind, int]]:
+        """How many changes of each kind each document had."""
+        counts: List[Dict[ChangeKind, int]] = [{} for _ in self.roots]
+        for change in self.changes:
+            kinds = counts[change.document]
+            kinds[change.kind] = kinds.get(change.kind, 0) + 1
+        return counts
+
+    def export(self) -> dict:
+        """The journal as plain lists, strings and numbers, e.g. for JSON."""
+        return {
+            "documents": len(self.roots),
+            "changes": [
+                {
+                    "kind": change.kind.value,
+                    "document": change.document,
+                    "path": list(change.path),
+                    "index": change.index,
+                    "old": _exported(change, change.old),
+                    "new": _exported(change, change.new),
+                }
+                for change in self.changes
+            ],
+        }
+
+    @staticmethod
+    def load(data: dict, roots: List[SexpType]) -> "Journal":
+        """
+        A journal exported by export(), for `roots`: the same documents,
+        in the same order, as the journal was kept for.
+        """
+        if data["documents"] != len(roots):
+            raise Exception(
+                f"Change set is for {data['documents']} documents, not {len(roots)}"
+            )
+        journal = Journal(roots)
+        for e in data["changes"]:
+            journal.changes.append(
+                Change(
+                    ChangeKind(e["kind"]),
+                    e["document"],
+                    tuple(e["path"]),
+                    e["index"],
+                    e["old"],
+                    e["new"],
+                )
+            )
+        return journal
+
+
+def _plain(item: SexpTypeValue) -> SexpTypeValue:
+    """A copy of `item` made of plain lists and strings."""
+    if isinstance(item, PackedPts) and item.coords is not None:
+        # Read without unpacking the block itself
+        coords = item.coords
+        pts: SexpType = ["pts"]
+        for k in range(0, len(coords), 2):
+            pts.append(["xy", float_text(coords[k]), float_text(coords[k + 1])])
+        return pts
+    if isinstance(item, list):
+        return [_plain(e) for e in item]
+    return str.__str__(item)
+
+
+def _exported(change: Change, item: Optional[SexpTypeValue]):
+    if isinstance(item, list):
+        return change.value
+    return None if item is None else str.__str__(item)
+
+
+def _brief(item: Optional[SexpTypeValue]) -> str:
+    if isinstance(item, list):
+        return f"({item[0] if len(item) > 0 else ''} ...)"
+    return str.__str__(item)
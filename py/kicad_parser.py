@@ -1,11 +1,96 @@
-from typing import List
-from sexptype import SexpType, makeString
+import copy
+import mmap
+import re
+from enum import Enum
+from pathlib import Path
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+from packed_pts import PackedPts
+from sexp_node import SexpNode, SexpNodeValue
+from sexptype import SexpType, SexpTypeValue, lazy_equal, makeAtom, makeString
+
+# What a parser, and the nodes it builds, can read from
+SourceType = str | bytes | mmap.mmap
+
+
+class ScanMode(Enum):
+    # Walk the input one character at a time (the original scanner)
+    CHARACTER = "character"
+    # Find whole tokens with a compiled regex and slice them out at once
+    SLICE = "slice"
+
+
+class SexpEvent(Enum):
+    OPEN = "open"
+    ATOM = "atom"
+    CLOSE = "close"
+
+
+SexpEventType = Tuple[SexpEvent, str]
+
+# A complete quoted string, backslash escapes allowed
+QUOTED_PATTERN = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+# The same, but an unterminated string may also run to the end of the input
+OPEN_QUOTED_PATTERN = r'"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)'
+
+
+def nested_node_pattern(depth: int) -> str:
+    """
+    A regex for one whole "(...)" node nested at most `depth` lists deep.
+    Atoms, strings and sub-lists each start with a different character, so
+    the pattern never has to backtrack.
+    """
+    atoms = r'[^()"]*'
+    pattern = r"\(" + atoms + "(?:" + QUOTED_PATTERN + atoms + r")*\)"
+    for _ in range(depth):
+        pattern = (
+            r"\("
+            + atoms
+            + "(?:(?:"
+            + QUOTED_PATTERN
+            + "|"
+            + pattern
+            + ")"
+            + atoms
+            + r")*\)"
+        )
+    return pattern
 
 
 class KiCadParser:
     WHITESPACE = " \n\r\t"
     TOKEN_ENDER = WHITESPACE + ")"
 
+    # One match per token: a bracket, a quoted string (backslash escapes
+    # allowed, an unterminated string runs to the end of the input) or a bare
+    # atom, which like get_next_token runs until whitespace or ")".
+    TOKEN_RE: re.Pattern = re.compile(
+        r"[()]|" + OPEN_QUOTED_PATTERN + r'|[^ \n\r\t()"][^ \n\r\t)]*', re.DOTALL
+    )
+
+    # Brackets and quoted strings only, for counting brackets
+    SKELETON_RE: re.Pattern = re.compile(r"[()]|" + OPEN_QUOTED_PATTERN, re.DOTALL)
+
+    # A whole node in one regex match, so skipping over a node costs one
+    # call instead of one per bracket.  Deeper nodes fall back to counting.
+    NODE_RE_DEPTH = 12
+    NODE_RE: re.Pattern = re.compile(nested_node_pattern(NODE_RE_DEPTH), re.DOTALL)
+
+    SPACE_RE: re.Pattern = re.compile(r"[ \n\r\t]*")
+
+    # The bare head atom right after an opening bracket
+    HEAD_RE: re.Pattern = re.compile(r"[ \n\r\t]*([^ \n\r\t()\"][^ \n\r\t)]*)")
+
+    # How much of a file iterparse reads at a time
+    CHUNK_SIZE = 64 * 1024
+
+    # The brackets as s_expr[i] returns them
+    OPEN = "("
+    CLOSE = ")"
+
+    # Bump whenever the tree the parser produces changes shape, so trees
+    # saved by ParseCache under an older version are parsed again
+    VERSION = 1
+
     s_expr = ""
     idx = 0
 
@@ -66,10 +151,26 @@ class KiCadParser:
         self.idx = saveidx
         return token
 
-    def to_list(self) -> SexpType:
+    def to_list(
+        self,
+        mode: ScanMode = ScanMode.CHARACTER,
+        typed: bool = False,
+        packed: bool = False,
+    ) -> SexpType:
         """
         Parses the S-expression string and converts it to a nested list structure.
+        `mode` selects the scanner; both produce the same tree.
+
+        With typed=True every atom is a SymbolAtom, NumberAtom or QuotedAtom
+        (see makeAtom).  They are still strings equal to the plain atoms, so
+        the tree works everywhere a plain one does.
+
+        With packed=True every (pts (xy x y) ...) block is a PackedPts,
+        holding its points in one array until something looks inside.
         """
+        if mode == ScanMode.SLICE or typed or packed:
+            return self._to_list_sliced(typed, packed)
+
         ret: SexpType = []
         stack: List[List] = [ret]
 
@@ -100,6 +201,286 @@ class KiCadParser:
                 token = self.get_next_token()
                 stack[-1].append(token)
 
+    def _to_list_sliced(self, typed: bool = False, packed: bool = False) -> SexpType:
+        """
+        The ScanMode.SLICE version of to_list.  Every token is found by
+        TOKEN_RE and sliced out whole, so the per-character method calls of
+        the original scanner disappear.
+        """
+        tokens = self._find_tokens()
+        if typed:
+            tokens = self._typed_tokens(tokens)
+        if packed:
+            tokens = PackedPts.pack_tokens(tokens)
+        return self._tokens_to_list(tokens)
+
+    def _find_tokens(self) -> List[str]:
+        return self.TOKEN_RE.findall(self.s_expr, self.idx)
+
+    @staticmethod
+    def _text(token: str) -> str:
+        """Turns a token as found in s_expr into a str atom."""
+        return token
+
+    @staticmethod
+    def _typed_tokens(tokens: List[str]) -> List[str]:
+        # Equal atoms share one object, and so one cached value
+        atoms: Dict[str, str] = {"(": "(", ")": ")"}
+        ret = []
+        for token in tokens:
+            atom = atoms.get(token)
+            if atom is None:
+                atom = atoms[token] = makeAtom(token)
+            ret.append(atom)
+        return ret
+
+    @staticmethod
+    def _tokens_to_list(tokens: List[str]) -> SexpType:
+        if not tokens or tokens[0] != "(":
+            found = tokens[0] if tokens else "end of input"
+            raise Exception("Expected ( found " + found)
+
+        ret: SexpType = []
+        stack: List[List] = [ret]
+
+        for token in tokens[1:]:
+            if token == "(":
+                new_list: List = []
+                stack[-1].append(new_list)
+                stack.append(new_list)
+            elif token == ")":
+                stack.pop()
+                if not stack:
+                    return ret
+            else:
+                stack[-1].append(token)
+
+        raise Exception("Unexpected end of input, missing )")
+
+    def to_nodes(self) -> SexpNode:
+        """
+        Parses the S-expression string into the compact SexpNode form,
+        with repeated atoms stored once.
+        """
+        tokens = self._find_tokens()
+        if not tokens or tokens[0] != "(":
+            found = tokens[0] if tokens else "end of input"
+            raise Exception("Expected ( found " + found)
+
+        atoms: Dict[str, str] = {}
+        stack: List[List[SexpNodeValue]] = [[]]
+
+        for token in tokens[1:]:
+            if token == "(":
+                stack.append([])
+            elif token == ")":
+                node = SexpNode.make(stack.pop())
+                if not stack:
+                    return node
+                stack[-1].append(node)
+            else:
+                stack[-1].append(atoms.setdefault(token, token))
+
+        raise Exception("Unexpected end of input, missing )")
+
+    def to_lazy_list(self, typed: bool = False) -> "SourceSexp":
+        """
+        Parses only the skeleton of the document: one scan records where
+        each top-level node starts and ends and what its head atom is.
+        Those nodes come back as LazySexp objects that parse their own text
+        the first time anything looks inside them, so nodes that no query
+        touches never get built.
+
+        Every node remembers its span of the source text and whether it has
+        been changed since, which lets KiCadWriter(splice=True) copy the
+        untouched parts of the file verbatim.
+        """
+        s = self.s_expr
+        pos = self.SPACE_RE.match(s, self.idx).end()  # type: ignore[union-attr]
+        if pos >= len(s) or s[pos] != self.OPEN:
+            found = self._text(s[pos : pos + 1]) if pos < len(s) else ""
+            raise Exception("Expected ( found " + found)
+
+        root = SourceSexp(s, pos)
+        if typed:
+            root.atoms = {}
+        children, root.end = self._scan_children(s, pos, root, typed)
+        list.extend(root, children)
+        return root
+
+    @classmethod
+    def _scan_children(
+        cls, s: SourceType, start: int, parent: "SourceSexp", typed: bool = False
+    ) -> Tuple[SexpType, int]:
+        """
+        Splits the node that opens at `start` into its atoms and unparsed
+        LazySexp children.  Returns them and the offset just past the node.
+        With `typed` the atoms are typed and the children TypedLazySexp;
+        equal atoms share one object, through the parent's atom table.
+        """
+        children: SexpType = []
+        lazy = TypedLazySexp if typed else LazySexp
+        atoms = parent.atoms
+        if typed and atoms is None:
+            atoms = parent.atoms = {}
+        pos = start + 1
+
+        while True:
+            pos = cls.SPACE_RE.match(s, pos).end()  # type: ignore[union-attr]
+            if pos >= len(s):
+                raise Exception("Unexpected end of input, missing )")
+
+            ch = s[pos]
+            if ch == cls.CLOSE:
+                return children, pos + 1
+
+            if ch == cls.OPEN:
+                end = cls._node_end(s, pos)
+                match = cls.HEAD_RE.match(s, pos + 1)
+                head = cls._text(match.group(1)) if match else None
+                if atoms is not None and head is not None:
+                    typed_head = atoms.get(head)
+                    if typed_head is None:
+                        typed_head = atoms[head] = makeAtom(head)
+                    head = typed_head
+                child = lazy(s, pos, end, head, parent)
+                child.atoms = atoms
+                children.append(child)
+                pos = end
+            else:
+                token = cls.TOKEN_RE.match(s, pos)
+                assert token is not None
+                atom = cls._text(token.group())
+                if atoms is not None:
+                    typed_atom = atoms.get(atom)
+                    if typed_atom is None:
+                        typed_atom = atoms[atom] = makeAtom(atom)
+                    atom = typed_atom
+                children.append(atom)
+                pos = token.end()
+
+    @classmethod
+    def _node_end(cls, s: SourceType, start: int) -> int:
+        """Returns the offset just past the node that opens at `start`."""
+        match = cls.NODE_RE.match(s, start)
+        if match:
+            return match.end()
+
+        depth = 0
+        for match in cls.SKELETON_RE.finditer(s, start):
+            ch = s[match.start()]
+            if ch == cls.OPEN:
+                depth += 1
+            elif ch == cls.CLOSE:
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+
+        raise Exception("Unexpected end of input, missing )")
+
+    @classmethod
+    def _tokens_to_events(cls, tokens: Iterable[str]) -> Iterator[SexpEventType]:
+        for token in tokens:
+            if token == "(":
+                yield SexpEvent.OPEN, token
+            elif token == ")":
+                yield SexpEvent.CLOSE, token
+            else:
+                yield SexpEvent.ATOM, token
+
+    @classmethod
+    def _tokens_from_chunks(cls, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Tokenizes text that arrives in pieces.  A token that touches the end
+        of the current buffer may continue in the next chunk, so it is held
+        back until more text (or the end of the input) arrives.
+        """
+        pending = ""
+        for chunk in chunks:
+            buf = pending + chunk
+            pending = ""
+            for match in cls.TOKEN_RE.finditer(buf):
+                if match.end() == len(buf):
+                    pending = buf[match.start() :]
+                    break
+                yield match.group()
+
+        yield from cls.TOKEN_RE.findall(pending)
+
+    def iter_events(self) -> Iterator[SexpEventType]:
+        """
+        Yields (event, token) pairs for the S-expression string without
+        building any lists: OPEN for "(", ATOM for every atom and CLOSE
+        for ")".
+        """
+        tokens = (m.group() for m in self.TOKEN_RE.finditer(self.s_expr, self.idx))
+        return self._tokens_to_events(tokens)
+
+    @staticmethod
+    def materialize_events(
+        events: Iterable[SexpEventType],
+        keep: Collection[str],
+        depth: Optional[int] = None,
+    ) -> Iterator[SexpType]:
+        """
+        Builds and yields only the nodes whose head atom is in `keep`.
+        Everything else is skipped as it streams past.  A kept node is
+        yielded whole, so matches nested inside it are not yielded again.
+        If `depth` is given, only nodes at that nesting level match
+        (the root is depth 0, its children depth 1).
+        """
+        building: List[List] = []
+        level = -1
+        head_pending = False
+
+        for event, token in events:
+            if building:
+                if event == SexpEvent.OPEN:
+                    new_list: List = []
+                    building[-1].append(new_list)
+                    building.append(new_list)
+                elif event == SexpEvent.ATOM:
+                    building[-1].append(token)
+                else:
+                    done = building.pop()
+                    if not building:
+                        level -= 1
+                        yield done
+                continue
+
+            if event == SexpEvent.OPEN:
+                level += 1
+                head_pending = True
+            elif event == SexpEvent.ATOM:
+                if head_pending and token in keep and depth in (None, level):
+                    building.append([token])
+                head_pending = False
+            else:
+                level -= 1
+                head_pending = False
+
+    @classmethod
+    def iterparse(
+        cls,
+        path: Path | str,
+        keep: Collection[str],
+        depth: Optional[int] = None,
+    ) -> Iterator[SexpType]:
+        """
+        Streams a KiCad file from disk and yields only the nodes whose head
+        atom is in `keep`, e.g. keep=("footprint",) on a PCB.  The file is
+        read in CHUNK_SIZE pieces, so memory use follows the largest kept
+        node rather than the size of the file.
+        """
+
+        def chunks() -> Iterator[str]:
+            with open(path, "r") as f:
+                while chunk := f.read(cls.CHUNK_SIZE):
+                    yield chunk
+
+        events = cls._tokens_to_events(cls._tokens_from_chunks(chunks()))
+        return cls.materialize_events(events, keep, depth)
+
     def print_list(self, list: SexpType, depth: int = 0) -> str:
         """
         Returns a formatted string representation of the nested list.
@@ -119,12 +500,12 @@ class KiCadParser:
 
     def list_to_sexp(self, root: SexpType) -> List[str]:
         """
-        Converts a nested list back to an S-expression string.
+        Converts a nested list back to an S-expression, one token per line.
+        KiCadWriter writes the compact layout KiCad uses and should be
+        preferred for saving files.
         """
 
-        def list_to_sexp_inner(
-            root: SexpType, depth: int = 0, out: List[str] = []
-        ) -> List[str]:
+        def list_to_sexp_inner(root: SexpType, depth: int, out: List[str]) -> List[str]:
 
             indent = " " * 2 * depth
 
@@ -145,3 +526,309 @@ class KiCadParser:
     def q_string(s: str) -> str:
         """Returns the input string enclosed in double quotes."""
         return '"' + s + '"'
+
+
+def _binary_re(pattern: re.Pattern) -> re.Pattern:
+    return re.compile(pattern.pattern.encode(), pattern.flags & ~re.UNICODE)
+
+
+class BinaryKiCadParser(KiCadParser):
+    """
+    A KiCadParser over UTF-8 bytes, or an mmap of a file, instead of str.
+    The scanners run on the raw bytes.  Only the tokens that end up in the
+    tree are decoded, so to_lazy_list never decodes the nodes nobody opens,
+    and with map_file the file itself is never copied into memory at all.
+    Node spans are byte offsets into the buffer, and since nothing goes
+    through text mode, line endings are kept exactly as they are on disk.
+
+    Everything else behaves like KiCadParser, except that to_list always
+    uses ScanMode.SLICE.  A mapped file must not be rewritten while its
+    tree is still in use.
+    """
+
+    TOKEN_RE = _binary_re(KiCadParser.TOKEN_RE)
+    SKELETON_RE = _binary_re(KiCadParser.SKELETON_RE)
+    NODE_RE = _binary_re(KiCadParser.NODE_RE)
+    SPACE_RE = _binary_re(KiCadParser.SPACE_RE)
+    HEAD_RE = _binary_re(KiCadParser.HEAD_RE)
+
+    OPEN = ord("(")  # type: ignore[assignment]
+    CLOSE = ord(")")  # type: ignore[assignment]
+
+    def __init__(self, s_expr: bytes | mmap.mmap = b""):
+        self.s_expr = s_expr  # type: ignore[assignment]
+
+    @classmethod
+    def map_file(cls, path: Path | str) -> "BinaryKiCadParser":
+        """Returns a parser over a read-only memory map of the file."""
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                # An empty file cannot be mapped
+                return cls(b"")
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def to_list(
+        self,
+        mode: ScanMode = ScanMode.SLICE,
+        typed: bool = False,
+        packed: bool = False,
+    ) -> SexpType:
+        return self._to_list_sliced(typed, packed)
+
+    def _find_tokens(self) -> List[str]:
+        tokens = self.TOKEN_RE.findall(self.s_expr, self.idx)
+        return [token.decode("utf-8") for token in tokens]
+
+    @staticmethod
+    def _text(token: bytes) -> str:  # type: ignore[override]
+        return token.decode("utf-8")
+
+    def iter_events(self) -> Iterator[SexpEventType]:
+        matches = self.TOKEN_RE.finditer(self.s_expr, self.idx)
+        tokens = (self._text(m.group()) for m in matches)  # type: ignore[arg-type]
+        return self._tokens_to_events(tokens)
+
+
+class SourceSexp(list):
+    """
+    A node parsed from source text by KiCadParser.to_lazy_list.  It is an
+    ordinary list that also knows its span of the source and its parent,
+    and every change to it marks it and its ancestors dirty.  A node that
+    is not dirty still reads exactly like source[start:end].
+
+    Copies (copy.copy, copy.deepcopy, pickle) are plain lists, since they
+    no longer match any span of the source.
+    """
+
+    __slots__ = (
+        "source",
+        "start",
+        "end",
+        "head",
+        "parent",
+        "dirty",
+        "digest",
+        "atoms",
+    )
+
+    loaded = True
+
+    def __init__(
+        self,
+        source: SourceType = "",
+        start: int = 0,
+        end: int = 0,
+        head: Optional[str] = None,
+        parent: Optional["SourceSexp"] = None,
+    ):
+        super().__init__()
+        self.source = source
+        self.start = start
+        self.end = end
+        self.head = head
+        self.parent = parent
+        self.dirty = False
+        # The structural hash, kept here by sexp_hash.structural_hash
+        self.digest: Optional[bytes] = None
+        # Typed atoms by token, shared by every node of one typed document
+        self.atoms: Optional[Dict[str, str]] = None
+
+    def source_text(self) -> str:
+        """The text this node was parsed from."""
+        return self.source_span(self.start, self.end)
+
+    def source_span(self, start: int, end: int) -> str:
+        """The text between two offsets of this node's source."""
+        text = self.source[start:end]
+        if isinstance(text, str):
+            return text
+        return text.decode("utf-8")
+
+    def touch(self) -> None:
+        """
+        Marks this node, and every ancestor, as changed and forgets their
+        structural hashes.  A node that is already dirty and has no hash
+        has ancestors in the same state, so the walk can stop there.
+        """
+        node: Optional[SourceSexp] = self
+        while node is not None and not (node.dirty and node.digest is None):
+            node.dirty = True
+            node.digest = None
+            node = node.parent
+
+    def __eq__(self, other):
+        # list's own comparison would miss the items of a lazy `other`
+        return lazy_equal(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __copy__(self):
+        return list(self)
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+
+class LazySexp(SourceSexp):
+    """
+    A SourceSexp that has not been parsed yet.  It holds only its span and
+    head atom, so node[0] and comparisons against a different head never
+    parse it.  Any other access parses one level, children again being
+    LazySexp, and the node turns into a plain SourceSexp.
+    """
+
+    __slots__ = ()
+
+    loaded = False
+
+    def _load(self) -> None:
+        if self.loaded:
+            return
+        typed = type(self) is TypedLazySexp
+        parser = KiCadParser if isinstance(self.source, str) else BinaryKiCadParser
+        children, _ = parser._scan_children(self.source, self.start, self, typed)
+        list.extend(self, children)
+        self.__class__ = SourceSexp  # type: ignore[assignment]
+
+    @staticmethod
+    def head_of(node: SexpType) -> Optional[SexpTypeValue]:
+        """Returns node[0] (or None if empty) without parsing a LazySexp."""
+        if isinstance(node, LazySexp) and node.head is not None:
+            return node.head
+        return node[0] if len(node) > 0 else None
+
+    def __getitem__(self, index):
+        if index == 0 and self.head is not None:
+            return self.head
+        self._load()
+        return self[index]
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, list):
+            return NotImplemented
+        # Nodes with different heads differ, no need to parse either one
+        if LazySexp.head_of(self) != LazySexp.head_of(other):
+            return False
+        return lazy_equal(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __deepcopy__(self, memo):
+        self._load()
+        return SourceSexp.__deepcopy__(self, memo)
+
+    def __copy__(self):
+        self._load()
+        return SourceSexp.__copy__(self)
+
+    def __reduce_ex__(self, protocol):
+        self._load()
+        return SourceSexp.__reduce_ex__(self, protocol)
+
+
+class TypedLazySexp(LazySexp):
+    """A LazySexp from to_lazy_list(typed=True), whose atoms are typed."""
+
+    __slots__ = ()
+
+
+def _touching(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self.touch()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _adding(name: str, many: bool):
+    """
+    As _touching, for a mutator whose last argument is what it adds: one
+    child, or with `many` (or a slice to set) an iterable of them.  Added
+    nodes take the list as their parent, so their edits mark it too.
+    """
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        self.touch()
+        *rest, value = args
+        several = many or (len(rest) > 0 and isinstance(rest[0], slice))
+        added = list(value) if several else [value]
+        result = method(self, *rest, added if several else value)
+        for item in added:
+            if isinstance(item, SourceSexp):
+                item.parent = self
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _loading(name: str):
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return getattr(SourceSexp, name)(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+# Every change to a SourceSexp marks it dirty.
+_MUTATORS = (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "append",
+    "extend",
+    "insert",
+    "remove",
+    "pop",
+    "clear",
+    "sort",
+    "reverse",
+)
+
+# The ones that add children, and whether they take several
+_ADDING = {
+    "__setitem__": False,
+    "__iadd__": True,
+    "append": False,
+    "extend": True,
+    "insert": False,
+}
+
+for _name in _MUTATORS:
+    if _name in _ADDING:
+        setattr(SourceSexp, _name, _adding(_name, _ADDING[_name]))
+    else:
+        setattr(SourceSexp, _name, _touching(_name))
+
+# Everything else on a LazySexp needs the parsed children.
+for _name in _MUTATORS + (
+    "__len__",
+    "__iter__",
+    "__reversed__",
+    "__contains__",
+    "__add__",
+    "__mul__",
+    "__lt__",
+    "__le__",
+    "__gt__",
+    "__ge__",
+    "__repr__",
+    "index",
+    "count",
+    "copy",
+):
+    setattr(LazySexp, _name, _loading(_name))
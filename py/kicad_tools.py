@@ -1,10 +1,20 @@
+from array import array
 from decimal import Decimal
 from enum import Enum, IntEnum
-import copy
 import math
-from typing import Dict, List, Optional, cast
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple, cast
 from attr import dataclass
+from atom_index import AtomIndex
+from coords import CoordinateBuffer, number_text
+from footprint_edits import FootprintEdit
+from journal import Change, ChangeKind, Journal
 from ki_symbols import KiSymbols, PinPosition, Wire
+from kicad_parser import LazySexp, SourceSexp
+from packed_pts import PackedPts
+from reference_index import ReferenceIndex
+from selector import Selector
+from sexp_clone import clone
+from views import Footprint, SchematicSymbol, TextItem
 from sexptype import (
     PinNumber,
     PinType,
@@ -14,6 +24,7 @@ from sexptype import (
     UnitNumber,
     makeDecimal,
     makeString,
+    makeText,
 )
 
 
@@ -111,6 +122,276 @@ class QueryRecursionLevel(IntEnum):
 
 
 class KicadTool:
+    def __init__(self) -> None:
+        # Indexes of the trees being worked on, see index_tree
+        self.indexes: List[AtomIndex] = []
+        # Footprints and symbols by reference, see index_references
+        self.reference_indexes: List[ReferenceIndex] = []
+        # Library pin offsets of each schematic, see _pin_offsets
+        self.pin_offset_tables: Dict[
+            int,
+            Tuple[SexpType, SexpType, Dict[Tuple[str, str], Tuple[Decimal, Decimal]]],
+        ] = {}
+        # The edits being recorded, see record_changes
+        self.journal: Optional[Journal] = None
+        # Footprint and symbol views by the id of their node, and the
+        # TextItems of their texts and properties by theirs, see
+        # view_footprint.  Each holds its node, so no id is reused while it
+        # is here.
+        self.views: Dict[int, Footprint | SchematicSymbol] = {}
+        self.view_parts: Dict[int, TextItem] = {}
+
+    def index_tree(self, root: SexpType, lazy: bool = False) -> AtomIndex:
+        """
+        Indexes `root`, so DEEP searches for an atom anywhere in it are
+        answered without walking it.  From then on lists must be added and
+        removed with append_node and remove_node, which keep it up to date.
+        With `lazy`, the index is built by the first search that uses it.
+        """
+        index = AtomIndex(root, lazy)
+        self.indexes.append(index)
+        return index
+
+    def index_references(self, root: SexpType, lazy: bool = False) -> ReferenceIndex:
+        """
+        Indexes the footprints in `root` by reference, and the symbols by
+        reference and unit, for find_footprint_by_reference and
+        find_symbol_by_reference.  As with index_tree, lists must then be
+        added and removed with append_node and remove_node.
+        """
+        index = ReferenceIndex(root, self._reference_keys, lazy)
+        self.reference_indexes.append(index)
+        return index
+
+    @staticmethod
+    def _reference_keys(node: SexpType) -> List[Hashable]:
+        # The keys find_footprint_by_reference and find_symbol_by_reference
+        # look up, taken from the same lists their queries match
+        head = LazySexp.head_of(node)
+        if head != "footprint" and head != "symbol":
+            return []
+
+        refs: List[str] = []
+        units: List[str] = []
+        for e in node:
+            if not isinstance(e, list) or len(e) < 2:
+                continue
+            if len(e) >= 3 and (
+                (head == "footprint" and e[0] == "fp_text" and e[1] == "reference")
+                or (head == "symbol" and e[0] == "property" and e[1] == '"Reference"')
+            ):
+                refs.append(str(e[2]))
+            elif e[0] == "unit":
+                units.append(str(e[1]))
+
+        if head == "footprint":
+            return [("footprint", ref) for ref in refs]
+        return [("symbol", ref, unit) for ref in refs for unit in units]
+
+    def append_node(self, parent: SexpType, node: SexpType) -> None:
+        self.insert_item(parent, len(parent), node)
+
+    def remove_node(self, parent: SexpType, node: SexpType) -> None:
+        """Removes `node` itself from `parent`, not just an equal list."""
+        for i, e in enumerate(parent):
+            if e is node:
+                break
+        else:
+            raise ValueError("Node not found in parent")
+
+        self.delete_item(parent, i)
+
+    def insert_item(self, parent: SexpType, i: int, item: SexpTypeValue) -> None:
+        """Puts a list or atom into `parent` at position i."""
+        parent.insert(i, item)
+        if isinstance(item, SourceSexp):
+            # A node moved from elsewhere now marks its new ancestors dirty
+            item.parent = parent if isinstance(parent, SourceSexp) else None
+        if isinstance(item, list):
+            for index in self.indexes:
+                index.add(parent, item)
+            for reference_index in self.reference_indexes:
+                reference_index.add(parent, item)
+            self._forget_pin_offsets(parent, item)
+        self._forget_view(parent)
+        self._record(ChangeKind.INSERT, parent, i, new=item)
+
+    def delete_item(self, parent: SexpType, i: int) -> None:
+        """Takes item i, a list or atom, out of `parent`."""
+        item = parent[i]
+        del parent[i]
+        self._forget_view(parent)
+        self._record(ChangeKind.DELETE, parent, i, old=item)
+        if isinstance(item, list):
+            self._unindex(parent, item)
+
+    def set_atom(self, node: SexpType, i: int, atom: str) -> None:
+        """Sets node[i] to `atom`, unless it already is."""
+        old = node[i]
+        if old == atom and not isinstance(old, list):
+            return
+        node[i] = atom
+        self._forget_view(node)
+        self._record(ChangeKind.SET, node, i, old, atom)
+
+    def remove_where(
+        self, parent: SexpType, predicate: Callable[[SexpType], bool]
+    ) -> SexpListType:
+        """
+        Removes every list directly inside `parent` that `predicate` is true
+        for, rebuilding the list of children once, and returns them.
+        """
+        kept: SexpType = []
+        removed: SexpListType = []
+        positions: List[int] = []
+        for i, e in enumerate(parent):
+            if isinstance(e, list) and predicate(e):
+                removed.append(e)
+                positions.append(i)
+            else:
+                kept.append(e)
+
+        if removed:
+            parent[:] = kept
+            self._forget_view(parent)
+            for k, node in enumerate(removed):
+                # Where it was once the ones before it had gone
+                self._record(ChangeKind.DELETE, parent, positions[k] - k, old=node)
+                self._unindex(parent, node)
+        return removed
+
+    def record_changes(self, *roots: SexpType) -> Journal:
+        """
+        Starts a journal of the edits made to `roots` from now on.  Roots
+        that are not indexed yet are indexed, lazily, so the position of
+        every edited list can be found from its parents.
+        """
+        for root in roots:
+            if not any(index.root is root for index in self.indexes):
+                self.index_tree(root, lazy=True)
+        self.journal = Journal(list(roots))
+        return self.journal
+
+    def _record(
+        self,
+        kind: ChangeKind,
+        node: SexpType,
+        i: int,
+        old: Optional[SexpTypeValue] = None,
+        new: Optional[SexpTypeValue] = None,
+    ) -> None:
+        journal = self.journal
+        if journal is None:
+            return
+
+        path: List[int] = []
+        while True:
+            parent = self.parent_of(node)
+            if parent is None:
+                break
+            for j, e in enumerate(parent):
+                if e is node:
+                    break
+            else:
+                return  # No longer in the tree
+            path.append(j)
+            node = parent
+
+        document = journal.document_of(node)
+        if document is not None:
+            journal.record(kind, document, tuple(reversed(path)), i, old, new)
+
+    def apply_changes(self, journal: Journal) -> None:
+        """
+        Makes the changes in `journal` to its documents, e.g. ones loaded
+        from a saved change set.  The changes are not recorded again.
+        """
+        for change in journal.changes:
+            self._apply_change(journal, change, True)
+
+    def undo_changes(self, journal: Journal) -> None:
+        """Reverts the changes in `journal`, last one first."""
+        for change in reversed(journal.changes):
+            self._apply_change(journal, change, False)
+
+    def _apply_change(self, journal: Journal, change: Change, forward: bool) -> None:
+        node = journal.roots[change.document]
+        for k in change.path:
+            node = cast(SexpType, node[k])
+
+        kind, i, old, new = change.kind, change.index, change.old, change.new
+        if not forward:
+            old, new = new, old
+            if kind == ChangeKind.INSERT:
+                kind = ChangeKind.DELETE
+            elif kind == ChangeKind.DELETE:
+                kind = ChangeKind.INSERT
+
+        if kind == ChangeKind.INSERT:
+            matches = i <= len(node)
+        else:
+            matches = i < len(node) and (node[i] is old or node[i] == old)
+        if not matches:
+            raise Exception(f"Change set does not match document: {change}")
+
+        recording, self.journal = self.journal, None
+        try:
+            if kind == ChangeKind.SET:
+                self.set_atom(node, i, cast(str, new))
+            elif kind == ChangeKind.INSERT:
+                self.insert_item(node, i, cast(SexpTypeValue, new))
+            else:
+                self.delete_item(node, i)
+        finally:
+            self.journal = recording
+
+    def parent_of(self, node: SexpType) -> Optional[SexpType]:
+        """
+        The list `node` is in, if the parser, an edit or an index recorded
+        it.  A lazy index is not built for this, see AtomIndex.parent_of.
+        """
+        # Asked first, as it needs no index at all
+        if isinstance(node, SourceSexp) and node.parent is not None:
+            return node.parent
+        for index in self.indexes:
+            if index.root is node:
+                return None
+            parent = index.parent_of(node)
+            if parent is not None:
+                return parent
+        return None
+
+    def detach(self, node: SexpType) -> SexpType:
+        """
+        Removes `node` from the list it is in, and returns that list.
+
+        Finding the list is a lookup, after one walk of a plain tree (see
+        parent_of), but the node's position in it is found by looking
+        through the list from the start, as is each ancestor's when the
+        change is recorded.  Taking many nodes from the end of one long
+        list is quadratic; remove_where takes any number in one pass.
+        """
+        parent = self.parent_of(node)
+        if parent is None:
+            raise Exception("Parent of node not known")
+        self.remove_node(parent, node)
+        return parent
+
+    def _unindex(self, parent: SexpType, node: SexpType) -> None:
+        if isinstance(node, SourceSexp):
+            # Out of the tree, so edits to it no longer touch its old parents
+            node.parent = None
+        for index in self.indexes:
+            index.remove(node)
+        for reference_index in self.reference_indexes:
+            reference_index.remove(node)
+        self._forget_pin_offsets(parent, node)
+        if self.views:
+            view = self.views.pop(id(node), None)
+            if view is not None:
+                view.drop()
+            self.view_parts.pop(id(node), None)
+
     def find_objects_by_foo(
         self, root: SexpType, query: SexpTypeValue, recursionLevel: QueryRecursionLevel
     ) -> SexpListType:
@@ -121,10 +402,35 @@ class KicadTool:
             depth,
             out: SexpListType,
         ):
+            # A packed pts block holds only xy lists, so unless those are
+            # wanted there is no need to unpack it and look
+            if (
+                isinstance(local_root, PackedPts)
+                and not local_root.loaded
+                and isinstance(query, list)
+                and len(query) > 0
+                and query[0] != "xy"
+            ):
+                return
+
             for top in local_root:
                 if top is None or query is None:
                     continue
 
+                # A different head atom can never match.  Checking it first
+                # lets an unparsed LazySexp be skipped without parsing it.
+                if (
+                    isinstance(top, list)
+                    and len(query) > 0
+                    and isinstance(query[0], str)
+                    and LazySexp.head_of(top) != query[0]
+                ):
+                    if depth < maxDepth and len(top) >= len(query):
+                        _find_objects_by_atom_inner(
+                            top, query, maxDepth, depth + 1, out
+                        )
+                    continue
+
                 # If it is too small, no way it can match
                 if len(top) < len(query):
                     continue
@@ -144,8 +450,6 @@ class KicadTool:
                             match = False
 
                     if isinstance(bit, list):
-                        s = str(top)
-
                         if isinstance(top, list):
                             res = self.find_objects_by_foo(
                                 top, bit, QueryRecursionLevel.HERE
@@ -166,9 +470,25 @@ class KicadTool:
         _find_objects_by_atom_inner([root], query, maxDepth, 0, out)
         return out
 
+    def select(self, root: SexpType, selector: str) -> SexpListType:
+        """
+        Returns `root` and the lists inside it picked out by `selector`,
+        such as 'footprint[fp_text.reference="SW227"] > at'; see Selector.
+        """
+        compiled = Selector.compile(selector)
+        for index in self.indexes:
+            if root in index:
+                return compiled.select(root, index)
+        return compiled.select(root)
+
     def find_objects_by_atom(
         self, root: SexpType, atom: str, recursionLevel: QueryRecursionLevel
     ) -> SexpListType:
+        if recursionLevel == QueryRecursionLevel.DEEP:
+            for index in self.indexes:
+                found = index.find(root, atom)
+                if found is not None:
+                    return found
         return self.find_objects_by_foo(root, [atom], recursionLevel)
 
     def find_object_by_atom(
@@ -181,7 +501,26 @@ class KicadTool:
             raise Exception(f"Found zero {atom}")
         return objs[0]
 
+    @staticmethod
+    def get_reference(node: SexpType) -> Optional[str]:
+        """
+        Returns the reference designator of a footprint or symbol, without
+        quotes, from its (fp_text reference ...) or (property "Reference" ...).
+        """
+        for e in node:
+            if isinstance(e, list) and len(e) > 2:
+                if (e[0] == "fp_text" and e[1] == "reference") or (
+                    e[0] == "property" and e[1] == q_string("Reference")
+                ):
+                    return makeText(e[2])
+        return None
+
     def find_footprint_by_reference(self, root: SexpType, ref: str) -> SexpType:
+        for index in self.reference_indexes:
+            found = index.find(root, ("footprint", q_string(ref)))
+            if found is not None:
+                return found[0] if len(found) > 0 else []
+
         l = self.find_objects_by_foo(
             root,
             ["footprint", ["fp_text", "reference", '"' + ref + '"']],
@@ -191,44 +530,64 @@ class KicadTool:
             return l[0]
         return []
 
-    def _get_text_obj_by_type(self, root: SexpType, ref: str, type: str) -> SexpType:
-        p = self.find_footprint_by_reference(root, ref)
-
-        assert p is not None
+    def view_footprint(self, node: SexpType) -> Footprint:
+        """
+        A Footprint view of `node`.  It is made once and kept; whenever
+        the footprint or one of its texts is changed through the tool, it
+        forgets the lists it found and looks again when next asked.
+        """
+        view = self.views.get(id(node))
+        if not isinstance(view, Footprint) or view.node is not node:
+            view = Footprint(node, self)
+            self.views[id(node)] = view
+        return view
+
+    def view_symbol(self, node: SexpType) -> SchematicSymbol:
+        """A SchematicSymbol view of `node`, kept like view_footprint's."""
+        view = self.views.get(id(node))
+        if not isinstance(view, SchematicSymbol) or view.node is not node:
+            view = SchematicSymbol(node, self)
+            self.views[id(node)] = view
+        return view
+
+    def _forget_view(self, node: SexpType) -> None:
+        if not self.views:
+            return
+        view = self.views.get(id(node))
+        if view is not None:
+            view.forget()
+        item = self.view_parts.get(id(node))
+        if item is not None:
+            # Its kind or name may have changed too
+            item.forget()
+            item.owner.forget()
+
+    def _footprint(self, root: SexpType, ref: str) -> Footprint:
+        node = self.find_footprint_by_reference(root, ref)
+        if node is None or len(node) == 0:
+            raise Exception("Could not find " + ref)
+        return self.view_footprint(node)
 
-        o = self.find_objects_by_atom(p, "fp_text", QueryRecursionLevel.DEEP)
-        filtered = filter(lambda fp: (fp[1] == type), o)
-        obj = list(filtered)[0]
-        return obj
+    def _get_text_obj_by_type(self, root: SexpType, ref: str, type: str) -> SexpType:
+        return self._footprint(root, ref).texts[type].node
 
     def set_hidden_footprint_text_by_reference(
         self, root: SexpType, ref: str, type: str, hidden: bool
     ) -> None:
-        obj = self._get_text_obj_by_type(root, ref, type)
-
-        # If it is already there, remove it.
-        if "hide" in obj:
-            obj.remove("hide")
-
-        if hidden:
-            obj.append("hide")
+        self._footprint(root, ref).texts[type].hidden = hidden
 
     def move_text_to_layer(
         self, root: SexpType, ref: str, type: str, layer: Layer
     ) -> None:
-        obj = self._get_text_obj_by_type(root, ref, type)
-
-        o = self.find_objects_by_atom(obj, "layer", QueryRecursionLevel.DEEP)
-
-        lst = list(o)
-        lst[0][1] = layer
+        self._footprint(root, ref).texts[type].layer = layer
 
     def copy_to_back_silkscreen(self, root: SexpType, ref: str, type: str) -> None:
-        p = self.find_footprint_by_reference(root, ref)
-        assert p is not None
+        self.copy_text_to_back_silkscreen(self._footprint(root, ref), type)
 
-        obj = self._get_text_obj_by_type(root, ref, type)
-        nn = copy.deepcopy(obj)
+    def copy_text_to_back_silkscreen(self, footprint: Footprint, type: str) -> None:
+        """Adds a mirrored user copy of a text of `footprint` on B.SilkS."""
+        obj = footprint.texts[type].node
+        nn = clone(obj)
 
         layerObject = self.find_objects_by_atom(nn, "layer", QueryRecursionLevel.DEEP)
 
@@ -243,7 +602,33 @@ class KicadTool:
         effectsList = list(effectsObject)
         effectsList[0].append(["justify", "mirror"])
 
-        p.append(nn)
+        self.append_node(footprint.node, nn)
+
+    def edit_footprints(
+        self, root: SexpType, edits: Iterable[Tuple[str, Iterable[FootprintEdit]]]
+    ) -> List[str]:
+        """
+        Makes every (reference, edits) change in one pass over the
+        footprints of `root`, in the order given for each reference, and
+        returns the references that were not found.
+        """
+        wanted: Dict[str, List[FootprintEdit]] = {}
+        for ref, ref_edits in edits:
+            wanted.setdefault(ref, []).extend(ref_edits)
+
+        for node in root:
+            if not wanted:
+                break
+            if not isinstance(node, list) or LazySexp.head_of(node) != "footprint":
+                continue
+            found = self.get_reference(node)
+            if found is None or found not in wanted:
+                continue
+            for edit in wanted.pop(found):
+                # The view is made again after an edit that adds a text
+                edit.apply(self, self.view_footprint(node))
+
+        return list(wanted)
 
     def get_all_symbol_value_references(self, root: SexpType) -> Dict[str, List[str]]:
         ret: Dict[str, List[str]] = dict()
@@ -251,23 +636,11 @@ class KicadTool:
         symbols = self.find_objects_by_atom(root, "symbol", QueryRecursionLevel.HERE)
 
         for symbol in symbols:
-            properties = self.find_objects_by_atom(
-                symbol, "property", QueryRecursionLevel.HERE
-            )
-
-            value_property = next(
-                filter(lambda fp: (fp[1] == q_string("Value")), properties), "None"
-            )
-
-            reference_property = next(
-                filter(lambda fp: (fp[1] == q_string("Reference")), properties),
-                "--NONE--",
-            )
-
-            if value_property and reference_property:
-                value: str = makeString(value_property[2]).strip('"')
-                reference: str = makeString(reference_property[2]).strip('"')
+            view = self.view_symbol(symbol)
+            value = view.value
+            reference = view.reference
 
+            if value is not None and reference is not None:
                 if not value in ret:
                     ret[value] = []
 
@@ -283,6 +656,11 @@ class KicadTool:
         if unit == UnitNumber.TWO:
             unitstr = "2"
 
+        for index in self.reference_indexes:
+            found = index.find(root, ("symbol", q_string(ref), unitstr))
+            if found is not None:
+                return found[0] if len(found) > 0 else None
+
         z: SexpTypeValue = [
             "symbol",
             ["unit", unitstr],
@@ -311,26 +689,21 @@ class KicadTool:
         if symbol is None:
             raise Exception("get_symbol_property: Symbol not found " + ref)
 
-        o = self.find_objects_by_atom(symbol, "property", QueryRecursionLevel.DEEP)
-
-        filtered = filter(lambda fp: (fp[1] == q_string(prop)), o)
-        lst = list(filtered)
-        if len(lst) > 0:
-            return lst[0][2]
+        item = self.view_symbol(symbol).properties.get(prop)
+        if item is not None:
+            return item.node[2]
         else:
             return default
 
     def find_footprint_at_by_reference(self, root: SexpType, ref: str) -> SexpType:
-        footprint = self.find_footprint_by_reference(root, ref)
-        assert footprint is not None
-
-        o = self.find_object_by_atom(footprint, "at", QueryRecursionLevel.HERE)
+        o = self._footprint(root, ref).at
+        assert o is not None
 
         # There are optional parameters.
         # Its harmless to fill them in and makes other code
         # a lot simplier.
         while len(o) != 4:
-            o.append("0")
+            self.insert_item(o, len(o), "0")
 
         return o
 
@@ -343,69 +716,30 @@ class KicadTool:
         rot: Decimal = Decimal(0),
         ref_rot: Decimal | None = None,
     ) -> None:
-        footprint = self.find_footprint_by_reference(root, ref)
-
-        cat = self.find_footprint_at_by_reference(root, ref)
-
-        current_rot = makeDecimal(cat[3])
-        # If the object is already rotated, then un-rotate it
-        if current_rot != 0:
-            cat[3] = str(makeDecimal(cat[3]) - current_rot)
-            rrot2 = None
-            if ref_rot is not None:
-                rrot2 = -ref_rot
-
-            self.set_object_location(root, ref, x, y, -current_rot, rrot2)
-
-        all_ats = self.find_objects_by_atom(footprint, "at", QueryRecursionLevel.HERE)
-        for at1 in all_ats:
-            while len(at1) < 4:
-                at1.append("0")  # If there isn't a rotation, add it.
-
-            at1_x = makeDecimal(at1[1])
-            at1_y = makeDecimal(at1[2])
-            at1_rot = makeDecimal(at1[3])
-
-            while len(at1) > 0:
-                at1.pop()
-
-            at1.append("at")
-            at1.append(str(at1_x))
-            at1.append(str(at1_y))
-            at1.append(str(at1_rot + rot))
+        self.place_footprint(self._footprint(root, ref), x, y, rot, ref_rot)
 
+    def place_footprint(
+        self,
+        footprint: Footprint,
+        x: Decimal,
+        y: Decimal,
+        rot: Decimal = Decimal(0),
+        ref_rot: Decimal | None = None,
+    ) -> None:
+        """
+        Moves `footprint` to x, y and turns it to `rot`, and its reference
+        text to `ref_rot` if that is given.
+        """
         if ref_rot is not None:
-            obj = self.find_footprint_by_reference(root, ref)
-            if obj is None:
-                raise Exception("Could not find" + ref)
-
-            reference_scode = self.find_objects_by_atom(
-                obj, "fp_text", QueryRecursionLevel.HERE
-            )
-            for s in reference_scode:
-                if s[1] == "reference":
-                    text_at = self.find_object_by_atom(
-                        s, "at", QueryRecursionLevel.HERE
-                    )
-                    if isinstance(text_at, list):
-                        while len(text_at) < 4:
-                            text_at.append("0")
-                        text_at[3] = str(ref_rot)
+            reference = footprint.texts.get("reference")
+            text_at = None if reference is None else reference.at
+            if text_at is not None:
+                while len(text_at) < 4:
+                    self.insert_item(text_at, len(text_at), "0")
+                self.set_atom(text_at, 3, str(ref_rot))
 
         # Set the primary location and rotation
-        at = self.find_footprint_at_by_reference(root, ref)
-        if at is None:
-            raise Exception("Could not find" + ref)
-
-        at.append("0")
-        old_rot = at[3]
-        while len(at) > 0:
-            at.pop()
-
-        at.append("at")
-        at.append(str(x))
-        at.append(str(y))
-        at.append(str(rot))
+        footprint.position = (x, y, rot)
 
     def add_bounding_box(
         self, root: SexpType, box: BoundingBox, width: float, layer: Layer
@@ -419,7 +753,7 @@ class KicadTool:
             ["fill", "none"],
         ]
 
-        root.append(_box)
+        self.append_node(root, _box)
 
     def get_bounding_box_of_layer_lines(
         self, root: SexpType, layerName: Layer
@@ -441,15 +775,9 @@ class KicadTool:
                     lines.append(g_line)
 
         box = BoundingBox()
-        for line in lines:
-            start = self.find_object_by_atom(line, "start", QueryRecursionLevel.DEEP)
-            end = self.find_object_by_atom(line, "end", QueryRecursionLevel.DEEP)
-
-            x1 = makeDecimal(start[1])
-            y1 = makeDecimal(start[2])
-            x2 = makeDecimal(end[1])
-            y2 = makeDecimal(end[2])
-
+        bounds = CoordinateBuffer(lines, ("start", "end")).bounds()
+        if bounds is not None:
+            x1, y1, x2, y2 = (Decimal(number_text(v)) for v in bounds)
             box.update_xy(x1 + origin_x, y1 + origin_y)
             box.update_xy(x2 + origin_x, y2 + origin_y)
 
@@ -473,25 +801,27 @@ class KicadTool:
             ["fill", fill],
         ]
 
-        root.append(o)
+        self.append_node(root, o)
 
     def move_recursive(self, root: SexpType, mx: Decimal, my: Decimal, mr: int) -> None:
         first_at = self.find_object_by_atom(root, "at", QueryRecursionLevel.HERE)
         while len(first_at) < 4:
-            first_at.append("0")
+            self.insert_item(first_at, len(first_at), "0")
 
         at_x = makeDecimal(first_at[1])
         at_y = makeDecimal(first_at[2])
         at_r = makeDecimal(first_at[3])
 
-        all_at = self.find_objects_by_atom(root, "at", QueryRecursionLevel.DEEP)
-        for atm in all_at:
+        # All the positions in one array, moved together
+        buffer = CoordinateBuffer([root], ("at",))
+        buffer.translate(float(mx - at_x), float(my - at_y))
+        buffer.write_back(self)
+
+        for atm in buffer.lists:
             while len(atm) != 4:
-                atm.append("0")
+                self.insert_item(atm, len(atm), "0")
 
-            atm[1] = str(makeDecimal(atm[1]) - at_x + mx)
-            atm[2] = str(makeDecimal(atm[2]) - at_y + my)
-            atm[3] = str(makeDecimal(atm[3]) - at_r + mr)
+            self.set_atom(atm, 3, str(makeDecimal(atm[3]) - at_r + mr))
 
     def get_absolute_pin_position_for_schematic(
         self,
@@ -537,51 +867,74 @@ class KicadTool:
         if value == PinNumber._4:
             pin_number = 4
 
+        if type != PinType.NUMBER:
+            raise Exception("Can only handle number pin type right now")
+
         item_lib_id = self.find_object_by_atom(obj, "lib_id", QueryRecursionLevel.HERE)
+        offset = self._pin_offsets(schematic_root).get(
+            (makeString(item_lib_id[1]), q_string(str(pin_number)))
+        )
+        if offset is not None:
+            symbol_at = self.find_object_by_atom(obj, "at", QueryRecursionLevel.HERE)
+            symbol_rotation = makeDecimal(symbol_at[3])
+
+            dx, dy = offset
+            if symbol_rotation == 0:
+                return [dx, dy]
+            if symbol_rotation == 90:
+                return [dy, -dx]
+            if symbol_rotation == 180:
+                return [-dx, dy]
+            if symbol_rotation == 270:
+                return [dy, dx]
+
+        raise Exception("Could not find pin offset")
+
+    def _pin_offsets(
+        self, schematic_root: SexpType
+    ) -> Dict[Tuple[str, str], Tuple[Decimal, Decimal]]:
+        """
+        Maps (lib_id, pin number) to the unrotated offset of the pin, for
+        every library symbol of the schematic.  It is made on first use and
+        kept until lib_symbols changes through append_node or remove_node.
+        """
+        cached = self.pin_offset_tables.get(id(schematic_root))
+        if cached is not None and cached[0] is schematic_root:
+            return cached[2]
 
         lib_symbols = self.find_object_by_atom(
             schematic_root, "lib_symbols", QueryRecursionLevel.DEEP
         )
-        symbols = self.find_objects_by_atom(
+        table: Dict[Tuple[str, str], Tuple[Decimal, Decimal]] = {}
+        for symbol in self.find_objects_by_atom(
             lib_symbols, "symbol", QueryRecursionLevel.HERE
-        )
-
-        for symbol in symbols:
-            if item_lib_id[1] == symbol[1]:
-                pins = self.find_objects_by_atom(
-                    symbol, "pin", QueryRecursionLevel.DEEP
+        ):
+            for pin in self.find_objects_by_atom(
+                symbol, "pin", QueryRecursionLevel.DEEP
+            ):
+                numbers = self.find_objects_by_atom(
+                    pin, "number", QueryRecursionLevel.DEEP
                 )
-                symbol_at = self.find_object_by_atom(
-                    obj, "at", QueryRecursionLevel.HERE
+                if len(numbers) != 1:
+                    continue
+                pin_at = self.find_object_by_atom(pin, "at", QueryRecursionLevel.HERE)
+                # The first symbol and pin win, as they did in the search
+                table.setdefault(
+                    (makeString(symbol[1]), makeString(numbers[0][1])),
+                    (makeDecimal(pin_at[1]), makeDecimal(pin_at[2])),
                 )
-                symbol_rotation = makeDecimal(symbol_at[3])
-
-                for pin in pins:
-                    if type != PinType.NUMBER:
-                        raise Exception("Can only handle number pin type right now")
-
-                    match = self.find_object_by_atom(
-                        pin, "number", QueryRecursionLevel.DEEP
-                    )
-                    pin_value = match[1]
-                    if pin_value == q_string(str(pin_number)):
-                        pin_at = self.find_object_by_atom(
-                            pin, "at", QueryRecursionLevel.HERE
-                        )
-
-                        dx = makeDecimal(pin_at[1])
-                        dy = makeDecimal(pin_at[2])
 
-                        if symbol_rotation == 0:
-                            return [dx, dy]
-                        if symbol_rotation == 90:
-                            return [dy, -dx]
-                        if symbol_rotation == 180:
-                            return [-dx, dy]
-                        if symbol_rotation == 270:
-                            return [dy, dx]
+        self.pin_offset_tables[id(schematic_root)] = (
+            schematic_root,
+            lib_symbols,
+            table,
+        )
+        return table
 
-        raise Exception("Could not find pin offset")
+    def _forget_pin_offsets(self, parent: SexpType, node: SexpType) -> None:
+        for key, (_, lib_symbols, _) in list(self.pin_offset_tables.items()):
+            if parent is lib_symbols or node is lib_symbols:
+                del self.pin_offset_tables[key]
 
     def _get_key_grid_info(self):
         pass
@@ -629,9 +982,9 @@ class KicadTool:
         self.move_recursive(symbol_diode, diode_x, diode_y, 90)
         self.move_recursive(symbol_switch_led, led_x, led_y, 0)
 
-        key_root.append(symbol_switch)
-        key_root.append(symbol_diode)
-        key_root.append(symbol_switch_led)
+        self.append_node(key_root, symbol_switch)
+        self.append_node(key_root, symbol_diode)
+        self.append_node(key_root, symbol_switch_led)
 
     def rotate_matrix(self, m: list[list[int]]):
         return [list(row) for row in zip(*m)]
@@ -854,7 +1207,7 @@ class KicadTool:
                     f"{global_label.global_label_prefix}{idx+1}"
                 )
                 self.move_recursive(global_label_symbol, p1.x, p1.y, 180)
-                root.append(global_label_symbol)
+                self.append_node(root, global_label_symbol)
 
         first_in_row = self.first_positive_in_rows(matrix_normal)
         first_in_col = self.first_positive_in_rows(matrix_rotated)
@@ -934,7 +1287,7 @@ class KicadTool:
         for wire in all_wires:
             wirec = KiSymbols.get_wire(wire)
             # if wire.type == WireType.GLOBAL:
-            root.append(wirec)
+            self.append_node(root, wirec)
 
     def draw_keepout_zone(
         self, root: SexpType, nx: Decimal, ny: Decimal, r: Decimal
@@ -977,22 +1330,21 @@ class KicadTool:
             ],
         ]
 
-        slot = self.find_objects_by_atom(o, "pts", QueryRecursionLevel.DEEP)
+        polygon = self.find_object_by_atom(o, "polygon", QueryRecursionLevel.HERE)
 
+        # A board gets one of these per standoff, so the points are kept
+        # packed; they are written out as (xy x y) just the same
+        coords = array("d")
         pts = points_in_circumference(float(r), 30)
         for point in pts:
-            rr: SexpType = ["xy", str(point[0] + float(nx)), str(point[1] + float(ny))]
-            slot[0].append(rr)
+            coords.append(point[0] + float(nx))
+            coords.append(point[1] + float(ny))
+        polygon[1] = PackedPts(coords)
 
-        root.append(o)
+        self.append_node(root, o)
 
     def remove_atoms(self, parent: SexpType, atom: str) -> None:
-        while True:
-            atoms = self.find_objects_by_atom(parent, atom, QueryRecursionLevel.HERE)
-            if len(atoms) == 0:
-                break
-
-            parent.remove(atoms[0])
+        self.remove_where(parent, lambda node: LazySexp.head_of(node) == atom)
 
     def add_sd123_model(self, parent: SexpType, path: str) -> None:
         o: SexpType = [
@@ -1002,7 +1354,7 @@ class KicadTool:
             ["scale", ["xyz", "1", "1", "1"]],
             ["rotate", ["xyz", "0", "0", "0"]],
         ]
-        parent.append(o)
+        self.append_node(parent, o)
 
     def add_switch_model(self, parent: SexpType, path: str) -> None:
         o: SexpType = [
@@ -1012,7 +1364,7 @@ class KicadTool:
             ["scale", ["xyz", "1", "1", "1"]],
             ["rotate", ["xyz", "-180", "0", "90"]],
         ]
-        parent.append(o)
+        self.append_node(parent, o)
 
     def add_keycap_model(self, parent: SexpType, url: str) -> None:
         o: SexpType = [
@@ -1022,4 +1374,4 @@ class KicadTool:
             ["scale", ["xyz", "0.4", "0.4", "0.4"]],
             ["rotate", ["xyz", "0", "0", "0"]],
         ]
-        parent.append(o)
+        self.append_node(parent, o)
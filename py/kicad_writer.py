@@ -0,0 +1,286 @@
+import io
+from typing import List, TextIO
+from kicad_parser import KiCadParser, SourceSexp, SourceType
+from packed_pts import PackedPts
+from sexp_clone import SharedSexp
+from sexptype import SexpType, SexpTypeValue
+
+
+class KiCadWriter:
+    """
+    Writes a parsed tree back out in the compact layout KiCad itself uses.
+    Lists that hold only atoms, like (at 1 2 90) or the (xy ...) of a pts
+    block, and lists holding nothing deeper than those, are put on the
+    line before for as long as it stays within LINE_WIDTH.  Any other list
+    starts a line of its own, indented two spaces per level, and its
+    closing bracket gets a line of its own too.
+
+        (symbol "R" (pin_names (offset 0)) (in_bom yes) (on_board yes)
+          (property "Reference" "R" (at 2.032 0 90)
+            (effects (font (size 1.27 1.27)))
+          )
+          (pin passive line (at 0 3.81 270) (length 1.27)
+            (name "~"
+              (effects (font (size 1.27 1.27)))
+            )
+          )
+        )
+
+    The writer walks the tree with an explicit stack, so deep trees cannot
+    hit the recursion limit, and it streams to the file in batches instead
+    of building the whole document in memory.
+
+    With splice=True, any SourceSexp that has not changed since it was
+    parsed is copied from the source text as it is, and so is the spacing
+    around the nodes that came from the source.  Only changed nodes are
+    laid out again, so the written file differs from the original only
+    where the tree does.  A file KiCad saved in its older exploded layout,
+    one list per line, so comes back with the changed nodes in the compact
+    layout among neighbours still in the exploded one.  The writer does
+    not reflow those neighbours, as that would change lines the tree does
+    not; write without splice for one layout throughout.
+    """
+
+    INDENT = "  "
+
+    # Short lists are put on the line before while it stays this short
+    LINE_WIDTH = 99
+
+    # How many pieces of text to collect before handing them to the file
+    FLUSH_PARTS = 4096
+
+    # Whitespace characters, and the closing bracket, in str and bytes
+    _SPACES = frozenset([*KiCadParser.WHITESPACE, *KiCadParser.WHITESPACE.encode()])
+    _CLOSE = frozenset([")", b")"])
+
+    def __init__(self, splice: bool = False):
+        self.splice = splice
+
+    def _is_clean(self, e: SexpTypeValue) -> bool:
+        return self.splice and isinstance(e, SourceSexp) and not e.dirty
+
+    def _source_gap(
+        self, before: SexpTypeValue, source: SourceType, end: int
+    ) -> str | None:
+        """
+        The original text between item `before` and offset `end` of the
+        same source, when that text is only whitespace, i.e. nothing that
+        used to sit between them has been removed.  Atoms do not know where
+        they were, so after one it is the whitespace just before `end`.
+        """
+        if not self.splice:
+            return None
+        if not isinstance(before, list):
+            start = end
+            while start > 0 and source[start - 1 : start] in self._SPACES:
+                start -= 1
+            # After a bracket, a list that was before it has been removed
+            if start == end or source[start - 1 : start] in self._CLOSE:
+                return None
+            gap = source[start:end]
+            return gap if isinstance(gap, str) else gap.decode("utf-8")
+        if not isinstance(before, SourceSexp):
+            return None
+        if before.source is not source or before.end > end:
+            return None
+        gap = before.source_span(before.end, end)
+        if gap.strip(KiCadParser.WHITESPACE):
+            return None
+        return gap
+
+    @staticmethod
+    def atom_text(atom: SexpTypeValue) -> str:
+        # Layer and friends are str enums; joining them uses their value
+        if isinstance(atom, str):
+            return atom
+        return str(atom)
+
+    def _leaf_text(self, node: SexpType) -> str | None:
+        """Returns the one-line form of `node`, or None if it holds lists."""
+        strings = True
+        for e in node:
+            if not isinstance(e, str):
+                if isinstance(e, list):
+                    return None
+                strings = False
+        if strings:
+            return "(" + " ".join(node) + ")"  # type: ignore[arg-type]
+        return "(" + " ".join(self.atom_text(e) for e in node) + ")"
+
+    def _short_text(self, node: SexpType, width: int) -> str | None:
+        """
+        Returns the one-line form of `node` if it holds only atoms and
+        atom-only lists and fits in `width`, else None.
+        """
+        if self._is_clean(node) or (
+            isinstance(node, SharedSexp) and node.node is not None
+        ):
+            return None
+        texts: List[str] = []
+        if isinstance(node, PackedPts) and not node.loaded:
+            texts.append("(pts")
+            length = 5
+            for xy in node.xy_texts():
+                length += len(xy) + 1
+                if length > width:
+                    return None
+                texts.append(xy)
+            return " ".join(texts) + ")"
+
+        length = 1
+        for e in node:
+            text: str | None
+            if isinstance(e, list):
+                text = None if isinstance(e, PackedPts) else self._leaf_text(e)
+                if text is None:
+                    return None
+            else:
+                text = self.atom_text(e)
+            length += len(text) + 1
+            if length > width:
+                return None
+            texts.append(text)
+        return "(" + " ".join(texts) + ")"
+
+    def write(self, root: SexpType, f: TextIO) -> None:
+        """Writes `root` and a trailing newline to the open text file `f`."""
+        parts: List[str] = []
+        # Length of the line written so far
+        column = 0
+        line_width = self.LINE_WIDTH
+
+        # Each entry is [node, index of the next child, closing bracket on
+        # a line of its own?, room for more on the current line?]
+        stack: List[list] = []
+
+        def put(text: str) -> None:
+            nonlocal column
+            parts.append(text)
+            newline = text.rfind("\n")
+            column = column + len(text) if newline < 0 else len(text) - newline - 1
+
+        def unshared(node: SexpType) -> SexpType:
+            if isinstance(node, SharedSexp) and node.node is not None:
+                # Written from a throwaway copy, so the clone stays shared
+                return node.node.to_sexp()
+            return node
+
+        def one_line(node: SexpType) -> str | None:
+            """The text of `node` if it is all on one line, else None."""
+            if self._is_clean(node):
+                assert isinstance(node, SourceSexp)
+                text = node.source_text()
+                return None if "\n" in text else text
+            if isinstance(node, PackedPts) and not node.loaded:
+                return None
+            return self._leaf_text(node)
+
+        def begin(node: SexpType) -> None:
+            if self._is_clean(node):
+                assert isinstance(node, SourceSexp)
+                put(node.source_text())
+                return
+            if isinstance(node, PackedPts) and not node.loaded:
+                # Straight from the array, laid out as the unpacked list would be
+                nonlocal column
+                indent = "\n" + self.INDENT * (len(stack) + 1)
+                parts.append("(pts")
+                column += 4
+                for xy in node.xy_texts():
+                    if column + 1 + len(xy) <= line_width:
+                        parts.append(" " + xy)
+                        column += 1 + len(xy)
+                    else:
+                        parts.append(indent + xy)
+                        column = len(indent) - 1 + len(xy)
+                parts.append(")")
+                column += 1
+                return
+            leaf = self._leaf_text(node)
+            if leaf is not None:
+                put(leaf)
+            else:
+                put("(")
+                stack.append([node, 0, False, True])
+
+        begin(unshared(root))
+
+        while stack:
+            entry = stack[-1]
+            node, i, wrapped, room = entry
+
+            if i == len(node):
+                stack.pop()
+                gap = None
+                if i > 0 and isinstance(node, SourceSexp):
+                    gap = self._source_gap(node[i - 1], node.source, node.end - 1)
+                if gap is not None:
+                    put(gap + ")")
+                elif wrapped:
+                    put("\n" + self.INDENT * len(stack) + ")")
+                else:
+                    put(")")
+                continue
+
+            entry[1] = i + 1
+            child = node[i]
+
+            if isinstance(child, list):
+                if type(child) is list:
+                    text = self._leaf_text(child)
+                else:
+                    child = unshared(child)
+                    text = one_line(child)
+                if text is None:
+                    width = line_width - len(self.INDENT) * len(stack)
+                    text = self._short_text(child, width)
+                gap = None
+                if i > 0 and isinstance(child, SourceSexp):
+                    gap = self._source_gap(node[i - 1], child.source, child.start)
+                # A node copied from the source keeps a line of its own, and
+                # anything new after it starts another
+                copied = gap is not None or self._is_clean(child)
+
+                if text is not None and not copied:
+                    if room and column + 1 + len(text) <= line_width:
+                        parts.append(" " + text)
+                        column += 1 + len(text)
+                    else:
+                        indent = self.INDENT * len(stack)
+                        parts.append("\n" + indent + text)
+                        column = len(indent) + len(text)
+                        # The document's closing bracket always gets a line
+                        if len(stack) == 1:
+                            entry[2] = True
+                    entry[3] = True
+                else:
+                    if gap is not None:
+                        put(gap)
+                    else:
+                        put("\n" + self.INDENT * len(stack))
+                    entry[3] = False
+                    if text is None:
+                        entry[2] = True
+                        begin(child)
+                    else:
+                        put(text)
+                        if gap is None or "\n" in gap:
+                            entry[2] = True
+            else:
+                atom = child if type(child) is str else self.atom_text(child)
+                if i > 0:
+                    atom = " " + atom
+                parts.append(atom)
+                column += len(atom)
+
+            if len(parts) >= self.FLUSH_PARTS:
+                f.write("".join(parts))
+                parts.clear()
+
+        parts.append("\n")
+        f.write("".join(parts))
+
+    def to_string(self, root: SexpType) -> str:
+        out = io.StringIO()
+        self.write(root, out)
+        return out.getvalue()
@@ -0,0 +1,119 @@
+import hashlib
+import marshal
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+from kicad_parser import KiCadParser, ScanMode
+from sexptype import SexpType
+
+
+class ParseCache:
+    """
+    Keeps parsed trees on disk so an unchanged document is not parsed again.
+
+    Each tree is stored with marshal under the SHA-256 of the document text
+    plus the parser version.  Editing the file in KiCad changes the hash, and
+    changing the parser changes KiCadParser.VERSION, so stale entries are
+    never read.  They are pruned instead: whenever a tree is stored, the
+    entries used longest ago are removed until the cache is back within
+    `max_bytes`.
+
+    The cache only ever saves time.  A directory that cannot be read or
+    written just means every document is parsed.
+
+    The loaded trees are plain lists.  Callers that want to splice changes
+    back into the file should keep using KiCadParser.to_lazy_list.
+    """
+
+    SUFFIX = ".marshal"
+    MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir: Path, max_bytes: int = MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # marshal's format is only stable within one Python version
+        python = f"py{sys.version_info[0]}{sys.version_info[1]}"
+        return f"{digest}.v{KiCadParser.VERSION}.{python}"
+
+    def path_for(self, text: str) -> Path:
+        return self.cache_dir / (self.key(text) + self.SUFFIX)
+
+    def load(self, name: Path) -> SexpType:
+        """Returns the tree of file `name`, from the cache if possible."""
+        with open(name, "r") as f:
+            text = f.read()
+        return self.parse(text)
+
+    def parse(self, text: str) -> SexpType:
+        """Returns the tree of `text`, from the cache if possible."""
+        tree = self.lookup(text)
+        if tree is None:
+            tree = KiCadParser(text).to_list(ScanMode.SLICE)
+            self.store(text, marshal.dumps(tree))
+        return tree
+
+    def lookup(self, text: str) -> Optional[SexpType]:
+        """Returns the cached tree of `text`, or None if there is none."""
+        path = self.path_for(text)
+        try:
+            # marshal.load on a file object reads a few bytes at a time;
+            # reading the whole entry first is several times faster
+            tree = marshal.loads(path.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            # Missing, unreadable or damaged
+            return None
+        if not isinstance(tree, list):
+            return None
+        try:
+            # Marks it as used, for prune
+            os.utime(path)
+        except OSError:
+            pass
+        return tree
+
+    def store(self, text: str, data: bytes) -> None:
+        """Saves the marshalled tree `data` as the tree of `text`."""
+        path = self.path_for(text)
+        # Write to the side and rename, so a reader never sees half a file
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            # Read-only, full or gone; the tree is simply not kept
+            try:
+                temp.unlink()
+            except OSError:
+                pass
+            return
+        self.prune()
+
+    def prune(self) -> None:
+        """Removes the entries used longest ago beyond `max_bytes`."""
+        entries: List[Tuple[float, int, Path]] = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.endswith(self.SUFFIX):
+                        stat = e.stat()
+                        entries.append((stat.st_mtime, stat.st_size, Path(e.path)))
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                # Another process got there first, or it is not ours to remove
+                continue
+            total -= size
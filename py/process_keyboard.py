@@ -7,16 +7,28 @@ from pathlib import Path
 import pickle
 import re
 import subprocess
-from typing import Callable, List
+from typing import Callable, List, Optional, Tuple, cast
 from common_key_format import CommonKeyData
+from document_loader import DocumentLoader
+from footprint_edits import (
+    CopyToBackSilkscreen,
+    FootprintEdit,
+    MoveTextToLayer,
+    PlaceFootprint,
+    SetTextHidden,
+)
+from journal import Journal
 from ki_symbols import KiSymbols
-from kicad_parser import KiCadParser
+from kicad_parser import LazySexp, SourceSexp
+from kicad_writer import KiCadWriter
 from kicad_tools import KicadTool, QueryRecursionLevel
 from kicad_tools import Layer
 from kicad_tools import BoundingBox
 from kle_tools import KleTools
+from parse_cache import ParseCache
 from qmk_tools import QmkTools
-from sexptype import SexpType, makeDecimal, makeString
+from sexp_printer import SexpPrinter
+from sexptype import SexpType
 
 BASE_THICKNESS = 3
 
@@ -111,6 +123,19 @@ class ProcessConfiguration:
     jlc_cpl_filename: Path
     json_path_to_qmk_layout: str
     save_mountinghole_filename: Path
+    parse_cache_path: Path
+
+    # What --dump prints; see SexpPrinter
+    dump_max_depth: Optional[int] = None
+    dump_heads: Optional[List[str]] = None
+    dump_reference: Optional[str] = None
+
+    # With dry_run, run_wrapped prints the changes it would make to the
+    # PCB and schematic instead of saving them
+    dry_run: bool = False
+    # Where run_wrapped saves those changes, to be applied or undone later
+    # with apply_change_set
+    save_changes_filename: Optional[Path] = None
 
     # These paths are relative to the KiCad project directory
     kicad_3dmodel_path_str: str
@@ -139,6 +164,8 @@ class ProcessKeyboard:
 
     def __init__(self, config: ProcessConfiguration):
         self.config = config
+        self.parse_cache = ParseCache(config.parse_cache_path)
+        self.loader = DocumentLoader(self.parse_cache)
         self.__populateCommonData()
         self.layout = self.__get_layout_from_kle()
 
@@ -147,6 +174,35 @@ class ProcessKeyboard:
             data = f.read()
         return data
 
+    def load_documents(
+        self, names: List[Path], editing: bool = False
+    ) -> List[SexpType]:
+        """
+        Loads several documents at once, through the parse cache.  The
+        trees are plain lists, for reading; with `editing` they are lazy
+        trees instead, for write_sexp to save again, and skip the cache
+        (see DocumentLoader.load_for_editing).
+        """
+        if editing:
+            return cast(List[SexpType], self.loader.load_for_editing(names))
+        return self.loader.load(names)
+
+    def write_sexp(
+        self, name: Path, root: SexpType, journal: Optional[Journal] = None
+    ) -> None:
+        """
+        Saves a document loaded with to_lazy_list.  Untouched nodes are
+        copied from the original text, and a document is only written if
+        it was changed or the journal has changes for it.  A plain list
+        cannot tell, so it is always written.
+        """
+        dirty = not isinstance(root, SourceSexp) or root.dirty
+        if not dirty and not (journal is not None and journal.changed(root)):
+            return
+
+        with open(name, "w") as f:
+            KiCadWriter(splice=True).write(root, f)
+
     def read_qmk_layout_from_json_file(self, name: Path) -> dict:
         with open(name, "r") as f:
             data = f.read()
@@ -185,9 +241,7 @@ class ProcessKeyboard:
     def set_designators(self, keys: List[KeyInfo]) -> None:
         filtered = list(filter(lambda key: not key.skip, keys))
 
-        key_sch_sexp = self.read_sexp(self.config.keyboard_sch_sheet_filename_name)
-        key_parser = KiCadParser(key_sch_sexp)
-        schematic = key_parser.to_list()
+        [schematic] = self.load_documents([self.config.keyboard_sch_sheet_filename_name])
 
         tool = KicadTool()
         value_references = tool.get_all_symbol_value_references(schematic)
@@ -242,19 +296,21 @@ class ProcessKeyboard:
         return keys
 
     def log_symbols(self, options: RunWrappedOptions) -> None:
-        schematic = options.schematic
-        key_parser = KiCadParser("")
-
-        print(schematic)
-        key_parser.print_list(schematic, 0)
+        printer = SexpPrinter(
+            max_depth=self.config.dump_max_depth,
+            heads=self.config.dump_heads,
+            reference=self.config.dump_reference,
+        )
+        printer.write(options.schematic)
 
     def clear_schematic(self, options: RunWrappedOptions) -> None:
         schematic = options.schematic
         tool = options.tool
 
-        tool.remove_atoms(schematic, "symbol")
-        tool.remove_atoms(schematic, "wire")
-        tool.remove_atoms(schematic, "global_label")
+        tool.remove_where(
+            schematic,
+            lambda node: LazySexp.head_of(node) in ("symbol", "wire", "global_label"),
+        )
 
     def add_schematic_lib_symbols(self, options: RunWrappedOptions) -> None:
         schematic = options.schematic
@@ -278,7 +334,7 @@ class ProcessKeyboard:
 
         for symbol in load_symbols:
             if symbol[1] in new_names:
-                schematic_lib_symbols.append(symbol)
+                tool.append_node(schematic_lib_symbols, symbol)
 
     def add_schematic_connections(self, options: RunWrappedOptions) -> None:
         key_schematic = options.schematic
@@ -340,15 +396,20 @@ class ProcessKeyboard:
 
     def run_wrapped(self, funcs: list[RunWrappedType]):
         # Prepare and load data
-        pcb_sexp = self.read_sexp(self.config.pcb_filename)
-        pcb_parser = KiCadParser(pcb_sexp)
-        pcb = pcb_parser.to_list()
-
-        key_sch_sexp = self.read_sexp(self.config.keyboard_sch_sheet_filename_name)
-        key_parser = KiCadParser(key_sch_sexp)
-        schematic = key_parser.to_list()
+        pcb, schematic = self.load_documents(
+            [self.config.pcb_filename, self.config.keyboard_sch_sheet_filename_name],
+            editing=True,
+        )
 
+        # Built by the first search that needs them, so a stage that only
+        # looks near the top of a document does not parse all of it
         tool = KicadTool()
+        for root in [pcb, schematic]:
+            tool.index_tree(root, lazy=True)
+            tool.index_references(root, lazy=True)
+        journal: Optional[Journal] = None
+        if self.config.dry_run or self.config.save_changes_filename is not None:
+            journal = tool.record_changes(pcb, schematic)
         mounting_holes: List[MountingHole] = []
 
         filtered_list = [obj for obj in self.layout if obj.designator != ""]
@@ -357,18 +418,20 @@ class ProcessKeyboard:
         for func in funcs:
             func(options)
 
-        ## Save data
-        pcb_list = pcb_parser.list_to_sexp(pcb)
-        out = "\r\n".join(pcb_list)
+        names = [self.config.pcb_filename, self.config.keyboard_sch_sheet_filename_name]
+        if journal is not None and self.config.dry_run:
+            self.print_changes(journal, names)
+            return
 
-        with open(self.config.pcb_filename, "w") as f:
-            f.write(out)
-
-        key_list = key_parser.list_to_sexp(schematic)
-        key_out = "\r\n".join(key_list)
+        ## Save data
+        self.write_sexp(self.config.pcb_filename, pcb, journal)
+        self.write_sexp(
+            self.config.keyboard_sch_sheet_filename_name, schematic, journal
+        )
 
-        with open(self.config.keyboard_sch_sheet_filename_name, "w") as f:
-            f.write(key_out)
+        if journal is not None and self.config.save_changes_filename is not None:
+            with open(self.config.save_changes_filename, "w") as f:
+                json.dump(journal.export(), f)
 
         if len(options.mounting_holes) > 0:
             with open(self.config.save_mountinghole_filename, 'wb') as f:
@@ -376,6 +439,37 @@ class ProcessKeyboard:
 
         # print(mounting_holes)
 
+    def print_changes(self, journal: Journal, names: List[Path]) -> None:
+        for name, counts in zip(names, journal.summary()):
+            kinds = ", ".join(f"{n} {kind.value}" for kind, n in counts.items())
+            print(f"{name}: {kinds or 'no changes'}")
+        for change in journal.changes:
+            print(f"  {names[change.document].name} {change}")
+
+    def apply_change_set(self, filename: Path, undo: bool = False) -> None:
+        """
+        Applies, or undoes, a change set saved by run_wrapped to the PCB
+        and schematic, without running anything else.
+        """
+        pcb, schematic = self.load_documents(
+            [self.config.pcb_filename, self.config.keyboard_sch_sheet_filename_name],
+            editing=True,
+        )
+
+        with open(filename, "r") as f:
+            journal = Journal.load(json.load(f), [pcb, schematic])
+
+        tool = KicadTool()
+        if undo:
+            tool.undo_changes(journal)
+        else:
+            tool.apply_changes(journal)
+
+        self.write_sexp(self.config.pcb_filename, pcb, journal)
+        self.write_sexp(
+            self.config.keyboard_sch_sheet_filename_name, schematic, journal
+        )
+
     def relocate_parts_and_draw_silkscreen(self, options: RunWrappedOptions) -> None:
         pcb = options.pcb
         schematic = options.schematic
@@ -383,21 +477,20 @@ class ProcessKeyboard:
 
         bbox = BoundingBox()
 
-        zones = tool.find_objects_by_atom(pcb, "zone", QueryRecursionLevel.HERE)
-        for zone in zones:
-            keepout_flag = tool.find_object_by_atom(
-                zone, "keepout", QueryRecursionLevel.HERE
-            )
-            if keepout_flag != None:
-                pcb.remove(zone)
+        def is_drawn_here(node: SexpType) -> bool:
+            # The keepout zones, circles and boxes a previous run drew
+            head = LazySexp.head_of(node)
+            if head == "zone":
+                keepout_flag = tool.find_object_by_atom(
+                    node, "keepout", QueryRecursionLevel.HERE
+                )
+                return keepout_flag != None
+            return head == "gr_circle" or head == "gr_rect"
 
-        shapes = tool.find_objects_by_atom(pcb, "gr_circle", QueryRecursionLevel.HERE)
-        for shape in shapes:
-            pcb.remove(shape)
+        tool.remove_where(pcb, is_drawn_here)
 
-        shapes = tool.find_objects_by_atom(pcb, "gr_rect", QueryRecursionLevel.HERE)
-        for shape in shapes:
-            pcb.remove(shape)
+        # The text edits and diode moves of every key, made in one pass at the end
+        edits: List[Tuple[str, List[FootprintEdit]]] = []
 
         for item in options.keys:
 
@@ -407,9 +500,6 @@ class ProcessKeyboard:
 
             switch = tool.find_footprint_by_reference(pcb, "SW" + item.designator)
             at = tool.find_footprint_at_by_reference(pcb, "SW" + item.designator)
-            tool.set_hidden_footprint_text_by_reference(
-                pcb, "SW" + item.designator, "value", False
-            )
 
             item.bounding_box = tool.get_bounding_box_of_layer_lines(
                 switch, Layer.User_Drawings
@@ -423,22 +513,28 @@ class ProcessKeyboard:
             bbox.update_xy(item.bounding_box.x1, item.bounding_box.y1)
             bbox.update_xy(item.bounding_box.x2, item.bounding_box.y2)
 
-            tool.set_object_location(
-                pcb,
-                "D" + item.designator,
-                item.diode_x,
-                item.diode_y,
-                Decimal(-90),
-                Decimal(90),
+            edits.append(
+                (
+                    "D" + item.designator,
+                    [
+                        PlaceFootprint(
+                            item.diode_x, item.diode_y, Decimal(-90), Decimal(90)
+                        ),
+                        CopyToBackSilkscreen("reference"),
+                    ],
+                )
             )
-
-            tool.copy_to_back_silkscreen(pcb, "D" + item.designator, "reference")
-            tool.copy_to_back_silkscreen(pcb, "SW" + item.designator, "reference")
-
-            tool.move_text_to_layer(
-                pcb, "SW" + item.designator, "value", Layer.F_Silkscreen
+            edits.append(
+                (
+                    "SW" + item.designator,
+                    [
+                        SetTextHidden("value", False),
+                        CopyToBackSilkscreen("reference"),
+                        MoveTextToLayer("value", Layer.F_Silkscreen),
+                        CopyToBackSilkscreen("value"),
+                    ],
+                )
             )
-            tool.copy_to_back_silkscreen(pcb, "SW" + item.designator, "value")
 
             populate_standoff = not item.designator in STANDOFF_HOLES_DO_NOT_POPULATE
             if True and populate_standoff:
@@ -457,6 +553,11 @@ class ProcessKeyboard:
                     hx, hy, STANDOFF_HOLE_INNER_DIAMETER, STANDOFF_HOLE_OUTER_DIAMETER
                 )
                 options.mounting_holes.append(hole)
+
+        missing = tool.edit_footprints(pcb, edits)
+        if missing:
+            raise Exception("Could not find " + ", ".join(missing))
+
         # jjz
         bbox.y1 -= self.config.pcb_border_top
         # bbox.x1 -= self.config.pcb_border_top
@@ -526,18 +627,8 @@ class ProcessKeyboard:
         diodesRefs = []
         prints = tool.find_objects_by_atom(pcb, "footprint", QueryRecursionLevel.HERE)
         for p in prints:
-
-            o = tool.find_objects_by_atom(p, "fp_text", QueryRecursionLevel.DEEP)
-            filtered = filter(
-                lambda fp: (isinstance(fp[2], str) and fp[1] == "reference")
-                and (fp[2].startswith('"D')),
-                o,
-            )
-
-            lf = list(filtered)
-            if len(lf) == 1:
-                ref1 = list(lf)[0][2]
-                ref = makeString(ref1).replace('"', "")
+            ref = tool.view_footprint(p).reference
+            if ref is not None and ref.startswith("D"):
                 diodesRefs.append(ref)
 
         diodesRefs.sort()
@@ -559,11 +650,8 @@ class ProcessKeyboard:
         for dRef in diodesRefs:
             bom_refs.append(dRef)
 
-            at = tool.find_footprint_at_by_reference(pcb, dRef)
-
-            x = makeDecimal(at[1])
-            y = makeDecimal(at[2])
-            r = makeDecimal(at[3])
+            diode = tool.find_footprint_by_reference(pcb, dRef)
+            x, y, r = tool.view_footprint(diode).position
 
             cpl_row = [
                 q(dRef),
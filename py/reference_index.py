@@ -0,0 +1,67 @@
+from typing import Callable, Dict, Hashable, List, Optional
+from sexptype import SexpListType, SexpType
+
+KeysType = Callable[[SexpType], List[Hashable]]
+
+
+class ReferenceIndex:
+    """
+    The lists directly inside one root, filed under keys such as their
+    reference designator, so KicadTool can look up a footprint without
+    matching every node of the board against a query.
+
+    `keys` gives the keys of one list, usually none or one.  Like
+    AtomIndex, it follows the lists added and removed through add() and
+    remove(); changing the atoms a key is made from leaves it out of date,
+    and with `lazy` the lists are only filed on the first lookup.
+    """
+
+    def __init__(self, root: SexpType, keys: KeysType, lazy: bool = False):
+        self.root = root
+        self.keys = keys
+        self._lists: Dict[Hashable, SexpListType] = {}
+        self.built = False
+        if not lazy:
+            self._build()
+
+    def _build(self) -> None:
+        self.built = True
+        # The root itself too, as a HERE search looks at it first
+        for node in [self.root, *self.root]:
+            if isinstance(node, list):
+                for key in self.keys(node):
+                    self._lists.setdefault(key, []).append(node)
+
+    def find(self, root: SexpType, key: Hashable) -> Optional[SexpListType]:
+        """
+        Returns the lists filed under `key`, in document order, or None if
+        `root` is not the indexed root.
+        """
+        if root is not self.root:
+            return None
+        if not self.built:
+            self._build()
+        return self._lists.get(key, [])
+
+    def add(self, parent: SexpType, node: SexpType) -> None:
+        """Files `node`, which has just been put into `parent`."""
+        if not self.built or parent is not self.root or not isinstance(node, list):
+            return
+        for key in self.keys(node):
+            lists = self._lists.setdefault(key, [])
+            lists.append(node)
+            if len(lists) > 1 and parent[-1] is not node:
+                # Put back in document order
+                order = {id(e): i for i, e in enumerate(parent)}
+                lists.sort(key=lambda e: order.get(id(e), -1))
+
+    def remove(self, node: SexpType) -> None:
+        """Forgets `node`, which is being taken out of the root."""
+        if not self.built:
+            return
+        for key in self.keys(node):
+            lists = self._lists.get(key, [])
+            for i, e in enumerate(lists):
+                if e is node:
+                    del lists[i]
+                    break
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+RUN_BENCHMARKS=1 python -m unittest tests.test_benchmarks -v
@@ -0,0 +1,240 @@
+import functools
+import re
+from typing import Callable, List, Optional, Tuple
+from atom_index import AtomIndex
+from kicad_parser import LazySexp
+from packed_pts import PackedPts
+from sexptype import SexpListType, SexpType
+
+Predicate = Callable[[SexpType], bool]
+
+# An atom in a selector: a quoted string, or anything without the
+# characters the selector syntax uses
+_ATOM_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s\[\]=.>"]+')
+# A value after =, where dots are allowed, as in [width=0.2]
+_VALUE_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s\[\]"]+')
+_SPACE_RE = re.compile(r"\s*")
+
+
+def _text(atom: str) -> str:
+    """The text of a selector atom, without its quotes."""
+    if atom.startswith('"'):
+        return atom[1:-1].replace('\\"', '"')
+    return atom
+
+
+def _spellings(text: str) -> Tuple[str, str]:
+    """The ways an atom with this text can be written in a tree."""
+    return (text, '"' + text.replace('"', '\\"') + '"')
+
+
+class Selector:
+    """
+    A query such as footprint[fp_text.reference="SW227"] > at, compiled
+    into one predicate per step.
+
+    A step matches the atoms a list starts with: fp_text.reference="SW227"
+    is (fp_text reference "SW227" ...), and just fp_text any fp_text list;
+    * matches any list.  It can be followed by conditions on the child
+    lists, in the same form: footprint[fp_text.reference="SW227"] is a
+    footprint with such a child.  Atoms match with or without their
+    quotes, so property.Reference finds (property "Reference" ...).  Steps
+    are joined by > for a child, or by a space for any descendant.
+
+    Compile with Selector.compile, which keeps every selector it has
+    compiled, and run with select().
+    """
+
+    def __init__(
+        self, text: str, steps: List[Tuple[Optional[str], Predicate]], combinators
+    ):
+        self.text = text
+        # (head atom or None for *, predicate) for each step
+        self.steps = steps
+        # combinators[k] joins steps k - 1 and k: ">" or " "
+        self.combinators: List[str] = combinators
+
+    def __repr__(self) -> str:
+        return f"Selector({self.text!r})"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def compile(text: str) -> "Selector":
+        steps: List[Tuple[Optional[str], Predicate]] = []
+        combinators: List[str] = [""]
+        i = _SPACE_RE.match(text).end()  # type: ignore[union-attr]
+        while True:
+            i, step = Selector._compile_step(text, i)
+            steps.append(step)
+
+            j = _SPACE_RE.match(text, i).end()  # type: ignore[union-attr]
+            if j == len(text):
+                break
+            if text[j] == ">":
+                combinators.append(">")
+                j = _SPACE_RE.match(text, j + 1).end()  # type: ignore[union-attr]
+            elif j > i:
+                combinators.append(" ")
+            else:
+                raise Exception(f"Bad selector {text!r} at {j}")
+            i = j
+
+        return Selector(text, steps, combinators)
+
+    @staticmethod
+    def _compile_step(text: str, i: int) -> Tuple[int, Tuple[Optional[str], Predicate]]:
+        head: Optional[str] = None
+        atoms: Optional[Predicate] = None
+        if text.startswith("*", i):
+            i += 1
+        else:
+            i, head, atoms = Selector._compile_atoms(text, i)
+
+        conditions: List[Predicate] = []
+        while text.startswith("[", i):
+            i, _, condition = Selector._compile_atoms(text, i + 1)
+            if not text.startswith("]", i):
+                raise Exception(f"Bad selector {text!r} at {i}")
+            i += 1
+            conditions.append(Selector._any_child(condition))
+
+        def matches(node: SexpType) -> bool:
+            if atoms is not None and not atoms(node):
+                return False
+            for condition in conditions:
+                if not condition(node):
+                    return False
+            return True
+
+        return i, (head, matches)
+
+    @staticmethod
+    def _compile_atoms(text: str, i: int) -> Tuple[int, str, Predicate]:
+        """
+        Compiles atom.atom...[=value], which matches a list starting with
+        those atoms, and returns the first atom and the predicate.
+        """
+        path: List[str] = []
+        while True:
+            m = _ATOM_RE.match(text, i)
+            if m is None:
+                raise Exception(f"Bad selector {text!r} at {i}")
+            path.append(_text(m.group()))
+            i = m.end()
+            if not text.startswith(".", i):
+                break
+            i += 1
+
+        if text.startswith("=", i):
+            m = _VALUE_RE.match(text, i + 1)
+            if m is None:
+                raise Exception(f"Bad selector {text!r} at {i + 1}")
+            path.append(_text(m.group()))
+            i = m.end()
+
+        heads = _spellings(path[0])
+        rest = [(k, _spellings(atom)) for k, atom in enumerate(path)][1:]
+        size = len(path)
+
+        def atoms(node: SexpType) -> bool:
+            if len(node) < size or LazySexp.head_of(node) not in heads:
+                return False
+            for k, spellings in rest:
+                if node[k] not in spellings:
+                    return False
+            return True
+
+        return i, path[0], atoms
+
+    @staticmethod
+    def _any_child(matches: Predicate) -> Predicate:
+        def condition(node: SexpType) -> bool:
+            for e in node:
+                if isinstance(e, list) and matches(e):
+                    return True
+            return False
+
+        return condition
+
+    def select(self, root: SexpType, index: Optional[AtomIndex] = None) -> SexpListType:
+        """
+        Returns `root` and the lists inside it that the selector picks out,
+        in document order.  With an index of the tree, the candidates for
+        the last step come from the index and only their ancestors are
+        checked; otherwise the tree is walked once.
+        """
+        head = self.steps[-1][0]
+        if index is not None and head is not None:
+            candidates = index.find(root, head)
+            if candidates is not None:
+                last = len(self.steps) - 1
+                return [
+                    node
+                    for node in candidates
+                    if self._matches_up(node, last, root, index)
+                ]
+        return self._walk(root)
+
+    def _matches_up(
+        self, node: SexpType, k: int, root: SexpType, index: AtomIndex
+    ) -> bool:
+        """Whether `node` matches step k, and its ancestors the steps before."""
+        if not self.steps[k][1](node):
+            return False
+        if k == 0:
+            return True
+
+        parent = None if node is root else index.parent_of(node)
+        if self.combinators[k] == ">":
+            return parent is not None and self._matches_up(parent, k - 1, root, index)
+        while parent is not None:
+            if self._matches_up(parent, k - 1, root, index):
+                return True
+            parent = None if parent is root else index.parent_of(parent)
+        return False
+
+    def _walk(self, root: SexpType) -> SexpListType:
+        out: SexpListType = []
+        last = len(self.steps) - 1
+        # Packed blocks only hide xy lists
+        skip_packed = all(head not in (None, "xy") for head, _ in self.steps)
+
+        steps = [
+            (k, matches, self.combinators[k] == ">")
+            for k, (_, matches) in enumerate(self.steps)
+        ]
+
+        def states(node: SexpType, parent_states, above) -> Tuple[int, ...]:
+            # The steps k for which `node` ends a match of steps 0..k
+            found: Tuple[int, ...] = ()
+            for k, matches, child in steps:
+                if k > 0 and k - 1 not in (parent_states if child else above):
+                    continue
+                if matches(node):
+                    found += (k,)
+            return found
+
+        root_states = states(root, (), ())
+        if last in root_states:
+            out.append(root)
+
+        # Each entry is [iterator over children, states of the node,
+        # states of the node and everything above it]
+        stack: List[list] = [[iter(root), root_states, frozenset(root_states)]]
+        while stack:
+            entry = stack[-1]
+            for child in entry[0]:
+                if not isinstance(child, list):
+                    continue
+                child_states = states(child, entry[1], entry[2])
+                if last in child_states:
+                    out.append(child)
+                if skip_packed and isinstance(child, PackedPts) and not child.loaded:
+                    continue
+                above = entry[2].union(child_states) if child_states else entry[2]
+                stack.append([iter(child), child_states, above])
+                break
+            else:
+                stack.pop()
+
+        return out
@@ -0,0 +1,155 @@
+import copy
+from array import array
+from typing import Optional
+from packed_pts import PackedPts
+from sexp_node import SexpNode
+from sexptype import SexpType, lazy_equal, load_lazy
+
+
+class SharedSexp(list):
+    """
+    A list that reads from an immutable SexpNode until it is first used.
+    Its head atom and length are known without loading it; anything else
+    loads one level, children becoming SharedSexp on the nodes below, so
+    a subtree that is never looked at stays shared with every other
+    clone of it.  Atoms are strings and shared as they are.
+
+    Make one with share(), which takes a snapshot of a tree once, and
+    then as many clone()s of it as needed: each costs only the levels it
+    goes on to read or write, not the size of the whole tree.
+    """
+
+    __slots__ = ("node",)
+
+    def __init__(self, node: SexpNode):
+        super().__init__()
+        self.node: Optional[SexpNode] = node
+
+    @property
+    def loaded(self) -> bool:
+        return self.node is None
+
+    def _load(self) -> None:
+        node = self.node
+        if node is None:
+            return
+        self.node = None
+        if node.head is not None:
+            list.append(self, node.head)
+        list.extend(
+            self,
+            [SharedSexp(e) if isinstance(e, SexpNode) else e for e in node.children],
+        )
+
+    def __getitem__(self, index):
+        node = self.node
+        if index == 0 and node is not None and node.head is not None:
+            return node.head
+        self._load()
+        return list.__getitem__(self, index)
+
+    def __len__(self) -> int:
+        node = self.node
+        if node is not None:
+            return len(node.children) + (node.head is not None)
+        return list.__len__(self)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, list):
+            return NotImplemented
+        if isinstance(other, SharedSexp) and self.node is not None:
+            if self.node is other.node:
+                return True
+        return lazy_equal(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __deepcopy__(self, memo):
+        if self.node is not None:
+            return self.node.to_sexp()
+        return copy.deepcopy(list(self), memo)
+
+    def __copy__(self):
+        self._load()
+        return list(self)
+
+    def __reduce_ex__(self, protocol):
+        self._load()
+        return (list, (list(self),))
+
+
+def share(root: SexpType) -> SharedSexp:
+    """A snapshot of `root` that clone() can copy cheaply."""
+    return SharedSexp(SexpNode.from_sexp(root))
+
+
+def clone(root: SexpType) -> SexpType:
+    """
+    A copy of `root` that shares everything it can with it.  Levels of a
+    SharedSexp that were never loaded are shared, so cloning a share() is
+    free and cloning one that has been used copies only the levels it
+    loaded.  Any other list is copied, as copy.deepcopy
+    would, but without its memo, and a packed pts block stays packed.
+    """
+    if isinstance(root, SharedSexp) and root.node is not None:
+        return SharedSexp(root.node)
+    if isinstance(root, PackedPts) and root.coords is not None:
+        return PackedPts(array("d", root.coords))
+    return [clone(e) if isinstance(e, list) else e for e in root]
+
+
+def _loading(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _loading_both(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, other):
+        self._load()
+        # list reads the items of another list directly, without its methods
+        load_lazy(other)
+        return method(self, other)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+# Everything else works on the loaded level
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "__iter__",
+    "__reversed__",
+    "__contains__",
+    "__mul__",
+    "__repr__",
+    "append",
+    "extend",
+    "insert",
+    "remove",
+    "pop",
+    "clear",
+    "sort",
+    "reverse",
+    "index",
+    "count",
+    "copy",
+):
+    setattr(SharedSexp, _name, _loading(_name))
+
+for _name in ("__add__", "__lt__", "__le__", "__gt__", "__ge__"):
+    setattr(SharedSexp, _name, _loading_both(_name))
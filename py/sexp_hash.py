@@ -0,0 +1,65 @@
+import hashlib
+from typing import Dict, Iterable, List
+from kicad_parser import SourceSexp
+from sexptype import SexpType
+
+DIGEST_SIZE = 16
+
+
+def structural_hash(root: SexpType) -> bytes:
+    """
+    Returns a hash of the structure and atoms of `root`, the same for any
+    two equal trees, across runs and regardless of how the source was laid
+    out.  A list's hash is built from its atoms and the hashes of its
+    child lists, Merkle style.
+
+    Each SourceSexp keeps its hash, so asking again is free until a change
+    to the node or anything below it clears it (see SourceSexp.touch).
+    Plain lists cannot tell when they change, so their hashes are worked
+    out again every time, and a SourceSexp holding one does not keep its
+    hash either.
+    """
+    if isinstance(root, SourceSexp) and root.digest is not None:
+        return root.digest
+
+    # Each entry is [node, next index, hasher, can the hash be kept?]
+    stack: List[list] = [[root, 0, hashlib.blake2b(digest_size=DIGEST_SIZE), True]]
+
+    while True:
+        entry = stack[-1]
+        node, i, hasher, keep = entry
+
+        if i == len(node):
+            digest = hasher.digest()
+            keep = keep and isinstance(node, SourceSexp)
+            if keep:
+                node.digest = digest
+
+            stack.pop()
+            if not stack:
+                return digest
+
+            parent = stack[-1]
+            parent[2].update(b"(" + digest)
+            parent[3] = parent[3] and keep
+            continue
+
+        entry[1] = i + 1
+        e = node[i]
+
+        if isinstance(e, list):
+            if isinstance(e, SourceSexp) and e.digest is not None:
+                hasher.update(b"(" + e.digest)
+            else:
+                stack.append([e, 0, hashlib.blake2b(digest_size=DIGEST_SIZE), True])
+        else:
+            text = (e if isinstance(e, str) else str(e)).encode("utf-8")
+            hasher.update(b"'" + len(text).to_bytes(4, "little") + text)
+
+
+def group_by_hash(nodes: Iterable[SexpType]) -> Dict[bytes, List[SexpType]]:
+    """Groups identical subtrees together, keyed by their hash."""
+    groups: Dict[bytes, List[SexpType]] = {}
+    for node in nodes:
+        groups.setdefault(structural_hash(node), []).append(node)
+    return groups
@@ -0,0 +1,99 @@
+import sys
+from typing import Dict, List, Optional, Tuple, Union
+from sexptype import SexpType
+
+SexpNodeValue = Union[str, "SexpNode"]
+
+
+class SexpNode:
+    """
+    A compact, read-mostly form of a parsed tree.  Each list becomes a
+    SexpNode holding its head atom and a tuple of the rest, and atoms are
+    shared: heads through sys.intern, everything else through one table per
+    document, so the thousands of "at", "0" and "\"F.Cu\"" tokens in a
+    board are each stored once.
+
+    KicadTool works on SexpType lists; convert with to_sexp() before
+    handing a tree to it, and with from_sexp() to store one compactly.
+    """
+
+    __slots__ = ("head", "children")
+
+    def __init__(
+        self, head: Optional[str], children: Tuple[SexpNodeValue, ...] = ()
+    ) -> None:
+        self.head = head
+        self.children = children
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SexpNode):
+            return NotImplemented
+        return self.head == other.head and self.children == other.children
+
+    def __repr__(self) -> str:
+        return f"SexpNode({self.head!r}, {self.children!r})"
+
+    @staticmethod
+    def make(items: List[SexpNodeValue]) -> "SexpNode":
+        """Builds a node from the items of one list, interning its head."""
+        if items and isinstance(items[0], str):
+            return SexpNode(sys.intern(items[0]), tuple(items[1:]))
+        return SexpNode(None, tuple(items))
+
+    @staticmethod
+    def from_sexp(root: SexpType, atoms: Optional[Dict[str, str]] = None) -> "SexpNode":
+        """
+        Converts a nested list to nodes.  Atoms are shared through `atoms`,
+        which can be passed in to share them across several documents.
+        """
+        if atoms is None:
+            atoms = {}
+
+        # Each entry is [list being converted, next index, converted items]
+        stack: List[list] = [[root, 0, []]]
+        while True:
+            entry = stack[-1]
+            source, i, items = entry
+
+            if i == len(source):
+                stack.pop()
+                node = SexpNode.make(items)
+                if not stack:
+                    return node
+                stack[-1][2].append(node)
+                continue
+
+            entry[1] = i + 1
+            e = source[i]
+            if isinstance(e, list):
+                stack.append([e, 0, []])
+            else:
+                items.append(atoms.setdefault(e, e))
+
+    def to_sexp(self) -> SexpType:
+        """Converts back to the nested list form KicadTool works on."""
+        ret: SexpType = []
+
+        # Each entry is [node, next child index, list being built]
+        stack: List[list] = [[self, 0, ret]]
+        if self.head is not None:
+            ret.append(self.head)
+
+        while stack:
+            entry = stack[-1]
+            node, i, out = entry
+
+            if i == len(node.children):
+                stack.pop()
+                continue
+
+            entry[1] = i + 1
+            e = node.children[i]
+            if isinstance(e, SexpNode):
+                new_list: SexpType = [] if e.head is None else [e.head]
+                out.append(new_list)
+                stack.append([e, 0, new_list])
+            else:
+                out.append(e)
+
+        return ret
@@ -0,0 +1,115 @@
+import fnmatch
+import sys
+from typing import Collection, Iterator, List, Optional, TextIO
+from kicad_tools import KicadTool
+from sexptype import SexpType, SexpTypeValue
+
+
+class SexpPrinter:
+    """
+    Prints a tree, or the parts of it a filter picks out, as the Python
+    list literal print() would show, so the output can be pasted into code
+    such as KiSymbols.  The text is produced piece by piece and written in
+    batches, so memory use does not grow with the size of the document.
+
+    max_depth limits how deep lists are printed: lists nested deeper than
+    that are shown as [...], with 0 meaning only the atoms of the printed
+    node itself.  heads picks out nodes by head atom, e.g. ("symbol",), and
+    reference by a reference designator pattern such as "SW2*".
+    """
+
+    # How many pieces of text to collect before handing them to the file
+    FLUSH_PARTS = 4096
+
+    def __init__(
+        self,
+        max_depth: Optional[int] = None,
+        heads: Optional[Collection[str]] = None,
+        reference: Optional[str] = None,
+    ):
+        self.max_depth = max_depth
+        self.heads = heads
+        self.reference = reference
+
+    def matches(self, node: SexpType) -> bool:
+        if self.heads is not None and (not node or node[0] not in self.heads):
+            return False
+        if self.reference is not None:
+            ref = KicadTool.get_reference(node)
+            if ref is None or not fnmatch.fnmatchcase(ref, self.reference):
+                return False
+        return True
+
+    def select(self, root: SexpType) -> Iterator[SexpType]:
+        """Yields the nodes the filter picks out, in document order."""
+        if self.heads is None and self.reference is None:
+            yield root
+            return
+
+        # Each entry is [node, index of the next child]
+        stack: List[list] = [[root, 0]]
+        while stack:
+            entry = stack[-1]
+            node, i = entry
+            if i == len(node):
+                stack.pop()
+                continue
+            entry[1] = i + 1
+
+            child = node[i]
+            if isinstance(child, list):
+                if self.matches(child):
+                    yield child
+                else:
+                    stack.append([child, 0])
+
+    @staticmethod
+    def atom_repr(atom: SexpTypeValue) -> str:
+        # Typed atoms and str enums print as the plain string they hold
+        if type(atom) is str or not isinstance(atom, str):
+            return repr(atom)
+        return repr(str.__str__(atom))
+
+    def iter_repr(self, node: SexpType) -> Iterator[str]:
+        """Yields the list literal for `node` in small pieces."""
+        yield "["
+
+        # Each entry is [node, index of the next child]
+        stack: List[list] = [[node, 0]]
+        while stack:
+            entry = stack[-1]
+            current, i = entry
+            if i == len(current):
+                stack.pop()
+                yield "]"
+                continue
+            entry[1] = i + 1
+
+            if i > 0:
+                yield ", "
+            child = current[i]
+            if not isinstance(child, list):
+                yield self.atom_repr(child)
+            elif self.max_depth is not None and len(stack) > self.max_depth:
+                yield "[...]"
+            else:
+                yield "["
+                stack.append([child, 0])
+
+    def iter_text(self, root: SexpType) -> Iterator[str]:
+        """Yields the output for `root`, one selected node per line."""
+        for node in self.select(root):
+            yield from self.iter_repr(node)
+            yield "\n"
+
+    def write(self, root: SexpType, f: Optional[TextIO] = None) -> None:
+        """Writes the output for `root` to `f`, by default sys.stdout."""
+        if f is None:
+            f = sys.stdout
+        parts: List[str] = []
+        for part in self.iter_text(root):
+            parts.append(part)
+            if len(parts) >= self.FLUSH_PARTS:
+                f.write("".join(parts))
+                parts.clear()
+        f.write("".join(parts))
@@ -1,5 +1,7 @@
+import re
 from decimal import Decimal
 from enum import Enum
+from functools import cached_property
 from typing import Union, List
 
 
@@ -25,15 +27,100 @@ SexpType = List[SexpTypeValue]
 SexpListType = List[SexpType]
 
 
+class SymbolAtom(str):
+    """A bare atom such as `at` or `F.Cu`, as produced with typed=True."""
+
+
+class NumberAtom(str):
+    """
+    A numeric atom.  It is still the original text, so it writes back
+    unchanged, but its Decimal is worked out once and kept.
+    """
+
+    @cached_property
+    def value(self) -> Decimal:
+        return Decimal(self)
+
+
+class QuotedAtom(str):
+    """A quoted atom, still including its quotes, with the unquoted text."""
+
+    ESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+    # Escapes that stand for another character; any other escaped
+    # character, such as \" or \\, stands for itself
+    ESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+
+    @cached_property
+    def text(self) -> str:
+        return self.unquote(self)
+
+    @classmethod
+    def unquote(cls, token: str) -> str:
+        """The text of quoted `token`, with its escapes worked out."""
+        escapes = cls.ESCAPES
+        return cls.ESCAPE_RE.sub(
+            lambda m: escapes.get(m.group(1), m.group(1)), token[1:-1]
+        )
+
+
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)")
+
+
+def makeAtom(token: str) -> str:
+    """Wraps a token from the parser in the matching typed atom class."""
+    if token[0] == '"':
+        return QuotedAtom(token)
+    if NUMBER_RE.fullmatch(token):
+        return NumberAtom(token)
+    return SymbolAtom(token)
+
+
 def makeDecimal(v: SexpTypeValue):
-    if isinstance(v, str):
+    if isinstance(v, NumberAtom):
+        return v.value
+    elif isinstance(v, str):
         return Decimal(v)
     else:
         raise TypeError(f"(makeDecimal) Expected a string, but got {type(v).__name__}")
 
 
+def makeText(v: SexpTypeValue) -> str:
+    """
+    Returns the text of an atom without its quotes, and with its escapes
+    worked out, as a plain str whether or not the tree is typed.
+    """
+    if isinstance(v, QuotedAtom):
+        return v.text
+    s = makeString(v)
+    if len(s) >= 2 and s[0] == '"' and s[-1] == '"':
+        return QuotedAtom.unquote(s)
+    return str.strip(s, '"')
+
+
 def makeString(v: SexpTypeValue):
     if isinstance(v, str):
         return v
     else:
         raise TypeError(f"(makeString) Expected a string, but got {type(v).__name__}")
+
+
+def load_lazy(node: object) -> None:
+    """
+    Fills in `node` if it is a list that keeps its items elsewhere until
+    first used (LazySexp, PackedPts, SharedSexp), so that list's own
+    methods, which read the items directly, see them.
+    """
+    load = getattr(node, "_load", None)
+    if load is not None:
+        load()
+
+
+def lazy_equal(node: SexpType, other: object):
+    """node == other for a lazy list `node`, whatever kind `other` is."""
+    if node is other:
+        return True
+    if not isinstance(other, list):
+        return NotImplemented
+    load_lazy(node)
+    load_lazy(other)
+    return list.__eq__(node, other)
@@ -0,0 +1,20 @@
+import unittest
+from kicad_parser import KiCadParser, ScanMode
+from sexptype import SexpType
+
+
+def read_file(name: str) -> str:
+    with open(name, "r") as f:
+        return f.read()
+
+
+def read_tree(name: str) -> SexpType:
+    with open(name, "r") as f:
+        return KiCadParser(f.read()).to_list(ScanMode.SLICE)
+
+
+def assert_same_nodes(test: unittest.TestCase, found, expected):
+    """Checks that `found` holds the very nodes of `expected`, in order."""
+    test.assertEqual(len(found), len(expected))
+    for a, b in zip(found, expected):
+        test.assertIs(a, b)
@@ -0,0 +1,151 @@
+import unittest
+from atom_index import AtomIndex
+from kicad_parser import KiCadParser, ScanMode
+from kicad_tools import KicadTool, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from tests.helpers import assert_same_nodes, read_file
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+ATOMS = ["footprint", "fp_text", "at", "layer", "xyz", "effects", "kicad_pcb"]
+
+
+def walk(root, atom):
+    return KicadTool().find_objects_by_foo(root, [atom], QueryRecursionLevel.DEEP)
+
+
+class TestAtomIndex(unittest.TestCase):
+    def test_find_matches_walk(self):
+        pcb = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list(ScanMode.SLICE)
+        index = AtomIndex(pcb)
+
+        footprints = walk(pcb, "footprint")
+        for root in [pcb, footprints[0], footprints[-1]]:
+            for atom in ATOMS:
+                with self.subTest(atom=atom):
+                    assert_same_nodes(self, index.find(root, atom), walk(root, atom))
+
+        self.assertEqual(index.find(pcb, "no_such_atom"), [])
+        self.assertIsNone(index.find(["footprint"], "at"))
+
+    def test_parent_and_depth(self):
+        root = KiCadParser("(a (b (c 1)) (d))").to_list()
+        index = AtomIndex(root)
+        c = root[1][1]
+
+        self.assertIsNone(index.parent_of(root))
+        self.assertIs(index.parent_of(c), root[1])
+        self.assertEqual(index.depth_of(root), 0)
+        self.assertEqual(index.depth_of(c), 2)
+        self.assertIsNone(index.depth_of(["c", "1"]))
+
+    def test_parent_without_building(self):
+        root = KiCadParser("(a (b (c 1)) (d))").to_list()
+        index = AtomIndex(root, lazy=True)
+        b, c, d = root[1], root[1][1], root[2]
+
+        self.assertIs(index.parent_of(c), b)
+        self.assertIsNone(index.parent_of(root))
+        self.assertFalse(index.built)
+
+        e = ["e", ["f"]]
+        d.append(e)
+        index.add(d, e)
+        del b[1]
+        index.remove(c)
+        self.assertIs(index.parent_of(e[1]), e)
+        self.assertIsNone(index.parent_of(c))
+        # Lists put into another tree are not this index's
+        other = ["x"]
+        index.add(["y"], other)
+        self.assertIsNone(index.parent_of(other))
+        self.assertFalse(index.built)
+
+        self.assertIs(index.find(root, "f")[0], e[1])
+        self.assertIs(index.parent_of(e[1]), e)
+
+    def test_tool_keeps_index_up_to_date(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 1)) (d (c 2)))").to_list()
+        tool.index_tree(root)
+
+        tool.append_node(root[2], ["c", "3"])
+        tool.append_node(root, ["e", ["c", "4"]])
+        tool.remove_node(root, root[1])
+        self.assertEqual(root, ["a", ["d", ["c", "2"], ["c", "3"]], ["e", ["c", "4"]]])
+
+        found = tool.find_objects_by_atom(root, "c", QueryRecursionLevel.DEEP)
+        assert_same_nodes(self, found, walk(root, "c"))
+        assert_same_nodes(
+            self,
+            tool.find_objects_by_atom(root[1], "c", QueryRecursionLevel.DEEP),
+            walk(root[1], "c"),
+        )
+
+    def test_remove_node_is_by_identity(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b 1) (b 1))").to_list()
+        tool.index_tree(root)
+        second = root[2]
+
+        tool.remove_node(root, second)
+        self.assertIs(
+            tool.find_objects_by_atom(root, "b", QueryRecursionLevel.DEEP)[0], root[1]
+        )
+        with self.assertRaises(ValueError):
+            tool.remove_node(root, second)
+
+    def test_many_inserts_in_one_place(self):
+        # Enough appends to one small list to use up the room between
+        # numbers, so the index renumbers itself
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 0)) (d (c 1)))").to_list()
+        index = tool.index_tree(root)
+
+        for i in range(100):
+            tool.append_node(root[1], ["c", str(i + 2), ["c", "x"]])
+
+        assert_same_nodes(self, index.find(root, "c"), walk(root, "c"))
+        assert_same_nodes(self, index.find(root[1], "c"), walk(root[1], "c"))
+
+    def test_packed_points_are_walked(self):
+        s = "(a (polygon (pts (xy 1 2) (xy 3 4))))"
+        root = KiCadParser(s).to_list(packed=True)
+        index = AtomIndex(root)
+
+        self.assertIsNone(index.find(root, "xy"))
+        self.assertEqual(len(index.find(root, "pts")), 1)
+        self.assertEqual(len(walk(root, "xy")), 2)
+
+    def test_lazy_tree_still_splices(self):
+        s = read_file(SAMPLE_KEYBOARD_SCH_FILENAME)
+        schematic = KiCadParser(s).to_lazy_list()
+        tool = KicadTool()
+        tool.index_tree(schematic)
+
+        self.assertEqual(KiCadWriter(splice=True).to_string(schematic), s)
+        self.assertEqual(
+            tool.find_objects_by_atom(schematic, "symbol", QueryRecursionLevel.DEEP),
+            walk(KiCadParser(s).to_list(), "symbol"),
+        )
+
+    def test_lazy_index_waits_for_a_search(self):
+        s = read_file(SAMPLE_KEYBOARD_SCH_FILENAME)
+        schematic = KiCadParser(s).to_lazy_list()
+        tool = KicadTool()
+        index = tool.index_tree(schematic, lazy=True)
+
+        # Edits before the first search need no index
+        wire = ["wire", ["pts", ["xy", "0", "0"], ["xy", "1", "0"]]]
+        tool.append_node(schematic, wire)
+        tool.remove_node(schematic, schematic[1])
+        self.assertFalse(index.built)
+        self.assertFalse(schematic[2].loaded)
+
+        found = tool.find_objects_by_atom(schematic, "wire", QueryRecursionLevel.DEEP)
+        self.assertTrue(index.built)
+        self.assertIs(found[-1], wire)
+        assert_same_nodes(self, found, walk(schematic, "wire"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,989 @@
+"""
+Timing comparisons against the real KiCad files in keyboards/atari-a8/kicad.
+
+Wall-clock numbers depend on the machine and what else it is doing, so
+these only run when RUN_BENCHMARKS is set, as run-benchmarks.sh does.  They
+print their numbers, so a run with -v (or pytest -s) shows the speedup.
+What the compared code does is tested in the per-module tests.
+"""
+import copy
+import glob
+import io
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+import unittest
+from decimal import Decimal
+from typing import Callable, List, Tuple
+from atom_index import AtomIndex
+from coords import CoordinateBuffer
+from footprint_edits import (
+    CopyToBackSilkscreen,
+    FootprintEdit,
+    MoveTextToLayer,
+    SetTextHidden,
+)
+from kicad_parser import BinaryKiCadParser, KiCadParser, ScanMode
+from kicad_tools import KicadTool, Layer, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from packed_pts import float_text
+from parse_cache import ParseCache
+from sexp_hash import group_by_hash, structural_hash
+from selector import Selector
+from sexp_clone import clone, share
+from sexp_printer import SexpPrinter
+from sexptype import PinNumber, PinType, SexpType, UnitNumber, makeDecimal
+from tests.helpers import read_file
+from tests.test_filepaths import (
+    CONNECTOR_IMAGE_MOD_FILENAME,
+    CONTROLLER_PICO_PCB_FILENAME,
+    KEYBOARD_SCH_FILENAME,
+    KICAD_LIB_DIR,
+    SAMPLE_PCB_FILENAME,
+)
+
+REAL_FILES = [
+    KEYBOARD_SCH_FILENAME,
+    CONTROLLER_PICO_PCB_FILENAME,
+    CONNECTOR_IMAGE_MOD_FILENAME,
+]
+
+
+def best_time(func: Callable[[], object], repeat: int = 3) -> float:
+    """Returns the fastest of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func: Callable[[], object]) -> Tuple[object, int]:
+    """Runs func and returns its result and the peak traced allocation."""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def report(title: str, name: str, **columns: object) -> None:
+    cells = ", ".join(f"{k}={v}" for k, v in columns.items())
+    print(f"\n[{title}] {os.path.basename(name)}: {cells}")
+
+
+@unittest.skipUnless(
+    os.environ.get("RUN_BENCHMARKS"), "set RUN_BENCHMARKS=1 to run the benchmarks"
+)
+class BenchmarkCase(unittest.TestCase):
+    pass
+
+
+class TestParserBenchmarks(BenchmarkCase):
+    def test_slice_scan_is_faster(self):
+        for name in REAL_FILES:
+            with self.subTest(name=name):
+                s = read_file(name)
+
+                character = best_time(
+                    lambda: KiCadParser(s).to_list(ScanMode.CHARACTER), 1
+                )
+                sliced = best_time(lambda: KiCadParser(s).to_list(ScanMode.SLICE))
+
+                report(
+                    "scan",
+                    name,
+                    chars=len(s),
+                    character=f"{character:.3f}s",
+                    slice=f"{sliced:.3f}s",
+                    speedup=f"{character / sliced:.1f}x",
+                )
+
+                self.assertEqual(
+                    KiCadParser(s).to_list(ScanMode.SLICE),
+                    KiCadParser(s).to_list(ScanMode.CHARACTER),
+                )
+                self.assertLess(sliced, character)
+
+
+class TestLazyParseBenchmarks(BenchmarkCase):
+    def test_lazy_parse_for_one_footprint(self):
+        s = read_file(CONTROLLER_PICO_PCB_FILENAME)
+        tool = KicadTool()
+
+        def full():
+            pcb = KiCadParser(s).to_list(ScanMode.SLICE)
+            return pcb, tool.find_footprint_by_reference(pcb, "H101")
+
+        def lazy():
+            pcb = KiCadParser(s).to_lazy_list()
+            return pcb, tool.find_footprint_by_reference(pcb, "H101")
+
+        full_load = best_time(lambda: KiCadParser(s).to_list(ScanMode.SLICE), 5)
+        lazy_load = best_time(lambda: KiCadParser(s).to_lazy_list(), 5)
+        full_query = best_time(full, 5)
+        lazy_query = best_time(lazy, 5)
+        (_, full_fp), full_peak = peak_memory(full)
+        (_, lazy_fp), lazy_peak = peak_memory(lazy)
+
+        report(
+            "lazy",
+            CONTROLLER_PICO_PCB_FILENAME,
+            load=f"{full_load:.3f}s->{lazy_load:.3f}s",
+            load_and_query=f"{full_query:.3f}s->{lazy_query:.3f}s",
+            peak=f"{full_peak // 1024}KiB->{lazy_peak // 1024}KiB",
+        )
+
+        self.assertEqual(lazy_fp, full_fp)
+        self.assertLess(lazy_load, full_load)
+        self.assertLess(lazy_peak, full_peak)
+
+
+class TestWriterBenchmarks(BenchmarkCase):
+    def test_compact_writer_against_list_to_sexp(self):
+        for name in REAL_FILES:
+            with self.subTest(name=name):
+                parser = KiCadParser(read_file(name))
+                root = parser.to_list(ScanMode.SLICE)
+
+                def legacy():
+                    return "\r\n".join(parser.list_to_sexp(root))
+
+                def compact():
+                    return KiCadWriter().to_string(root)
+
+                legacy_time = best_time(legacy)
+                compact_time = best_time(compact)
+                legacy_out = legacy()
+                compact_out = compact()
+
+                # How long a reader takes to load each form back in
+                legacy_reload = best_time(
+                    lambda: KiCadParser(legacy_out).to_list(ScanMode.SLICE)
+                )
+                compact_reload = best_time(
+                    lambda: KiCadParser(compact_out).to_list(ScanMode.SLICE)
+                )
+
+                report(
+                    "write",
+                    name,
+                    size=f"{len(legacy_out)}->{len(compact_out)}",
+                    write=f"{legacy_time:.3f}s->{compact_time:.3f}s",
+                    reload=f"{legacy_reload:.3f}s->{compact_reload:.3f}s",
+                )
+
+                self.assertEqual(KiCadParser(compact_out).to_list(ScanMode.SLICE), root)
+                self.assertLess(len(compact_out), len(legacy_out))
+                self.assertLess(compact_time, legacy_time)
+
+
+class TestSpliceBenchmarks(BenchmarkCase):
+    def test_splice_save_after_small_edit(self):
+        s = read_file(KEYBOARD_SCH_FILENAME)
+        tool = KicadTool()
+
+        def edited():
+            root = KiCadParser(s).to_lazy_list()
+            tool.remove_atoms(root, "global_label")
+            return root
+
+        root = edited()
+        full_time = best_time(lambda: KiCadWriter().to_string(root))
+        splice_time = best_time(lambda: KiCadWriter(splice=True).to_string(root))
+
+        full_out = KiCadWriter().to_string(root)
+        splice_out = KiCadWriter(splice=True).to_string(root)
+
+        report(
+            "splice",
+            KEYBOARD_SCH_FILENAME,
+            write=f"{full_time:.3f}s->{splice_time:.3f}s",
+        )
+
+        self.assertEqual(
+            KiCadParser(splice_out).to_list(ScanMode.SLICE),
+            KiCadParser(full_out).to_list(ScanMode.SLICE),
+        )
+        self.assertLess(splice_time, full_time)
+
+
+class TestNodeMemoryBenchmarks(BenchmarkCase):
+    def test_node_tree_memory(self):
+        for name in [KEYBOARD_SCH_FILENAME, CONTROLLER_PICO_PCB_FILENAME]:
+            with self.subTest(name=name):
+                s = read_file(name)
+
+                def retained(func: Callable[[], object]) -> int:
+                    """Memory still held by the result once func returns."""
+                    tracemalloc.start()
+                    try:
+                        result = func()
+                        current, _ = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+                    del result
+                    return current
+
+                lists = retained(lambda: KiCadParser(s).to_list(ScanMode.SLICE))
+                nodes = retained(lambda: KiCadParser(s).to_nodes())
+
+                report(
+                    "nodes",
+                    name,
+                    lists=f"{lists // 1024}KiB",
+                    nodes=f"{nodes // 1024}KiB",
+                    saving=f"{100 - 100 * nodes // lists}%",
+                )
+
+                self.assertLess(nodes, lists)
+
+
+class TestParseCacheBenchmarks(BenchmarkCase):
+    def test_cached_load_is_faster(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ParseCache(temp_dir)
+
+            for name in [KEYBOARD_SCH_FILENAME, CONTROLLER_PICO_PCB_FILENAME]:
+                with self.subTest(name=name):
+                    s = read_file(name)
+
+                    parse = best_time(lambda: KiCadParser(s).to_list(ScanMode.SLICE))
+                    cache.parse(s)
+                    cached = best_time(lambda: cache.parse(s))
+
+                    report(
+                        "cache",
+                        name,
+                        parse=f"{parse:.3f}s",
+                        cached=f"{cached:.3f}s",
+                        entry=f"{cache.path_for(s).stat().st_size // 1024}KiB",
+                        speedup=f"{parse / cached:.1f}x",
+                    )
+
+                    self.assertEqual(cache.parse(s), KiCadParser(s).to_list())
+                    self.assertLess(cached, parse)
+
+
+class TestTypedAtomBenchmarks(BenchmarkCase):
+    def test_cached_decimals_are_faster(self):
+        for name in [KEYBOARD_SCH_FILENAME, CONTROLLER_PICO_PCB_FILENAME]:
+            with self.subTest(name=name):
+                s = read_file(name)
+                tool = KicadTool()
+
+                def read_locations(root: SexpType) -> Callable[[], object]:
+                    ats = tool.find_objects_by_foo(
+                        root, ["at"], QueryRecursionLevel.DEEP
+                    )
+                    numbers = [e for at in ats for e in at[1:3]]
+
+                    # A tool run reads the same locations many times over
+                    return lambda: [makeDecimal(e) for _ in range(10) for e in numbers]
+
+                plain = KiCadParser(s).to_list(ScanMode.SLICE)
+                typed = KiCadParser(s).to_list(ScanMode.SLICE, typed=True)
+                plain_time = best_time(read_locations(plain))
+                typed_time = best_time(read_locations(typed))
+
+                report(
+                    "typed",
+                    name,
+                    plain=f"{plain_time:.3f}s",
+                    typed=f"{typed_time:.3f}s",
+                    speedup=f"{plain_time / typed_time:.1f}x",
+                )
+
+                self.assertLess(typed_time, plain_time)
+
+
+class TestBinaryParseBenchmarks(BenchmarkCase):
+    def test_mapped_library_scan(self):
+        """
+        Lists the pads of every footprint in the libraries, the way a tool
+        scanning footprint libraries would.  tracemalloc sees the decoded
+        text of the str path but not the mapping, which lives in the page
+        cache instead of the heap.
+        """
+        names = glob.glob(KICAD_LIB_DIR + "/**/*.kicad_mod", recursive=True)
+        names.append(CONNECTOR_IMAGE_MOD_FILENAME)
+
+        def pads(root: SexpType) -> int:
+            return sum(1 for e in root if isinstance(e, list) and e[0] == "pad")
+
+        def text_scan() -> int:
+            return sum(pads(KiCadParser(read_file(n)).to_lazy_list()) for n in names)
+
+        def mapped_scan() -> int:
+            return sum(
+                pads(BinaryKiCadParser.map_file(n).to_lazy_list()) for n in names
+            )
+
+        text_time = best_time(text_scan)
+        mapped_time = best_time(mapped_scan)
+        text_pads, text_peak = peak_memory(text_scan)
+        mapped_pads, mapped_peak = peak_memory(mapped_scan)
+
+        report(
+            "mmap",
+            f"{len(names)} footprints",
+            text=f"{text_time:.3f}s/{text_peak // 1024}KiB",
+            mapped=f"{mapped_time:.3f}s/{mapped_peak // 1024}KiB",
+        )
+
+        self.assertEqual(mapped_pads, text_pads)
+        self.assertLess(mapped_peak, text_peak)
+
+
+class TestStructuralHashBenchmarks(BenchmarkCase):
+    def test_kept_hashes(self):
+        for name in [KEYBOARD_SCH_FILENAME, CONTROLLER_PICO_PCB_FILENAME]:
+            with self.subTest(name=name):
+                root = KiCadParser(read_file(name)).to_lazy_list()
+                nodes = [
+                    e
+                    for e in root
+                    if isinstance(e, list) and e[0] in ("symbol", "footprint")
+                ]
+
+                start = time.perf_counter()
+                groups = group_by_hash(nodes)
+                first = time.perf_counter() - start
+                again = best_time(lambda: [structural_hash(n) for n in nodes])
+
+                report(
+                    "hash",
+                    name,
+                    nodes=len(nodes),
+                    distinct=len(groups),
+                    first=f"{first:.3f}s",
+                    again=f"{again:.4f}s",
+                )
+
+                self.assertLess(again * 10, first)
+
+
+class NullWriter(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+class TestPrinterBenchmarks(BenchmarkCase):
+    def test_streaming_dump(self):
+        root = KiCadParser(read_file(KEYBOARD_SCH_FILENAME)).to_list(ScanMode.SLICE)
+        out = NullWriter()
+
+        def old_dump() -> None:
+            # What log_symbols used to do: print(schematic), then print_list
+            out.write(str(root) + "\n")
+            KiCadParser("").print_list(root, 0)
+
+        _, old_peak = peak_memory(old_dump)
+        _, new_peak = peak_memory(lambda: SexpPrinter().write(root, out))
+        old_time = best_time(old_dump, 1)
+        new_time = best_time(lambda: SexpPrinter().write(root, out), 1)
+
+        report(
+            "dump",
+            KEYBOARD_SCH_FILENAME,
+            old=f"{old_time:.3f}s/{old_peak // 1024}KiB",
+            streaming=f"{new_time:.3f}s/{new_peak // 1024}KiB",
+        )
+
+        self.assertLess(new_peak * 5, old_peak)
+
+
+class TestPackedPtsBenchmarks(BenchmarkCase):
+    def test_zone_heavy_board(self):
+        """
+        None of the real boards has many zones, so this draws 400 keepout
+        zones (32 points each) the way the PCB run does for standoffs,
+        with the numbers rounded to the nanometre as KiCad saves them.
+        """
+        board: SexpType = ["kicad_pcb"]
+        tool = KicadTool()
+        for i in range(400):
+            tool.draw_keepout_zone(
+                board, Decimal(i % 20) * 19, Decimal(i // 20) * 19, Decimal("1.6")
+            )
+        s = re.sub(
+            r"-?\d+\.\d{7,}",
+            lambda m: float_text(round(float(m[0]), 6)),
+            KiCadWriter().to_string(board),
+        )
+
+        plain_time = best_time(lambda: KiCadParser(s).to_list(ScanMode.SLICE))
+        packed_time = best_time(lambda: KiCadParser(s).to_list(packed=True))
+
+        def retained(packed: bool) -> int:
+            tracemalloc.start()
+            try:
+                tree = KiCadParser(s).to_list(ScanMode.SLICE, packed=packed)
+                current, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            del tree
+            return current
+
+        plain_memory = retained(False)
+        packed_memory = retained(True)
+
+        report(
+            "pts",
+            "400 keepout zones",
+            chars=len(s),
+            plain=f"{plain_time:.3f}s/{plain_memory // 1024}KiB",
+            packed=f"{packed_time:.3f}s/{packed_memory // 1024}KiB",
+        )
+
+        # The rest of each zone is unchanged, so the whole tree only halves
+        self.assertLess(packed_memory * 2, plain_memory)
+        self.assertLess(packed_time, plain_time * 2)
+        self.assertEqual(
+            KiCadWriter().to_string(KiCadParser(s).to_list(packed=True)),
+            KiCadWriter().to_string(KiCadParser(s).to_list()),
+        )
+
+
+class TestAtomIndexBenchmarks(BenchmarkCase):
+    def test_indexed_deep_queries(self):
+        pcb = KiCadParser(read_file(CONTROLLER_PICO_PCB_FILENAME)).to_list(
+            ScanMode.SLICE
+        )
+        walking = KicadTool()
+        indexed = KicadTool()
+        build_time = best_time(lambda: AtomIndex(pcb), 1)
+        indexed.index_tree(pcb)
+
+        def queries(tool: KicadTool) -> int:
+            # The kind of searches the PCB run makes for every footprint
+            found = 0
+            for footprint in tool.find_objects_by_atom(
+                pcb, "footprint", QueryRecursionLevel.HERE
+            ):
+                for atom in ["fp_text", "at", "layer"]:
+                    found += len(
+                        tool.find_objects_by_atom(
+                            footprint, atom, QueryRecursionLevel.DEEP
+                        )
+                    )
+            return found + len(
+                tool.find_objects_by_atom(pcb, "segment", QueryRecursionLevel.DEEP)
+            )
+
+        self.assertEqual(queries(indexed), queries(walking))
+        walk_time = best_time(lambda: queries(walking))
+        index_time = best_time(lambda: queries(indexed))
+
+        report(
+            "index",
+            CONTROLLER_PICO_PCB_FILENAME,
+            build=f"{build_time:.4f}s",
+            walk=f"{walk_time:.4f}s",
+            indexed=f"{index_time:.4f}s",
+        )
+
+        self.assertLess(index_time * 10, walk_time)
+        # Building the index costs about as much as one walk of the board
+        self.assertLess(build_time + index_time, walk_time * 2)
+
+
+class TestReferenceIndexBenchmarks(BenchmarkCase):
+    def test_footprint_lookups(self):
+        pcb = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list(ScanMode.SLICE)
+        walking = KicadTool()
+        refs = [
+            walking.get_reference(footprint)
+            for footprint in walking.find_objects_by_atom(
+                pcb, "footprint", QueryRecursionLevel.HERE
+            )
+        ]
+
+        def relocate(tool: KicadTool) -> None:
+            # relocate_parts_and_draw_silkscreen looks each part up about
+            # ten times; a few of the parts keep the walk short
+            for ref in refs[::40]:
+                for _ in range(10):
+                    tool.find_footprint_by_reference(pcb, ref)
+
+        def indexed() -> None:
+            tool = KicadTool()
+            tool.index_references(pcb)
+            relocate(tool)
+
+        walk_time = best_time(lambda: relocate(walking), 1)
+        index_time = best_time(indexed)
+
+        report(
+            "references",
+            SAMPLE_PCB_FILENAME,
+            footprints=len(refs),
+            walk=f"{walk_time:.4f}s",
+            indexed=f"{index_time:.4f}s",
+        )
+
+        self.assertLess(index_time * 20, walk_time)
+
+
+class TestSymbolIndexBenchmarks(BenchmarkCase):
+    def test_symbol_lookups(self):
+        schematic = KiCadParser(read_file(KEYBOARD_SCH_FILENAME)).to_list(
+            ScanMode.SLICE
+        )
+        walking = KicadTool()
+        refs = [
+            walking.get_reference(symbol)
+            for symbol in walking.find_objects_by_atom(
+                schematic, "symbol", QueryRecursionLevel.HERE
+            )
+        ]
+
+        def wire(tool: KicadTool) -> list:
+            # process_pin_pair and get_absolute_pin_position_for_schematic
+            # look up both symbols of each pair, for both units
+            found = []
+            for ref in refs[::20]:
+                assert ref is not None
+                for unit in [UnitNumber.ONE, UnitNumber.TWO]:
+                    for _ in range(3):
+                        found.append(
+                            tool.find_symbol_by_reference(schematic, ref, unit)
+                        )
+            return found
+
+        def indexed() -> list:
+            tool = KicadTool()
+            tool.index_references(schematic)
+            return wire(tool)
+
+        self.assertEqual(indexed(), wire(walking))
+        walk_time = best_time(lambda: wire(walking), 1)
+        index_time = best_time(indexed)
+
+        report(
+            "symbols",
+            KEYBOARD_SCH_FILENAME,
+            symbols=len(refs),
+            walk=f"{walk_time:.4f}s",
+            indexed=f"{index_time:.4f}s",
+        )
+
+        self.assertLess(index_time * 20, walk_time)
+
+
+class TestSelectorBenchmarks(BenchmarkCase):
+    def test_selector_against_matcher(self):
+        pcb = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list(ScanMode.SLICE)
+        tool = KicadTool()
+        index = AtomIndex(pcb)
+
+        # The same searches as list patterns and as selectors
+        queries = [
+            (["fp_text", "reference"], "fp_text.reference"),
+            (
+                ["footprint", ["fp_text", "reference", '"SW214"']],
+                'footprint[fp_text.reference="SW214"]',
+            ),
+            (["pad", ["layers", "*.Cu", "*.Mask"]], 'pad[layers."*.Cu"."*.Mask"]'),
+        ]
+
+        for pattern, text in queries:
+            with self.subTest(text=text):
+                selector = Selector.compile(text)
+                expected = tool.find_objects_by_foo(
+                    pcb, pattern, QueryRecursionLevel.DEEP
+                )
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(selector.select(pcb), expected)
+                self.assertEqual(selector.select(pcb, index), expected)
+
+                matcher_time = best_time(
+                    lambda: tool.find_objects_by_foo(
+                        pcb, pattern, QueryRecursionLevel.DEEP
+                    ),
+                    1,
+                )
+                walk_time = best_time(lambda: Selector.compile(text).select(pcb))
+                index_time = best_time(
+                    lambda: Selector.compile(text).select(pcb, index)
+                )
+
+                report(
+                    "selector",
+                    text,
+                    matcher=f"{matcher_time:.4f}s",
+                    walk=f"{walk_time:.4f}s",
+                    indexed=f"{index_time:.4f}s",
+                )
+
+                self.assertLess(walk_time, matcher_time)
+                self.assertLess(index_time * 5, matcher_time)
+
+
+class TestPinOffsetBenchmarks(BenchmarkCase):
+    def test_pin_offset_table(self):
+        schematic = KiCadParser(read_file(KEYBOARD_SCH_FILENAME)).to_list(
+            ScanMode.SLICE
+        )
+        tool = KicadTool()
+        symbols = tool.find_objects_by_atom(
+            schematic, "symbol", QueryRecursionLevel.HERE
+        )[::45]
+
+        def lookups(forget: bool) -> list:
+            found = []
+            for symbol in symbols:
+                for pin in [PinNumber._1, PinNumber._2]:
+                    if forget:
+                        # Searching the library on every call, as before
+                        tool.pin_offset_tables.clear()
+                    found.append(
+                        tool.get_relative_pin_position_for_schematic(
+                            schematic, symbol, PinType.NUMBER, pin
+                        )
+                    )
+            return found
+
+        self.assertEqual(lookups(False), lookups(True))
+        search_time = best_time(lambda: lookups(True), 1)
+        table_time = best_time(lambda: lookups(False))
+
+        report(
+            "pins",
+            KEYBOARD_SCH_FILENAME,
+            lookups=len(symbols) * 2,
+            search=f"{search_time:.4f}s",
+            table=f"{table_time:.4f}s",
+        )
+
+        self.assertLess(table_time * 20, search_time)
+
+
+class TestRemoveWhereBenchmarks(BenchmarkCase):
+    def test_clear_schematic(self):
+        text = read_file(KEYBOARD_SCH_FILENAME)
+        atoms = ["symbol", "wire", "global_label"]
+
+        def fresh() -> Tuple[KicadTool, SexpType]:
+            tool = KicadTool()
+            schematic = KiCadParser(text).to_list(ScanMode.SLICE)
+            tool.index_tree(schematic)
+            tool.index_references(schematic)
+            return tool, schematic
+
+        def one_at_a_time(tool: KicadTool, schematic: SexpType) -> None:
+            # Finding the first match again after every removal, as before
+            for atom in atoms:
+                while True:
+                    found = tool.find_objects_by_atom(
+                        schematic, atom, QueryRecursionLevel.HERE
+                    )
+                    if len(found) == 0:
+                        break
+                    tool.remove_node(schematic, found[0])
+
+        def detach_each(tool: KicadTool, schematic: SexpType) -> None:
+            # Each removal looks through the schematic for the node, which
+            # in document order is found near the front
+            for node in [e for e in schematic if isinstance(e, list)]:
+                if node[0] in atoms:
+                    tool.detach(node)
+
+        def in_one_pass(tool: KicadTool, schematic: SexpType) -> None:
+            tool.remove_where(schematic, lambda node: node[0] in atoms)
+
+        results = []
+        times = []
+        for remove in [one_at_a_time, detach_each, in_one_pass]:
+            tool, schematic = fresh()
+            start = time.perf_counter()
+            remove(tool, schematic)
+            times.append(time.perf_counter() - start)
+            results.append(schematic)
+            self.assertEqual(
+                tool.find_objects_by_atom(
+                    schematic, "symbol", QueryRecursionLevel.DEEP
+                ),
+                tool.find_objects_by_foo(
+                    schematic, ["symbol"], QueryRecursionLevel.DEEP
+                ),
+            )
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        report(
+            "remove",
+            KEYBOARD_SCH_FILENAME,
+            loop=f"{times[0]:.4f}s",
+            detach=f"{times[1]:.4f}s",
+            remove_where=f"{times[2]:.4f}s",
+        )
+
+        self.assertLess(times[2] * 3, times[0])
+
+
+class TestJournalBenchmarks(BenchmarkCase):
+    def test_recording_changes(self):
+        text = read_file(SAMPLE_PCB_FILENAME)
+
+        def move_all(record: bool) -> Tuple[float, float, int]:
+            tool = KicadTool()
+            pcb = KiCadParser(text).to_lazy_list(typed=True)
+            tool.index_tree(pcb)
+            tool.index_references(pcb)
+            journal = tool.record_changes(pcb) if record else None
+            refs = [
+                ref
+                for ref in (
+                    tool.get_reference(footprint)
+                    for footprint in tool.find_objects_by_atom(
+                        pcb, "footprint", QueryRecursionLevel.HERE
+                    )
+                )
+                if ref is not None
+            ]
+
+            start = time.perf_counter()
+            for i, ref in enumerate(refs):
+                tool.set_object_location(
+                    pcb, ref, Decimal(i), Decimal(2 * i), Decimal(90)
+                )
+            edit_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            KiCadWriter(splice=True).to_string(pcb)
+            write_time = time.perf_counter() - start
+            return edit_time, write_time, 0 if journal is None else len(journal)
+
+        plain_time, write_time, _ = move_all(False)
+        recorded_time, _, changes = move_all(True)
+
+        report(
+            "journal",
+            SAMPLE_PCB_FILENAME,
+            changes=changes,
+            edits=f"{plain_time:.4f}s",
+            recorded=f"{recorded_time:.4f}s",
+            write=f"{write_time:.4f}s",
+        )
+
+        self.assertGreater(changes, 0)
+        # Each change walks up the tree for its path, which costs a few
+        # times what the edit itself does now the views keep nothing to
+        # forget
+        self.assertLess(recorded_time, plain_time * 6)
+
+
+class TestViewBenchmarks(BenchmarkCase):
+    def test_footprint_views(self):
+        pcb = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list(ScanMode.SLICE)
+        tool = KicadTool()
+        tool.index_tree(pcb)
+        tool.index_references(pcb)
+        refs = [
+            tool.get_reference(footprint)
+            for footprint in tool.find_objects_by_atom(
+                pcb, "footprint", QueryRecursionLevel.HERE
+            )
+        ]
+
+        def text_of(ref: str, kind: str) -> SexpType:
+            # The searches the text edits used to make
+            p = tool.find_footprint_by_reference(pcb, ref)
+            o = tool.find_objects_by_atom(p, "fp_text", QueryRecursionLevel.DEEP)
+            return [fp for fp in o if fp[1] == kind][0]
+
+        def queries() -> list:
+            found: list = []
+            for ref in refs:
+                for kind in ["reference", "value"]:
+                    text = text_of(ref, kind)
+                    layer = tool.find_objects_by_atom(
+                        text, "layer", QueryRecursionLevel.DEEP
+                    )
+                    found.append((text[2], layer[0][1], "hide" in text))
+                footprint = tool.find_footprint_by_reference(pcb, ref)
+                at = tool.find_object_by_atom(footprint, "at", QueryRecursionLevel.HERE)
+                found.append((at[1], at[2]))
+            return found
+
+        def views() -> list:
+            found: list = []
+            for ref in refs:
+                fp = tool.view_footprint(tool.find_footprint_by_reference(pcb, ref))
+                for kind in ["reference", "value"]:
+                    text = fp.texts[kind]
+                    found.append((text.node[2], text.layer, text.hidden))
+                found.append((fp.at[1], fp.at[2]))
+            return found
+
+        self.assertEqual(views(), queries())
+        query_time = best_time(queries)
+        view_time = best_time(views)
+
+        report(
+            "views",
+            SAMPLE_PCB_FILENAME,
+            footprints=len(refs),
+            queries=f"{query_time:.4f}s",
+            views=f"{view_time:.4f}s",
+        )
+
+        self.assertLess(view_time * 3, query_time)
+
+
+class TestCoordinateBufferBenchmarks(BenchmarkCase):
+    def test_moving_symbols(self):
+        text = read_file(KEYBOARD_SCH_FILENAME)
+
+        def decimal_move(tool: KicadTool, root: SexpType, mx: Decimal, my: Decimal):
+            # The per-node Decimal arithmetic move_recursive used to do
+            first_at = tool.find_object_by_atom(root, "at", QueryRecursionLevel.HERE)
+            at_x = makeDecimal(first_at[1])
+            at_y = makeDecimal(first_at[2])
+            for atm in tool.find_objects_by_atom(root, "at", QueryRecursionLevel.DEEP):
+                tool.set_atom(atm, 1, str(makeDecimal(atm[1]) - at_x + mx))
+                tool.set_atom(atm, 2, str(makeDecimal(atm[2]) - at_y + my))
+
+        def move_all(move) -> Tuple[float, SexpType]:
+            tool = KicadTool()
+            schematic = KiCadParser(text).to_list(ScanMode.SLICE)
+            symbols = tool.find_objects_by_atom(
+                schematic, "symbol", QueryRecursionLevel.HERE
+            )
+
+            def run() -> None:
+                for i, symbol in enumerate(symbols):
+                    move(tool, symbol, Decimal(i) / 8, Decimal("2.54"))
+
+            return best_time(run), schematic
+
+        decimal_time, moved = move_all(decimal_move)
+        buffer_time, buffered = move_all(
+            lambda tool, root, mx, my: tool.move_recursive(root, mx, my, 0)
+        )
+
+        moved_pairs = CoordinateBuffer([moved], ("at",))
+        buffered_pairs = CoordinateBuffer([buffered], ("at",))
+        self.assertEqual(len(moved_pairs), len(buffered_pairs))
+        for a, b in zip(moved_pairs.coords, buffered_pairs.coords):
+            self.assertAlmostEqual(a, b, places=6)
+
+        report(
+            "coordinate buffer",
+            KEYBOARD_SCH_FILENAME,
+            pairs=len(buffered_pairs),
+            decimal=f"{decimal_time:.4f}s",
+            buffer=f"{buffer_time:.4f}s",
+        )
+
+        self.assertLess(buffer_time, decimal_time)
+
+
+class TestCloneBenchmarks(BenchmarkCase):
+    def test_board_variants(self):
+        pcb = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list(ScanMode.SLICE)
+        base = share(pcb)
+        refs = ["SW201", "SW202", "D201"]
+
+        def variants(make: Callable[[], SexpType]) -> list:
+            # A variant of the board per reference, with that part moved
+            made = []
+            for i, ref in enumerate(refs):
+                variant = make()
+                KicadTool().set_object_location(
+                    variant, ref, Decimal(i), Decimal(i), Decimal(90)
+                )
+                made.append(variant)
+            return made
+
+        def retained(make: Callable[[], SexpType]) -> int:
+            tracemalloc.start()
+            try:
+                result = variants(make)
+                current, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            del result
+            return current
+
+        copied = retained(lambda: copy.deepcopy(pcb))
+        cloned = retained(lambda: clone(base))
+        copy_time = best_time(lambda: variants(lambda: copy.deepcopy(pcb)))
+        clone_time = best_time(lambda: variants(lambda: clone(base)))
+
+        report(
+            "clone",
+            SAMPLE_PCB_FILENAME,
+            variants=len(refs),
+            deepcopy=f"{copied // 1024}KiB {copy_time:.4f}s",
+            clone=f"{cloned // 1024}KiB {clone_time:.4f}s",
+        )
+
+        self.assertLess(cloned * 3, copied)
+        self.assertLess(clone_time * 3, copy_time)
+
+
+class TestFootprintEditBenchmarks(BenchmarkCase):
+    def test_batched_text_edits(self):
+        text = read_file(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        pcb = KiCadParser(text).to_list(ScanMode.SLICE)
+        refs = [
+            ref
+            for ref in (
+                tool.get_reference(footprint)
+                for footprint in tool.find_objects_by_atom(
+                    pcb, "footprint", QueryRecursionLevel.HERE
+                )
+            )
+            if ref is not None and ref.startswith("SW")
+        ]
+
+        def one_by_one(pcb: SexpType) -> None:
+            # The calls relocate_parts_and_draw_silkscreen made for each key
+            tool = KicadTool()
+            for ref in refs:
+                tool.set_hidden_footprint_text_by_reference(pcb, ref, "value", False)
+                tool.copy_to_back_silkscreen(pcb, ref, "reference")
+                tool.move_text_to_layer(pcb, ref, "value", Layer.F_Silkscreen)
+                tool.copy_to_back_silkscreen(pcb, ref, "value")
+
+        def batched(pcb: SexpType) -> None:
+            edits: List[FootprintEdit] = [
+                SetTextHidden("value", False),
+                CopyToBackSilkscreen("reference"),
+                MoveTextToLayer("value", Layer.F_Silkscreen),
+                CopyToBackSilkscreen("value"),
+            ]
+            missing = KicadTool().edit_footprints(pcb, [(r, edits) for r in refs])
+            self.assertEqual(missing, [])
+
+        def timed(edit: Callable[[SexpType], None]) -> Tuple[float, SexpType]:
+            # Each run edits a fresh board, parsed outside the timing
+            best = float("inf")
+            for _ in range(3):
+                pcb = KiCadParser(text).to_list(ScanMode.SLICE)
+                start = time.perf_counter()
+                edit(pcb)
+                best = min(best, time.perf_counter() - start)
+            return best, pcb
+
+        single_time, single = timed(one_by_one)
+        batch_time, batch = timed(batched)
+        self.assertEqual(batch, single)
+
+        report(
+            "footprint edits",
+            SAMPLE_PCB_FILENAME,
+            footprints=len(refs),
+            one_by_one=f"{single_time:.4f}s",
+            batched=f"{batch_time:.4f}s",
+        )
+
+        self.assertLess(batch_time * 3, single_time)
@@ -0,0 +1,132 @@
+import unittest
+from coords import CoordinateBuffer, number_text
+from journal import ChangeKind
+from kicad_parser import KiCadParser
+from kicad_tools import KicadTool, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from packed_pts import PackedPts
+
+
+class TestCoordinateBuffer(unittest.TestCase):
+    def test_gathers_in_document_order(self):
+        root = KiCadParser(
+            "(a (at 1 2) (b (start 3 4) (end 5.50 6)) (layer F.Cu) (c (xy 7 8)))"
+        ).to_list()
+        buffer = CoordinateBuffer([root])
+
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(list(buffer.coords), [1, 2, 3, 4, 5.5, 6, 7, 8])
+        self.assertEqual(
+            [node[0] for node in buffer.lists], ["at", "start", "end", "xy"]
+        )
+        self.assertEqual(buffer.bounds(), (1, 2, 7, 8))
+
+        only = CoordinateBuffer([root[2]], ("end",))
+        self.assertEqual(list(only.coords), [5.5, 6])
+        self.assertIsNone(CoordinateBuffer([["layer", "F.Cu"]]).bounds())
+
+    def test_translate_and_write_back(self):
+        root = KiCadParser("(a (at 1 2 90) (start 0.1 0.2) (end 5.50 6))").to_list()
+        buffer = CoordinateBuffer([root])
+        buffer.translate(0.2, 0)
+        buffer.write_back()
+        self.assertEqual(
+            root,
+            [
+                "a",
+                ["at", "1.2", "2", "90"],
+                ["start", "0.3", "0.2"],
+                ["end", "5.7", "6"],
+            ],
+        )
+
+        # Numbers that did not move keep their text
+        root = KiCadParser("(a (end 5.50 6))").to_list()
+        buffer = CoordinateBuffer([root])
+        buffer.translate(0, 1)
+        buffer.write_back()
+        self.assertEqual(root[1], ["end", "5.50", "7"])
+
+    def test_rotate(self):
+        root = KiCadParser("(a (at 1 0) (at 0 1))").to_list()
+        buffer = CoordinateBuffer([root])
+        buffer.rotate(90)
+        buffer.write_back()
+        # As get_relative_pin_position_for_schematic turns pins by 90
+        self.assertEqual(root, ["a", ["at", "0", "-1"], ["at", "1", "0"]])
+
+        buffer.rotate(180, 1, 1)
+        buffer.write_back()
+        self.assertEqual(root, ["a", ["at", "2", "3"], ["at", "1", "2"]])
+
+    def test_packed_points(self):
+        s = "(a (polygon (pts (xy 1 2) (xy 3 4))) (at 5 6))"
+        root = KiCadParser(s).to_list(packed=True)
+        buffer = CoordinateBuffer([root])
+        self.assertEqual(list(buffer.coords), [1, 2, 3, 4, 5, 6])
+
+        buffer.translate(1, 1)
+        buffer.write_back()
+        self.assertEqual(
+            KiCadWriter().to_string(root),
+            KiCadWriter().to_string(
+                KiCadParser("(a (polygon (pts (xy 2 3) (xy 4 5))) (at 6 7))").to_list()
+            ),
+        )
+
+    def test_write_back_through_tool(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (at 1 2)))").to_list()
+        journal = tool.record_changes(root)
+        buffer = CoordinateBuffer([root])
+        buffer.translate(1, 0)
+        buffer.write_back(tool)
+
+        self.assertEqual(root[1][1], ["at", "2", "2"])
+        self.assertEqual(len(journal), 1)
+        self.assertEqual(journal.changes[0].path, (1, 1))
+
+    def test_packed_write_back_through_tool(self):
+        s = "(a (polygon (pts (xy 1 2) (xy 3 4))) (at 5 6))"
+        tool = KicadTool()
+        root = KiCadParser(s).to_list(packed=True)
+        journal = tool.record_changes(root)
+        buffer = CoordinateBuffer([root])
+        buffer.translate(1, 0)
+        buffer.write_back(tool)
+
+        block = root[1][1]
+        self.assertIsInstance(block, PackedPts)
+        self.assertFalse(block.loaded)
+        self.assertIs(
+            tool.find_objects_by_atom(root, "pts", QueryRecursionLevel.DEEP)[0],
+            block,
+        )
+        self.assertEqual(
+            [(change.kind, change.path) for change in journal.changes],
+            [
+                (ChangeKind.SET, (2,)),
+                (ChangeKind.DELETE, (1,)),
+                (ChangeKind.INSERT, (1,)),
+            ],
+        )
+        self.assertEqual(
+            journal.export()["changes"][2]["new"],
+            ["pts", ["xy", "2", "2"], ["xy", "4", "4"]],
+        )
+
+        # Nothing more to write for pairs that have not moved since
+        buffer.write_back(tool)
+        self.assertEqual(len(journal), 3)
+
+        tool.undo_changes(journal)
+        self.assertEqual(root, KiCadParser(s).to_list())
+
+    def test_number_text(self):
+        self.assertEqual(number_text(0.1 + 0.2), "0.3")
+        self.assertEqual(number_text(-0.0000001), "0")
+        self.assertEqual(number_text(90.0), "90")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest import mock
+import tempfile
+from pathlib import Path
+from document_loader import DocumentLoader
+from kicad_parser import KiCadParser, TypedLazySexp
+from kicad_writer import KiCadWriter
+from parse_cache import ParseCache
+from tests.helpers import read_tree
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+NAMES = [SAMPLE_PCB_FILENAME, SAMPLE_KEYBOARD_SCH_FILENAME]
+
+
+class TestDocumentLoader(unittest.TestCase):
+    def test_load(self):
+        trees = DocumentLoader().load(reversed(NAMES))
+        self.assertEqual(trees, [read_tree(name) for name in reversed(NAMES)])
+
+    def test_load_through_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ParseCache(Path(temp_dir))
+            loader = DocumentLoader(cache)
+
+            first = loader.load(NAMES)
+            for name, tree in zip(NAMES, first):
+                with open(name, "r") as f:
+                    self.assertEqual(cache.lookup(f.read()), tree)
+
+            # Everything is cached now, so nothing is parsed again
+            with mock.patch.object(KiCadParser, "to_list") as to_list:
+                self.assertEqual(loader.load(NAMES), first)
+                to_list.assert_not_called()
+
+    def test_load_for_editing(self):
+        trees = DocumentLoader().load_for_editing(NAMES)
+        for tree in trees:
+            self.assertIsInstance(tree[1], TypedLazySexp)
+        self.assertEqual(trees, [read_tree(name) for name in NAMES])
+
+        for name, tree in zip(NAMES, trees):
+            with open(name, "r") as f:
+                text = KiCadWriter(splice=True).to_string(tree)
+                self.assertEqual(text.rstrip("\n"), f.read().rstrip("\n"))
+
+    def test_empty(self):
+        self.assertEqual(DocumentLoader().load([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
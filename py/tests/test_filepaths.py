@@ -2,3 +2,11 @@ SAMPLE_PCB_FILENAME = "tests/data/sample_pcb"
 SAMPLE_KEYBOARD_SCH_FILENAME = "tests/data/keyboard_sch"
 SAMPLE_QMKINFO_FILENAME = "tests/data/qmkinfo.json"
 SAMPLE_KEYBOARD_LAYOUT_FILENAME = "tests/data/keyboard-layout.json"
+
+# Real project files, used by the benchmarks
+KICAD_DIR = "../keyboards/atari-a8/kicad"
+KEYBOARD_SCH_FILENAME = KICAD_DIR + "/keyswitch_pcb/keyboard.kicad_sch"
+CONTROLLER_PICO_PCB_FILENAME = KICAD_DIR + "/controller-pico/controller-pico.kicad_pcb"
+CONNECTOR_IMAGE_MOD_FILENAME = KICAD_DIR + "/connector_image.kicad_mod"
+PLATE_PCB_FILENAME = KICAD_DIR + "/plate/plate/plate.kicad_pcb"
+KICAD_LIB_DIR = "../keyboards/kicad-lib"
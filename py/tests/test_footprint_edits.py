@@ -0,0 +1,82 @@
+import unittest
+from decimal import Decimal
+from footprint_edits import (
+    CopyToBackSilkscreen,
+    FootprintEdit,
+    MoveTextToLayer,
+    PlaceFootprint,
+    SetTextHidden,
+)
+from kicad_tools import KicadTool, Layer
+from tests.helpers import read_tree
+from tests.test_filepaths import SAMPLE_PCB_FILENAME
+
+
+class TestFootprintEdits(unittest.TestCase):
+    def test_same_as_one_call_each(self):
+        one_by_one = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        for ref in ["SW201", "SW202"]:
+            tool.set_hidden_footprint_text_by_reference(one_by_one, ref, "value", False)
+            tool.copy_to_back_silkscreen(one_by_one, ref, "reference")
+            tool.move_text_to_layer(one_by_one, ref, "value", Layer.F_Silkscreen)
+            tool.copy_to_back_silkscreen(one_by_one, ref, "value")
+        tool.set_object_location(
+            one_by_one, "D201", Decimal(10), Decimal(20), Decimal(-90), Decimal(90)
+        )
+        tool.copy_to_back_silkscreen(one_by_one, "D201", "reference")
+
+        batched = read_tree(SAMPLE_PCB_FILENAME)
+        text_edits = [
+            SetTextHidden("value", False),
+            CopyToBackSilkscreen("reference"),
+            MoveTextToLayer("value", Layer.F_Silkscreen),
+            CopyToBackSilkscreen("value"),
+        ]
+        missing = KicadTool().edit_footprints(
+            batched,
+            [
+                (
+                    "D201",
+                    [
+                        PlaceFootprint(
+                            Decimal(10), Decimal(20), Decimal(-90), Decimal(90)
+                        )
+                    ],
+                ),
+                ("SW201", text_edits),
+                ("SW202", text_edits),
+                # Edits for a reference given twice are made in the order given
+                ("D201", [CopyToBackSilkscreen("reference")]),
+            ],
+        )
+
+        self.assertEqual(missing, [])
+        self.assertEqual(batched, one_by_one)
+
+    def test_reports_missing_references(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        missing = tool.edit_footprints(
+            pcb,
+            [
+                ("SW999", [SetTextHidden("value")]),
+                ("SW201", [SetTextHidden("value")]),
+                ("X1", [CopyToBackSilkscreen("reference")]),
+            ],
+        )
+
+        self.assertEqual(missing, ["SW999", "X1"])
+        text = tool._get_text_obj_by_type(pcb, "SW201", "value")
+        self.assertEqual(text[-1], "hide")
+
+    def test_edit_needs_apply(self):
+        class Unfinished(FootprintEdit):
+            pass
+
+        with self.assertRaises(TypeError):
+            Unfinished()
+
+
+if __name__ == "__main__":
+    unittest.main()
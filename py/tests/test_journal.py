@@ -0,0 +1,116 @@
+import json
+import unittest
+from decimal import Decimal
+from journal import ChangeKind, Journal
+from kicad_parser import KiCadParser
+from kicad_tools import KicadTool, Layer, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from sexptype import SexpType
+from tests.helpers import read_file
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+
+def edit_pcb(tool: KicadTool, pcb: SexpType) -> None:
+    tool.set_object_location(pcb, "SW201", Decimal(-100), Decimal(-200), Decimal(90))
+    tool.set_hidden_footprint_text_by_reference(pcb, "SW202", "value", True)
+    tool.move_text_to_layer(pcb, "SW202", "value", Layer.F_Silkscreen)
+    tool.copy_to_back_silkscreen(pcb, "D201", "reference")
+    tool.remove_atoms(pcb, "gr_line")
+
+
+class TestJournal(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pcb_text = read_file(SAMPLE_PCB_FILENAME)
+        cls.schematic_text = read_file(SAMPLE_KEYBOARD_SCH_FILENAME)
+
+    def edited(self):
+        tool = KicadTool()
+        pcb = KiCadParser(self.pcb_text).to_lazy_list()
+        schematic = KiCadParser(self.schematic_text).to_lazy_list()
+        journal = tool.record_changes(pcb, schematic)
+        edit_pcb(tool, pcb)
+        return tool, pcb, schematic, journal
+
+    def test_records_edits(self):
+        _, pcb, schematic, journal = self.edited()
+
+        self.assertGreater(len(journal), 0)
+        self.assertTrue(journal.changed(pcb))
+        self.assertFalse(journal.changed(schematic))
+        counts = journal.summary()
+        self.assertEqual(counts[1], {})
+        self.assertEqual(set(counts[0]), set(ChangeKind))
+
+    def test_undo(self):
+        tool, pcb, _, journal = self.edited()
+        self.assertNotEqual(pcb, KiCadParser(self.pcb_text).to_list())
+
+        tool.undo_changes(journal)
+        self.assertEqual(pcb, KiCadParser(self.pcb_text).to_list())
+
+        tool.apply_changes(journal)
+        expected = KiCadParser(self.pcb_text).to_list()
+        edit_pcb(KicadTool(), expected)
+        self.assertEqual(pcb, expected)
+
+    def test_replay_on_a_later_run(self):
+        _, pcb, _, journal = self.edited()
+        data = json.loads(json.dumps(journal.export()))
+
+        later = KiCadParser(self.pcb_text).to_lazy_list()
+        schematic = KiCadParser(self.schematic_text).to_lazy_list()
+        loaded = Journal.load(data, [later, schematic])
+        tool = KicadTool()
+        tool.apply_changes(loaded)
+        writer = KiCadWriter(splice=True)
+        self.assertEqual(writer.to_string(later), writer.to_string(pcb))
+        self.assertFalse(schematic.dirty)
+
+        tool.undo_changes(loaded)
+        self.assertEqual(
+            KiCadParser(writer.to_string(later)).to_list(),
+            KiCadParser(self.pcb_text).to_list(),
+        )
+
+    def test_change_set_must_match(self):
+        _, _, _, journal = self.edited()
+        data = journal.export()
+
+        other = KiCadParser(self.pcb_text).to_lazy_list()
+        schematic = KiCadParser(self.schematic_text).to_lazy_list()
+        with self.assertRaises(Exception):
+            KicadTool().undo_changes(Journal.load(data, [other, schematic]))
+        with self.assertRaises(Exception):
+            Journal.load(data, [other])
+
+    def test_new_nodes_are_one_insert(self):
+        tool = KicadTool()
+        schematic = KiCadParser(self.schematic_text).to_list()
+        journal = tool.record_changes(schematic)
+
+        # Building and moving the symbols is not recorded, only adding them
+        tool.add_keyswitch_to_schematic("299", "X", schematic, 1, 2, Decimal(1), True)
+        self.assertEqual([c.kind for c in journal.changes], [ChangeKind.INSERT] * 3)
+        self.assertEqual(journal.changes[0].path, ())
+        self.assertEqual(journal.changes[0].index, len(schematic) - 3)
+
+        # Edits after that are recorded inside them
+        symbol = schematic[-1]
+        at = tool.find_object_by_atom(symbol, "at", QueryRecursionLevel.HERE)
+        tool.set_atom(at, 1, "1234")
+        self.assertEqual(
+            journal.changes[-1].path, (len(schematic) - 1, symbol.index(at))
+        )
+
+    def test_unchanged_atoms_are_not_recorded(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (at 1 2 0))").to_list()
+        journal = tool.record_changes(root)
+        tool.set_atom(root[1], 1, "1")
+        self.assertEqual(len(journal), 0)
+        self.assertFalse(journal.changed(root))
+
+
+if __name__ == "__main__":
+    unittest.main()
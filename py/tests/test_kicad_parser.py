@@ -1,5 +1,21 @@
 import unittest
-from kicad_parser import KiCadParser
+from unittest import mock
+import copy
+import tempfile
+from decimal import Decimal
+from kicad_parser import (
+    BinaryKiCadParser,
+    KiCadParser,
+    LazySexp,
+    ScanMode,
+    SexpEvent,
+    SourceSexp,
+    TypedLazySexp,
+)
+from kicad_writer import KiCadWriter
+from sexp_clone import share
+from sexp_hash import structural_hash
+from sexptype import NumberAtom, QuotedAtom, SymbolAtom, makeDecimal, makeText
 from tests.test_filepaths import SAMPLE_PCB_FILENAME
 
 
@@ -139,6 +155,284 @@ class TestStringMethods(unittest.TestCase):
         l = parser.list_to_sexp(root)
         # print("\r\n".join(l))
 
+    def test_sliceScanMatchesCharacterScan(self):
+        s = read_file()
+        expected = KiCadParser(s).to_list(ScanMode.CHARACTER)
+        actual = KiCadParser(s).to_list(ScanMode.SLICE)
+        self.assertEqual(actual, expected)
+
+    def test_sliceScanNested(self):
+        parser = KiCadParser('  (a (b "x y") c)')
+        a = parser.to_list(ScanMode.SLICE)
+        self.assertEqual(a, ["a", ["b", '"x y"'], "c"])
+
+    def test_sliceScanEmpty(self):
+        parser = KiCadParser("()")
+        self.assertEqual(parser.to_list(ScanMode.SLICE), [])
+
+    def test_sliceScanEscapedQuote(self):
+        parser = KiCadParser(r'(a "say \"hi\"" b)')
+        a = parser.to_list(ScanMode.SLICE)
+        self.assertEqual(a, ["a", r'"say \"hi\""', "b"])
+
+    def test_sliceScanExpectsOpenParen(self):
+        parser = KiCadParser("hello")
+        with self.assertRaises(Exception):
+            parser.to_list(ScanMode.SLICE)
+
+    def test_sliceScanUnbalanced(self):
+        parser = KiCadParser("(a (b)")
+        with self.assertRaises(Exception):
+            parser.to_list(ScanMode.SLICE)
+
+    def test_iter_events(self):
+        parser = KiCadParser('(a (b "x y") c)')
+        events = list(parser.iter_events())
+        self.assertEqual(
+            events,
+            [
+                (SexpEvent.OPEN, "("),
+                (SexpEvent.ATOM, "a"),
+                (SexpEvent.OPEN, "("),
+                (SexpEvent.ATOM, "b"),
+                (SexpEvent.ATOM, '"x y"'),
+                (SexpEvent.CLOSE, ")"),
+                (SexpEvent.ATOM, "c"),
+                (SexpEvent.CLOSE, ")"),
+            ],
+        )
+
+    def test_materialize_events_keeps_matching_nodes(self):
+        parser = KiCadParser("(root (keep 1 (x 2)) (skip (keep 3)) (keep 4))")
+        kept = list(KiCadParser.materialize_events(parser.iter_events(), ["keep"]))
+        self.assertEqual(
+            kept, [["keep", "1", ["x", "2"]], ["keep", "3"], ["keep", "4"]]
+        )
+
+    def test_materialize_events_depth(self):
+        parser = KiCadParser("(root (keep 1) (skip (keep 3)))")
+        kept = list(
+            KiCadParser.materialize_events(parser.iter_events(), ["keep"], depth=1)
+        )
+        self.assertEqual(kept, [["keep", "1"]])
+
+    def test_iterparse_matches_to_list(self):
+        root = KiCadParser(read_file()).to_list(ScanMode.SLICE)
+        expected = [e for e in root if isinstance(e, list) and e[0] == "footprint"]
+        self.assertGreater(len(expected), 0)
+
+        # A tiny chunk size makes tokens straddle chunk boundaries
+        with mock.patch.object(KiCadParser, "CHUNK_SIZE", 7):
+            kept = list(KiCadParser.iterparse(SAMPLE_PCB_FILENAME, ["footprint"]))
+
+        self.assertEqual(kept, expected)
+
+    def test_lazy_list_matches_to_list(self):
+        s = read_file()
+        lazy = KiCadParser(s).to_lazy_list()
+        self.assertEqual(lazy, KiCadParser(s).to_list(ScanMode.SLICE))
+
+    def test_lazy_list_equals_other_lazy_forms(self):
+        s = "(a (b 1) (zone (pts (xy 1 2) (xy 3 4))) (c (d x)))"
+        others = {
+            "shared": share(KiCadParser(s).to_list()),
+            "packed": KiCadParser(s).to_list(packed=True),
+        }
+        for name, other in others.items():
+            with self.subTest(name=name):
+                self.assertEqual(KiCadParser(s).to_lazy_list(), other)
+                self.assertEqual(other, KiCadParser(s).to_lazy_list())
+                self.assertFalse(KiCadParser(s).to_lazy_list() != other)
+                changed = KiCadParser(s.replace("x", "y")).to_lazy_list()
+                self.assertNotEqual(changed, other)
+                self.assertNotEqual(other, changed)
+
+    def test_lazy_list_head_does_not_parse(self):
+        lazy = KiCadParser("(root atom (a 1 (b 2)) (c 3))").to_lazy_list()
+        self.assertEqual(lazy[0], "root")
+        self.assertEqual(lazy[1], "atom")
+
+        node = lazy[2]
+        self.assertIsInstance(node, LazySexp)
+        self.assertEqual(node[0], "a")
+        self.assertFalse(node.loaded)
+        self.assertNotEqual(node, ["c", "3"])
+        self.assertFalse(node.loaded)
+
+        self.assertEqual(node, ["a", "1", ["b", "2"]])
+        self.assertTrue(node.loaded)
+
+    def test_lazy_list_mutation_parses_first(self):
+        lazy = KiCadParser("(root (a 1))").to_lazy_list()
+        node = lazy[1]
+        node.append("2")
+        self.assertEqual(node, ["a", "1", "2"])
+        self.assertEqual(len(node), 3)
+
+    def test_lazy_list_spans(self):
+        s = "(root (a 1 (b 2)) (c 3))"
+        lazy = KiCadParser(s).to_lazy_list()
+        self.assertEqual(lazy.source_text(), s)
+        self.assertEqual(lazy[1].source_text(), "(a 1 (b 2))")
+        self.assertEqual(lazy[1][2].source_text(), "(b 2)")
+
+    def test_lazy_list_mutation_marks_ancestors_dirty(self):
+        lazy = KiCadParser("(root (a 1 (b 2)) (c 3))").to_lazy_list()
+        self.assertFalse(lazy.dirty)
+
+        b = lazy[1][2]
+        self.assertFalse(b.dirty)
+        b[1] = "5"
+
+        self.assertTrue(b.dirty)
+        self.assertTrue(lazy[1].dirty)
+        self.assertTrue(lazy.dirty)
+        self.assertFalse(lazy[2].dirty)
+
+    def test_lazy_list_added_children_mark_their_new_parents(self):
+        adds = {
+            "append": lambda d, c: d.append(c),
+            "insert": lambda d, c: d.insert(1, c),
+            "extend": lambda d, c: d.extend(iter([c])),
+            "iadd": lambda d, c: d.__iadd__([c]),
+            "setitem": lambda d, c: d.__setitem__(1, c),
+            "slice": lambda d, c: d.__setitem__(slice(1, 1), iter([c])),
+        }
+        for name, add in adds.items():
+            with self.subTest(name):
+                root = KiCadParser("(root (a 1 (b 2)) (d (e)))").to_lazy_list()
+                b, d = root[1][2], root[2]
+                root[1].remove(b)
+                add(d, b)
+                self.assertIs(b.parent, d)
+
+                structural_hash(root)
+                b[1] = "5"
+                self.assertIsNone(d.digest)
+                self.assertIsNone(root.digest)
+                self.assertIn(["b", "5"], d)
+
+    def test_lazy_list_reads_are_not_changes(self):
+        lazy = KiCadParser("(root (a 1 (b 2)) (c 3))").to_lazy_list()
+        str(lazy)
+        self.assertEqual(len(lazy[1]), 3)
+        self.assertFalse(lazy.dirty)
+
+    def test_lazy_list_copies_are_plain(self):
+        lazy = KiCadParser("(root (a 1 (b 2)))").to_lazy_list()
+        clone = copy.deepcopy(lazy[1])
+        self.assertNotIsInstance(clone, SourceSexp)
+        self.assertNotIsInstance(clone[2], SourceSexp)
+        clone[2][1] = "5"
+        self.assertFalse(lazy.dirty)
+        self.assertEqual(lazy[1], ["a", "1", ["b", "2"]])
+
+    def test_lazy_list_unbalanced(self):
+        with self.assertRaises(Exception):
+            KiCadParser("(root (a 1)").to_lazy_list()
+
+    def test_typed_atoms(self):
+        root = KiCadParser('(at 1.27 -2 "A \\"B\\"" F.Cu)').to_list(typed=True)
+        self.assertEqual(root, ["at", "1.27", "-2", '"A \\"B\\""', "F.Cu"])
+        self.assertEqual(
+            [type(e) for e in root],
+            [SymbolAtom, NumberAtom, NumberAtom, QuotedAtom, SymbolAtom],
+        )
+        self.assertEqual(makeDecimal(root[1]), Decimal("1.27"))
+        self.assertEqual(makeText(root[3]), 'A "B"')
+
+    def test_typed_atoms_share_values(self):
+        root = KiCadParser("(a (at 0 1) (at 0 1))").to_list(ScanMode.SLICE, typed=True)
+        self.assertIs(root[1][1], root[2][1])
+        self.assertIs(makeDecimal(root[1][1]), makeDecimal(root[2][1]))
+
+    def test_typed_tree_matches_plain(self):
+        s = read_file()
+        plain = KiCadParser(s).to_list(ScanMode.SLICE)
+        self.assertEqual(KiCadParser(s).to_list(ScanMode.SLICE, typed=True), plain)
+        self.assertEqual(KiCadParser(s).to_lazy_list(typed=True), plain)
+
+    def test_typed_lazy_list(self):
+        lazy = KiCadParser("(root (at 1 2))").to_lazy_list(typed=True)
+        node = lazy[1]
+        self.assertIsInstance(node, TypedLazySexp)
+        self.assertIsInstance(node[0], SymbolAtom)
+        self.assertFalse(node.loaded)
+        self.assertIsInstance(node[1], NumberAtom)
+        self.assertTrue(node.loaded)
+
+    def test_typed_lazy_atoms_are_shared(self):
+        lazy = KiCadParser("(a (at 0 1) (b (at 0 1)))").to_lazy_list(typed=True)
+        self.assertIs(lazy[1][0], lazy[2][1][0])
+        self.assertIs(lazy[1][1], lazy[2][1][1])
+        self.assertIs(lazy[1][2], lazy[2][1][2])
+
+    def test_escaped_strings_round_trip(self):
+        s = '(a "x\\ny" "tab\\there" "line\\nnext" "\\"quoted\\"" "back\\\\slash")'
+        expected = ["x\ny", "tab\there", "line\nnext", '"quoted"', "back\\slash"]
+
+        for root in [
+            KiCadParser(s).to_list(typed=True),
+            KiCadParser(s).to_lazy_list(typed=True),
+        ]:
+            self.assertEqual([makeText(e) for e in root[1:]], expected)
+            self.assertEqual(KiCadWriter().to_string(root).strip(), s)
+
+    def test_make_text_is_the_same_typed_or_not(self):
+        s = '(a b 1.5 "x\\ny" "R1")'
+        expected = ["a", "b", "1.5", "x\ny", "R1"]
+        for typed in [False, True]:
+            for root in [
+                KiCadParser(s).to_list(typed=typed),
+                KiCadParser(s).to_lazy_list(typed=typed),
+            ]:
+                with self.subTest(typed=typed, root=type(root).__name__):
+                    texts = [makeText(e) for e in root]
+                    self.assertEqual(texts, expected)
+                    self.assertEqual({type(text) for text in texts}, {str})
+
+    def test_binary_matches_text(self):
+        s = read_file()
+        expected = KiCadParser(s).to_list(ScanMode.SLICE)
+        data = s.encode("utf-8")
+
+        self.assertEqual(BinaryKiCadParser(data).to_list(), expected)
+        self.assertEqual(BinaryKiCadParser(data).to_lazy_list(), expected)
+        self.assertEqual(BinaryKiCadParser(data).to_nodes(), KiCadParser(s).to_nodes())
+        self.assertEqual(
+            list(BinaryKiCadParser(data).iter_events()),
+            list(KiCadParser(s).iter_events()),
+        )
+
+    def test_binary_decodes_utf8(self):
+        data = '(root (name "Größe") (b 1))'.encode("utf-8")
+        lazy = BinaryKiCadParser(data).to_lazy_list(typed=True)
+        self.assertEqual(lazy[1], ["name", '"Größe"'])
+        self.assertEqual(makeText(lazy[1][1]), "Größe")
+        self.assertEqual(lazy[2].source_text(), "(b 1)")
+
+    def test_map_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            name = temp_dir + "/test.kicad_mod"
+            with open(name, "wb") as f:
+                f.write(b"(footprint x\r\n  (at 1 2))")
+
+            lazy = BinaryKiCadParser.map_file(name).to_lazy_list()
+            self.assertEqual(lazy, ["footprint", "x", ["at", "1", "2"]])
+            # Line endings are not translated
+            self.assertEqual(lazy.source_text(), "(footprint x\r\n  (at 1 2))")
+
+            with open(name, "wb") as f:
+                pass
+            with self.assertRaises(Exception):
+                BinaryKiCadParser.map_file(name).to_lazy_list()
+
+    def test_binary_unbalanced(self):
+        with self.assertRaises(Exception):
+            BinaryKiCadParser(b"(root (a 1)").to_lazy_list()
+        with self.assertRaises(Exception):
+            BinaryKiCadParser(b"x (root)").to_list()
+
 
 if __name__ == "__main__":
     unittest.main()
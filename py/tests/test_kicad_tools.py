@@ -3,8 +3,10 @@ import math
 import unittest
 from kicad_tools import KicadTool, QueryRecursionLevel
 from kicad_tools import Layer
-from kicad_parser import KiCadParser
-from sexptype import SexpType, SexpTypeValue, makeDecimal
+from kicad_parser import KiCadParser, SourceSexp
+from kicad_writer import KiCadWriter
+from sexp_hash import structural_hash
+from sexptype import PinNumber, PinType, SexpType, SexpTypeValue, makeDecimal
 from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
 
 
@@ -196,6 +198,32 @@ class TestKiCadTools(unittest.TestCase):
         self.assertLess(box.x1, box.x2)
         self.assertLess(box.y1, box.y2)
 
+    def test_findFootprintByReferenceLazy(self):
+        with open(SAMPLE_PCB_FILENAME, "r") as data_file:
+            pcb = KiCadParser(data_file.read()).to_lazy_list()
+        pcb_tool = KicadTool()
+
+        l = pcb_tool.find_footprint_by_reference(pcb, "SW201")
+        self.assertEqual(l[0], "footprint")
+        self.assertTrue("SW201" in str(l))
+
+        # Only footprints were parsed to answer the query
+        loaded = [e for e in pcb if isinstance(e, SourceSexp) and e.loaded]
+        self.assertGreater(len(loaded), 0)
+        self.assertTrue(all(e[0] == "footprint" for e in loaded))
+
+    def test_getReference(self):
+        tool = KicadTool()
+        footprint = tool.find_footprint_by_reference(self.read_pcb_file(), "SW201")
+        self.assertEqual(tool.get_reference(footprint), "SW201")
+
+        schematic = self.read_keyboard_sch_file()
+        symbols = tool.find_objects_by_atom(
+            schematic, "symbol", QueryRecursionLevel.HERE
+        )
+        self.assertEqual(tool.get_reference(symbols[0]), "D208")
+        self.assertIsNone(tool.get_reference(["at", "1", "2"]))
+
     # Test the schematic
     def test_findSymbolByGoodReference(self):
         schematic = self.read_keyboard_sch_file()
@@ -231,6 +259,115 @@ class TestKiCadTools(unittest.TestCase):
         )
         self.assertEqual(len(afteratoms), 0)
 
+    def test_remove_where(self):
+        tool = KicadTool()
+        root = KiCadParser("(a x (b 1) (c 2) y (b 3) (d (b 4)))").to_list()
+        tool.index_tree(root)
+
+        removed = tool.remove_where(root, lambda node: node[0] == "b")
+        self.assertEqual(removed, [["b", "1"], ["b", "3"]])
+        self.assertEqual(root, ["a", "x", ["c", "2"], "y", ["d", ["b", "4"]]])
+        self.assertEqual(
+            tool.find_objects_by_atom(root, "b", QueryRecursionLevel.DEEP),
+            [["b", "4"]],
+        )
+        self.assertEqual(tool.remove_where(root, lambda node: False), [])
+
+    def test_remove_where_matches_one_at_a_time(self):
+        atoms = ["symbol", "wire", "global_label"]
+        with open(SAMPLE_KEYBOARD_SCH_FILENAME, "r") as f:
+            text = f.read()
+
+        looped = KiCadParser(text).to_list()
+        tool = KicadTool()
+        tool.index_tree(looped)
+        for atom in atoms:
+            while True:
+                found = tool.find_objects_by_atom(
+                    looped, atom, QueryRecursionLevel.HERE
+                )
+                if len(found) == 0:
+                    break
+                tool.remove_node(looped, found[0])
+
+        root = KiCadParser(text).to_list()
+        tool = KicadTool()
+        tool.index_tree(root)
+        tool.remove_where(root, lambda node: node[0] in atoms)
+        self.assertEqual(root, looped)
+        self.assertEqual(
+            tool.find_objects_by_atom(root, "symbol", QueryRecursionLevel.DEEP),
+            tool.find_objects_by_foo(root, ["symbol"], QueryRecursionLevel.DEEP),
+        )
+
+    def test_remove_where_lazy(self):
+        s = "(a\n  (b 1)\n  (c 2)\n  (b 3)\n)"
+        root = KiCadParser(s).to_lazy_list()
+        KicadTool().remove_where(root, lambda node: node[0] == "b")
+        self.assertEqual(KiCadWriter(splice=True).to_string(root), "(a\n  (c 2)\n)\n")
+
+    def test_detach(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 1)) (d))").to_list()
+        tool.index_tree(root)
+        c = root[1][1]
+        self.assertIs(tool.detach(c), root[1])
+        self.assertEqual(root, ["a", ["b"], ["d"]])
+
+        lazy = KiCadParser("(a (b (c 1)) (d))").to_lazy_list()
+        self.assertIs(KicadTool().detach(lazy[1]), lazy)
+        self.assertEqual(lazy, ["a", ["d"]])
+
+        with self.assertRaises(Exception):
+            KicadTool().detach(["e"])
+
+    def test_recording_plain_edits_builds_no_index(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 1)) (d))").to_list()
+        journal = tool.record_changes(root)
+        c = root[1][1]
+
+        tool.set_atom(c, 1, "2")
+        tool.append_node(c, ["e"])
+        self.assertIs(tool.detach(c[2]), c)
+        self.assertEqual([change.path for change in journal.changes], [(1, 1)] * 3)
+        self.assertFalse(tool.indexes[0].built)
+
+    def test_removed_nodes_leave_their_parents(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 1)) (d (e)))").to_lazy_list()
+        b, d = root[1], root[2]
+        c, e = b[1], d[1]
+
+        self.assertIs(tool.detach(c), b)
+        self.assertIsNone(tool.parent_of(c))
+        self.assertEqual(tool.remove_where(d, lambda node: node[0] == "e"), [e])
+        self.assertIsNone(tool.parent_of(e))
+
+        # Edits to them no longer change the tree they came from
+        structural_hash(root)
+        tool.set_atom(c, 1, "2")
+        e.append("x")
+        self.assertIsNotNone(root.digest)
+
+    def test_move_then_edit(self):
+        tool = KicadTool()
+        root = KiCadParser("(a (b (c 1)) (d (e)))").to_lazy_list()
+        b, d = root[1], root[2]
+        c = b[1]
+
+        tool.detach(c)
+        tool.append_node(d, c)
+        self.assertIs(tool.parent_of(c), d)
+
+        # Only the new parents are changed by an edit to the moved node
+        structural_hash(root)
+        tool.set_atom(c, 1, "2")
+        self.assertIsNotNone(b.digest)
+        self.assertIsNone(d.digest)
+        self.assertIsNone(root.digest)
+        self.assertEqual(root, ["a", ["b"], ["d", ["e"], ["c", "2"]]])
+
     def test_get_get_all_symbol_value_references(self):
         schematic = self.read_keyboard_sch_file()
         sch_tool = KicadTool()
@@ -263,6 +400,69 @@ class TestKiCadTools(unittest.TestCase):
                 self.assertLess(Decimal(abs(offset_x - x1)), fudge)
                 self.assertLess(Decimal(abs(offset_y - y1)), fudge)
 
+    def test_get_relative_pin_position_for_schematic(self):
+        schematic = self.read_keyboard_sch_file()
+        tool = KicadTool()
+        diode = tool.find_symbol_by_reference(schematic, "D202")
+        assert diode is not None
+        lib_id = tool.find_object_by_atom(diode, "lib_id", QueryRecursionLevel.HERE)
+        at = tool.find_object_by_atom(diode, "at", QueryRecursionLevel.HERE)
+        rotation = makeDecimal(at[3])
+
+        lib_symbols = tool.find_object_by_atom(
+            schematic, "lib_symbols", QueryRecursionLevel.HERE
+        )
+        [lib_symbol] = [s for s in lib_symbols[1:] if s[1] == lib_id[1]]
+        for pin_number in [PinNumber._1, PinNumber._2]:
+            with self.subTest(pin=pin_number):
+                [pin] = [
+                    pin
+                    for pin in tool.find_objects_by_atom(
+                        lib_symbol, "pin", QueryRecursionLevel.DEEP
+                    )
+                    if tool.find_object_by_atom(
+                        pin, "number", QueryRecursionLevel.DEEP
+                    )[1]
+                    == f'"{pin_number.value}"'
+                ]
+                pin_at = tool.find_object_by_atom(pin, "at", QueryRecursionLevel.HERE)
+                dx, dy = makeDecimal(pin_at[1]), makeDecimal(pin_at[2])
+                expected = {0: [dx, dy], 90: [dy, -dx], 180: [-dx, dy], 270: [dy, dx]}
+
+                offset = tool.get_relative_pin_position_for_schematic(
+                    schematic, diode, PinType.NUMBER, pin_number
+                )
+                self.assertEqual(offset, expected[int(rotation)])
+
+    def test_pin_offsets_follow_lib_symbols(self):
+        schematic = self.read_keyboard_sch_file()
+        tool = KicadTool()
+        diode = tool.find_symbol_by_reference(schematic, "D202")
+        assert diode is not None
+        offset = tool.get_relative_pin_position_for_schematic(
+            schematic, diode, PinType.NUMBER, PinNumber._1
+        )
+
+        lib_id = tool.find_object_by_atom(diode, "lib_id", QueryRecursionLevel.HERE)
+        lib_symbols = tool.find_object_by_atom(
+            schematic, "lib_symbols", QueryRecursionLevel.HERE
+        )
+        [lib_symbol] = [s for s in lib_symbols[1:] if s[1] == lib_id[1]]
+
+        tool.remove_node(lib_symbols, lib_symbol)
+        with self.assertRaises(Exception):
+            tool.get_relative_pin_position_for_schematic(
+                schematic, diode, PinType.NUMBER, PinNumber._1
+            )
+
+        tool.append_node(lib_symbols, lib_symbol)
+        self.assertEqual(
+            tool.get_relative_pin_position_for_schematic(
+                schematic, diode, PinType.NUMBER, PinNumber._1
+            ),
+            offset,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,177 @@
+import io
+import unittest
+from decimal import Decimal
+from kicad_parser import BinaryKiCadParser, KiCadParser, ScanMode
+from kicad_tools import KicadTool, Layer
+from kicad_writer import KiCadWriter
+from sexptype import SexpType
+from tests.helpers import read_tree
+from tests.test_filepaths import (
+    CONTROLLER_PICO_PCB_FILENAME,
+    SAMPLE_KEYBOARD_SCH_FILENAME,
+    SAMPLE_PCB_FILENAME,
+)
+
+
+class TestKiCadWriter(unittest.TestCase):
+    def test_leaf_list_is_one_line(self):
+        out = KiCadWriter().to_string(["at", "1", "2", "90"])
+        self.assertEqual(out, "(at 1 2 90)\n")
+
+    def test_empty_list(self):
+        self.assertEqual(KiCadWriter().to_string([]), "()\n")
+
+    def test_nested_layout(self):
+        root: SexpType = [
+            "kicad_pcb",
+            ["version", "20211014"],
+            ["general", ["thickness", "1.6"]],
+            ["pin_names", ["offset", "0"], "hide"],
+            ["net", "0", '""'],
+            ["net", "1", '"VCC"'],
+        ]
+        out = KiCadWriter().to_string(root)
+        self.assertEqual(
+            out,
+            "(kicad_pcb (version 20211014) (general (thickness 1.6))"
+            ' (pin_names (offset 0) hide) (net 0 "")\n'
+            '  (net 1 "VCC")\n'
+            ")\n",
+        )
+
+    def test_runs_of_leaf_lists_are_wrapped(self):
+        xys = [["xy", str(i), str(i * 10)] for i in range(20)]
+        root: SexpType = ["fp_poly", ["pts", *xys], ["layer", '"F.SilkS"']]
+        out = KiCadWriter().to_string(root)
+        lines = out.splitlines()
+
+        self.assertEqual(lines[0], "(fp_poly")
+        self.assertTrue(lines[1].startswith("  (pts (xy 0 0) (xy 1 10)"))
+        self.assertTrue(all(line.startswith("    (xy") for line in lines[2:-2]))
+        self.assertTrue(lines[-3].endswith("(xy 19 190))"))
+        self.assertEqual(lines[-2:], ['  (layer "F.SilkS")', ")"])
+        self.assertLessEqual(max(len(line) for line in lines), KiCadWriter.LINE_WIDTH)
+        self.assertEqual(KiCadParser(out).to_list(), root)
+
+        # A packed block is laid out the same
+        packed = KiCadParser(out).to_list(packed=True)
+        self.assertEqual(KiCadWriter().to_string(packed), out)
+
+    def test_kicad_file_keeps_its_size(self):
+        with open(CONTROLLER_PICO_PCB_FILENAME, "r") as f:
+            source = f.read()
+        out = KiCadWriter().to_string(KiCadParser(source).to_list(ScanMode.SLICE))
+        self.assertEqual(KiCadParser(out).to_list(), KiCadParser(source).to_list())
+        self.assertLess(len(out), len(source) * 1.05)
+
+    def test_layer_enum_written_by_value(self):
+        out = KiCadWriter().to_string(["layer", Layer.F_Silkscreen])
+        self.assertEqual(out, '(layer "F.SilkS")\n')
+
+    def test_round_trip(self):
+        for name in [SAMPLE_PCB_FILENAME, SAMPLE_KEYBOARD_SCH_FILENAME]:
+            with self.subTest(name=name):
+                root = read_tree(name)
+                out = KiCadWriter().to_string(root)
+                self.assertEqual(KiCadParser(out).to_list(ScanMode.SLICE), root)
+
+    def test_typed_atoms_written_unchanged(self):
+        for name in [SAMPLE_PCB_FILENAME, SAMPLE_KEYBOARD_SCH_FILENAME]:
+            with self.subTest(name=name):
+                with open(name, "r") as f:
+                    typed = KiCadParser(f.read()).to_list(ScanMode.SLICE, typed=True)
+                self.assertEqual(
+                    KiCadWriter().to_string(typed),
+                    KiCadWriter().to_string(read_tree(name)),
+                )
+
+    def test_streams_in_batches(self):
+        root = read_tree(SAMPLE_PCB_FILENAME)
+        writes = []
+
+        class Recorder(io.StringIO):
+            def write(self, s):
+                writes.append(s)
+                return super().write(s)
+
+        out = Recorder()
+        KiCadWriter().write(root, out)
+        self.assertGreater(len(writes), 1)
+        self.assertEqual(out.getvalue(), KiCadWriter().to_string(root))
+
+    def test_deep_tree_is_not_recursive(self):
+        root: SexpType = ["leaf"]
+        for _ in range(5000):
+            root = ["node", root]
+
+        out = KiCadWriter().to_string(root)
+        self.assertEqual(out.count("("), 5001)
+
+
+class TestKiCadWriterSplice(unittest.TestCase):
+    SOURCE = "(root\n  (a 1\n    (b 2))\n\n  (c   3)\n)"
+
+    def test_unchanged_document_is_copied(self):
+        lazy = KiCadParser(self.SOURCE).to_lazy_list()
+        out = KiCadWriter(splice=True).to_string(lazy)
+        self.assertEqual(out, self.SOURCE + "\n")
+
+    def test_only_changed_node_is_rewritten(self):
+        lazy = KiCadParser(self.SOURCE).to_lazy_list()
+        lazy[1][2][1] = "5"
+        out = KiCadWriter(splice=True).to_string(lazy)
+        self.assertEqual(out, "(root\n  (a 1 (b 5))\n\n  (c   3)\n)\n")
+
+    def test_appended_node(self):
+        lazy = KiCadParser(self.SOURCE).to_lazy_list()
+        lazy.append(["d", "4"])
+        out = KiCadWriter(splice=True).to_string(lazy)
+        self.assertEqual(out, "(root\n  (a 1\n    (b 2))\n\n  (c   3)\n  (d 4)\n)\n")
+
+    def test_removed_node(self):
+        lazy = KiCadParser(self.SOURCE).to_lazy_list()
+        lazy.remove(lazy[1])
+        out = KiCadWriter(splice=True).to_string(lazy)
+        self.assertEqual(out, "(root\n  (c   3)\n)\n")
+
+    def test_without_splice_everything_is_laid_out(self):
+        lazy = KiCadParser(self.SOURCE).to_lazy_list()
+        out = KiCadWriter().to_string(lazy)
+        self.assertEqual(out, "(root (a 1 (b 2)) (c 3))\n")
+
+    def test_spliced_real_file_round_trips(self):
+        with open(SAMPLE_PCB_FILENAME, "r") as f:
+            source = f.read()
+        lazy = KiCadParser(source).to_lazy_list()
+        tool = KicadTool()
+        tool.move_text_to_layer(lazy, "SW201", "value", Layer.F_Silkscreen)
+        tool.draw_circle(
+            lazy, Layer.Edge_Cuts, Decimal(1), Decimal(2), Decimal(3), "none"
+        )
+
+        out = KiCadWriter(splice=True).to_string(lazy)
+        expected = read_tree(SAMPLE_PCB_FILENAME)
+        tool.move_text_to_layer(expected, "SW201", "value", Layer.F_Silkscreen)
+        tool.draw_circle(
+            expected, Layer.Edge_Cuts, Decimal(1), Decimal(2), Decimal(3), "none"
+        )
+
+        self.assertEqual(KiCadParser(out).to_list(ScanMode.SLICE), expected)
+
+    def test_spliced_binary_source(self):
+        source = self.SOURCE.replace("\n", "\r\n").encode("utf-8")
+        lazy = BinaryKiCadParser(source).to_lazy_list()
+        self.assertEqual(
+            KiCadWriter(splice=True).to_string(lazy), source.decode("utf-8") + "\n"
+        )
+
+        lazy[1][2][1] = "5"
+        out = KiCadWriter(splice=True).to_string(lazy)
+        self.assertEqual(
+            KiCadParser(out).to_list(), ["root", ["a", "1", ["b", "5"]], ["c", "3"]]
+        )
+        self.assertIn("(b 5))\r\n\r\n  (c   3)", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
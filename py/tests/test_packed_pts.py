@@ -0,0 +1,125 @@
+import copy
+import unittest
+from array import array
+from decimal import Decimal
+from kicad_parser import KiCadParser, ScanMode
+from kicad_tools import KicadTool, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from packed_pts import PackedPts
+from sexp_clone import share
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME
+
+ZONE = "(zone (polygon (pts (xy 1.5 -2) (xy 3 4.25) (xy 0 0))))"
+
+
+class TestPackedPts(unittest.TestCase):
+    def test_pack(self):
+        pts = PackedPts.pack(["pts", ["xy", "1.5", "-2"], ["xy", "3", "4.25"]])
+        assert pts is not None
+        self.assertEqual(pts.coords, array("d", [1.5, -2, 3, 4.25]))
+        self.assertEqual(pts[0], "pts")
+        self.assertEqual(len(pts), 3)
+        self.assertFalse(pts.loaded)
+
+        self.assertEqual(pts, ["pts", ["xy", "1.5", "-2"], ["xy", "3", "4.25"]])
+        self.assertTrue(pts.loaded)
+
+    def test_only_exact_numbers_are_packed(self):
+        for xy in [["xy", "1.50", "2"], ["xy", "1e3", "2"], ["xy", "1", "a"]]:
+            with self.subTest(xy=xy):
+                self.assertIsNone(PackedPts.pack(["pts", xy]))
+        self.assertIsNone(PackedPts.pack(["pts", ["xy", "1", "2"], ["arc", "1"]]))
+
+    def test_parse_packed(self):
+        root = KiCadParser(ZONE).to_list(packed=True)
+        pts = root[1][1]
+        self.assertIsInstance(pts, PackedPts)
+        self.assertEqual(root, KiCadParser(ZONE).to_list(ScanMode.SLICE))
+
+    def test_parse_leaves_other_pts_alone(self):
+        for s in [
+            "(a pts (pts) (pts (xy 1 2) (arc 3)) (pts (xy 1.10 2)))",
+            "(a (pts (xy 0.000001 2) (xy 100.66724554122824 1e-05)))",
+        ]:
+            with self.subTest(s=s):
+                root = KiCadParser(s).to_list(packed=True)
+                self.assertEqual(root, KiCadParser(s).to_list(ScanMode.SLICE))
+                self.assertEqual(
+                    KiCadWriter().to_string(root),
+                    KiCadWriter().to_string(KiCadParser(s).to_list()),
+                )
+        with self.assertRaises(Exception):
+            KiCadParser("(a (pts (xy 1 2)").to_list(packed=True)
+
+    def test_equals_other_lazy_forms(self):
+        s = "(zone (pts (xy 1.5 -2) (xy 3 4.25)))"
+        others = {
+            "lazy": KiCadParser(s).to_lazy_list()[1],
+            "shared": share(KiCadParser(s).to_list())[1],
+        }
+        for name, other in others.items():
+            with self.subTest(name=name):
+                packed = KiCadParser(s).to_list(packed=True)[1]
+                self.assertIsInstance(packed, PackedPts)
+                self.assertTrue(packed == other)
+                self.assertFalse(packed != other)
+                moved = KiCadParser(s.replace("3", "4")).to_list(packed=True)[1]
+                self.assertFalse(moved == other)
+
+    def test_real_file_round_trip(self):
+        with open(SAMPLE_KEYBOARD_SCH_FILENAME, "r") as f:
+            s = f.read()
+        plain = KiCadParser(s).to_list(ScanMode.SLICE)
+        packed = KiCadParser(s).to_list(ScanMode.SLICE, packed=True)
+
+        self.assertEqual(
+            KiCadWriter().to_string(packed), KiCadWriter().to_string(plain)
+        )
+        self.assertEqual(packed, plain)
+
+    def test_write_does_not_unpack(self):
+        root = KiCadParser(ZONE).to_list(packed=True)
+        out = KiCadWriter().to_string(root)
+        self.assertFalse(root[1][1].loaded)
+        self.assertEqual(out, KiCadWriter().to_string(KiCadParser(ZONE).to_list()))
+
+    def test_queries_skip_packed_blocks(self):
+        root = KiCadParser(ZONE).to_list(packed=True)
+        tool = KicadTool()
+        self.assertEqual(
+            tool.find_objects_by_atom(root, "at", QueryRecursionLevel.DEEP), []
+        )
+        self.assertEqual(
+            len(tool.find_objects_by_atom(root, "pts", QueryRecursionLevel.DEEP)), 1
+        )
+        self.assertFalse(root[1][1].loaded)
+
+        xys = tool.find_objects_by_atom(root, "xy", QueryRecursionLevel.DEEP)
+        self.assertEqual(len(xys), 3)
+
+        # Changes to what a query found stick
+        xys[0][1] = "9"
+        self.assertEqual(root[1][1][1], ["xy", "9", "-2"])
+
+    def test_copies_are_plain(self):
+        pts = KiCadParser(ZONE).to_list(packed=True)[1][1]
+        clone = copy.deepcopy(pts)
+        self.assertNotIsInstance(clone, PackedPts)
+        clone[1][1] = "7"
+        self.assertEqual(pts[1], ["xy", "1.5", "-2"])
+
+    def test_keepout_zone_is_packed(self):
+        root = ["kicad_pcb"]
+        KicadTool().draw_keepout_zone(root, Decimal(10), Decimal(20), Decimal(2))
+        out = KiCadWriter().to_string(root)
+
+        pts = KiCadParser(out).to_list(packed=True)[-1][-1][-1]
+        self.assertIsInstance(pts, PackedPts)
+        self.assertEqual(len(pts), 32)
+        self.assertEqual(
+            KiCadWriter().to_string(KiCadParser(out).to_list(packed=True)), out
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import unittest
+from unittest import mock
+import tempfile
+from pathlib import Path
+from kicad_parser import KiCadParser, ScanMode
+from parse_cache import ParseCache
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ParseCache(Path(self.temp_dir.name) / "cache")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def count_parses(self, text: str) -> int:
+        with mock.patch.object(
+            KiCadParser, "to_list", autospec=True, side_effect=KiCadParser.to_list
+        ) as to_list:
+            self.cache.parse(text)
+        return to_list.call_count
+
+    def test_load_matches_parser(self):
+        with open(SAMPLE_KEYBOARD_SCH_FILENAME, "r") as f:
+            expected = KiCadParser(f.read()).to_list(ScanMode.SLICE)
+
+        self.assertEqual(self.cache.load(Path(SAMPLE_KEYBOARD_SCH_FILENAME)), expected)
+        # And again, this time from the cache
+        self.assertEqual(self.cache.load(Path(SAMPLE_KEYBOARD_SCH_FILENAME)), expected)
+
+    def test_second_parse_is_cached(self):
+        self.assertEqual(self.count_parses("(a (b 1))"), 1)
+        self.assertEqual(self.count_parses("(a (b 1))"), 0)
+
+    def test_changed_text_is_parsed_again(self):
+        self.cache.parse("(a (b 1))")
+        self.assertEqual(self.cache.parse("(a (b 2))"), ["a", ["b", "2"]])
+        self.assertEqual(self.count_parses("(a (b 3))"), 1)
+
+    def test_parser_version_invalidates(self):
+        self.cache.parse("(a (b 1))")
+        with mock.patch.object(KiCadParser, "VERSION", KiCadParser.VERSION + 1):
+            self.assertEqual(self.count_parses("(a (b 1))"), 1)
+
+    def test_damaged_entry_is_parsed_again(self):
+        text = "(a (b 1))"
+        self.cache.parse(text)
+        self.cache.path_for(text).write_bytes(b"\x00not marshal")
+
+        self.assertEqual(self.cache.parse(text), ["a", ["b", "1"]])
+        self.assertEqual(self.count_parses(text), 0)
+
+    def test_unwritable_cache_still_parses(self):
+        # A file where the directory should be, so nothing can be stored
+        Path(self.temp_dir.name, "cache").write_text("")
+        self.assertEqual(self.cache.parse("(a (b 1))"), ["a", ["b", "1"]])
+        self.assertEqual(self.count_parses("(a (b 1))"), 1)
+
+    def test_prunes_least_recently_used(self):
+        texts = [f"(a (b {i}))" for i in range(3)]
+        self.cache.parse(texts[0])
+        size = self.cache.path_for(texts[0]).stat().st_size
+        self.cache.max_bytes = 3 * size
+        for i, text in enumerate(texts):
+            self.cache.parse(text)
+            # Whole seconds apart, whatever the file system keeps
+            os.utime(self.cache.path_for(text), (i, i))
+
+        # The oldest entry, used again, outlives the next one
+        self.assertIsNotNone(self.cache.lookup(texts[0]))
+        self.cache.parse("(a (b 3))")
+
+        self.assertIsNotNone(self.cache.lookup(texts[0]))
+        self.assertIsNone(self.cache.lookup(texts[1]))
+        self.assertIsNotNone(self.cache.lookup(texts[2]))
+        self.assertEqual(len(list(self.cache.cache_dir.iterdir())), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from decimal import Decimal
+from kicad_tools import KicadTool, QueryRecursionLevel
+from reference_index import ReferenceIndex
+from sexptype import UnitNumber
+from tests.helpers import read_tree
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+
+def footprint(ref: str, x: str = "0"):
+    return [
+        "footprint",
+        '"lib:part"',
+        ["at", x, "0"],
+        ["fp_text", "reference", f'"{ref}"'],
+    ]
+
+
+class TestReferenceIndex(unittest.TestCase):
+    def test_matches_query(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        walking = KicadTool()
+        indexed = KicadTool()
+        indexed.index_references(pcb)
+
+        footprints = walking.find_objects_by_atom(
+            pcb, "footprint", QueryRecursionLevel.HERE
+        )
+        refs = [walking.get_reference(f) for f in footprints]
+        self.assertGreater(len(refs), 0)
+        for ref in refs[::10]:
+            with self.subTest(ref=ref):
+                self.assertIs(
+                    indexed.find_footprint_by_reference(pcb, ref),
+                    walking.find_footprint_by_reference(pcb, ref),
+                )
+        self.assertEqual(indexed.find_footprint_by_reference(pcb, "NOPE1"), [])
+
+    def test_other_roots_are_searched(self):
+        tool = KicadTool()
+        tool.index_references(["kicad_pcb", footprint("SW1")])
+        other = ["kicad_pcb", footprint("SW1", "5")]
+        self.assertIs(tool.find_footprint_by_reference(other, "SW1"), other[1])
+
+    def test_appends_and_removes(self):
+        tool = KicadTool()
+        pcb = ["kicad_pcb", footprint("SW1")]
+        tool.index_references(pcb)
+
+        tool.append_node(pcb, footprint("D1"))
+        self.assertIs(tool.find_footprint_by_reference(pcb, "D1"), pcb[2])
+
+        tool.remove_node(pcb, pcb[1])
+        self.assertEqual(tool.find_footprint_by_reference(pcb, "SW1"), [])
+        self.assertIs(tool.find_footprint_by_reference(pcb, "D1"), pcb[1])
+
+    def test_lazy_index(self):
+        tool = KicadTool()
+        pcb = ["kicad_pcb", footprint("SW1")]
+        index = tool.index_references(pcb, lazy=True)
+
+        tool.append_node(pcb, footprint("D1"))
+        tool.remove_node(pcb, pcb[1])
+        self.assertFalse(index.built)
+
+        self.assertIs(tool.find_footprint_by_reference(pcb, "D1"), pcb[1])
+        self.assertEqual(tool.find_footprint_by_reference(pcb, "SW1"), [])
+        self.assertTrue(index.built)
+
+    def test_first_duplicate_wins(self):
+        pcb = ["kicad_pcb", footprint("SW1", "1"), footprint("SW1", "2")]
+        index = ReferenceIndex(pcb, KicadTool._reference_keys)
+        self.assertEqual(index.find(pcb, ("footprint", '"SW1"')), [pcb[1], pcb[2]])
+
+        # Out of document order, as inserted before the others
+        first = footprint("SW1", "0")
+        pcb.insert(1, first)
+        index.add(pcb, first)
+        self.assertEqual(
+            index.find(pcb, ("footprint", '"SW1"')), [first, pcb[2], pcb[3]]
+        )
+
+        index.remove(first)
+        self.assertIs(index.find(pcb, ("footprint", '"SW1"'))[0], pcb[2])
+
+    def test_symbols_match_query(self):
+        schematic = read_tree(SAMPLE_KEYBOARD_SCH_FILENAME)
+        walking = KicadTool()
+        indexed = KicadTool()
+        indexed.index_references(schematic)
+
+        for ref in ["D202", "SW202", "D266", "NOPE1"]:
+            for unit in [UnitNumber.ONE, UnitNumber.TWO]:
+                with self.subTest(ref=ref, unit=unit):
+                    found = indexed.find_symbol_by_reference(schematic, ref, unit)
+                    self.assertIs(
+                        found, walking.find_symbol_by_reference(schematic, ref, unit)
+                    )
+        self.assertIsNotNone(indexed.find_symbol_by_reference(schematic, "D202"))
+
+    def test_placed_symbols_are_indexed(self):
+        schematic = read_tree(SAMPLE_KEYBOARD_SCH_FILENAME)
+        tool = KicadTool()
+        index = tool.index_references(schematic)
+        tool.remove_atoms(schematic, "symbol")
+        self.assertIsNone(tool.find_symbol_by_reference(schematic, "D202"))
+
+        tool.add_keyswitch_to_schematic("202", "A", schematic, 0, 0, Decimal(1), False)
+        diode = tool.find_symbol_by_reference(schematic, "D202")
+        self.assertIs(diode, schematic[-2])
+        self.assertIs(
+            tool.find_symbol_by_reference(schematic, "SW202", UnitNumber.TWO),
+            schematic[-1],
+        )
+        self.assertIsNotNone(index.find(schematic, ("symbol", '"SW202"', "1")))
+
+
+if __name__ == "__main__":
+    unittest.main()
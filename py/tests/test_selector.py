@@ -0,0 +1,107 @@
+import unittest
+from atom_index import AtomIndex
+from kicad_parser import KiCadParser
+from kicad_tools import KicadTool, QueryRecursionLevel
+from selector import Selector
+from sexptype import UnitNumber
+from tests.helpers import assert_same_nodes, read_tree
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+
+class TestSelector(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pcb = read_tree(SAMPLE_PCB_FILENAME)
+        cls.schematic = read_tree(SAMPLE_KEYBOARD_SCH_FILENAME)
+
+    def test_compiled_once(self):
+        self.assertIs(
+            Selector.compile("footprint > at"), Selector.compile("footprint > at")
+        )
+
+    def test_bad_selectors(self):
+        for text in ["", "a[", "a[b=]", "a >", "a[b] c]", "[b]"]:
+            with self.subTest(text=text):
+                with self.assertRaises(Exception):
+                    Selector.compile(text)
+
+    def test_reference(self):
+        tool = KicadTool()
+        found = tool.select(self.pcb, 'footprint[fp_text.reference="SW214"]')
+        assert_same_nodes(
+            self, found, [tool.find_footprint_by_reference(self.pcb, "SW214")]
+        )
+
+    def test_child(self):
+        tool = KicadTool()
+        footprint = tool.find_footprint_by_reference(self.pcb, "D239")
+        found = tool.select(self.pcb, 'footprint[fp_text.reference="D239"] > at')
+        expected = tool.find_objects_by_atom(footprint, "at", QueryRecursionLevel.HERE)
+        assert_same_nodes(self, found, expected)
+
+    def test_descendant(self):
+        tool = KicadTool()
+        found = tool.select(self.pcb, "footprint fp_text")
+        expected = [
+            text
+            for footprint in tool.find_objects_by_atom(
+                self.pcb, "footprint", QueryRecursionLevel.HERE
+            )
+            for text in tool.find_objects_by_atom(
+                footprint, "fp_text", QueryRecursionLevel.DEEP
+            )
+        ]
+        assert_same_nodes(self, found, expected)
+
+    def test_atoms_of_the_node(self):
+        tool = KicadTool()
+        found = tool.select(self.pcb, "fp_text.reference")
+        expected = tool.find_objects_by_foo(
+            self.pcb, ["fp_text", "reference"], QueryRecursionLevel.DEEP
+        )
+        self.assertGreater(len(expected), 0)
+        assert_same_nodes(self, found, expected)
+
+        found = tool.select(self.pcb, 'footprint > fp_text.reference="SW214"')
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found[0][2], '"SW214"')
+
+    def test_symbol_unit(self):
+        tool = KicadTool()
+        for unit, text in [(UnitNumber.ONE, "1"), (UnitNumber.TWO, "2")]:
+            with self.subTest(unit=text):
+                found = tool.select(
+                    self.schematic, f'symbol[unit={text}][property.Reference="SW239"]'
+                )
+                expected = tool.find_symbol_by_reference(self.schematic, "SW239", unit)
+                assert_same_nodes(self, found, [] if expected is None else [expected])
+
+    def test_star_and_values(self):
+        root = KiCadParser(
+            "(a (b (width 0.2) (c 1)) (d (width 0.25) (c 2)) (c 3))"
+        ).to_list()
+        tool = KicadTool()
+        self.assertEqual(tool.select(root, "*[width=0.2] > c"), [["c", "1"]])
+        self.assertEqual(tool.select(root, "a > * > c"), [["c", "1"], ["c", "2"]])
+        self.assertEqual(tool.select(root, "a > c"), [["c", "3"]])
+        self.assertEqual(tool.select(root, "a"), [root])
+        self.assertEqual(tool.select(root, "*[width]"), [root[1], root[2]])
+
+    def test_index_gives_same_answers(self):
+        index = AtomIndex(self.pcb)
+        for text in [
+            'footprint[fp_text.reference="D239"] > at',
+            "footprint fp_text",
+            "footprint > fp_text[effects.font] effects",
+            "kicad_pcb > footprint > pad",
+            "*[layer] > at",
+        ]:
+            with self.subTest(text=text):
+                selector = Selector.compile(text)
+                assert_same_nodes(
+                    self, selector.select(self.pcb, index), selector.select(self.pcb)
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import copy
+import unittest
+from decimal import Decimal
+from kicad_parser import KiCadParser
+from kicad_tools import KicadTool, QueryRecursionLevel
+from kicad_writer import KiCadWriter
+from packed_pts import PackedPts
+from sexp_clone import SharedSexp, clone, share
+from tests.helpers import read_file
+from tests.test_filepaths import SAMPLE_PCB_FILENAME
+
+SAMPLE = "(a (b 1 2) (c (d 3) (e 4)) x)"
+
+
+class TestSexpClone(unittest.TestCase):
+    def test_share_reads_like_the_tree(self):
+        tree = KiCadParser(SAMPLE).to_list()
+        shared = share(tree)
+
+        self.assertEqual(shared[0], "a")
+        self.assertEqual(len(shared), 4)
+        self.assertFalse(shared.loaded)
+
+        self.assertEqual(shared[1], ["b", "1", "2"])
+        self.assertTrue(shared.loaded)
+        self.assertIsInstance(shared[2], SharedSexp)
+        self.assertFalse(shared[2].loaded)
+        self.assertEqual(copy.deepcopy(shared), tree)
+        self.assertFalse(shared[2].loaded)
+        self.assertEqual(shared, tree)
+
+    def test_clones_are_independent(self):
+        tree = KiCadParser(SAMPLE).to_list()
+        shared = share(tree)
+        first = clone(shared)
+        second = clone(shared)
+
+        first[2][1][1] = "30"
+        second[2].append(["f"])
+        first[2][1].append("hide")
+
+        self.assertEqual(shared, tree)
+        self.assertEqual(first[2], ["c", ["d", "30", "hide"], ["e", "4"]])
+        self.assertEqual(second[2], ["c", ["d", "3"], ["e", "4"], ["f"]])
+
+    def test_unread_levels_stay_shared(self):
+        shared = share(KiCadParser(SAMPLE).to_list())
+        first = clone(shared)
+        first[1][1] = "10"
+
+        second = clone(first)
+        self.assertFalse(second[2].loaded)
+        self.assertIs(second[2].node, first[2].node)
+
+        second[1][2] = "20"
+        self.assertEqual(first[1], ["b", "10", "2"])
+        self.assertEqual(second[1], ["b", "10", "20"])
+        self.assertEqual(first[2], second[2])
+
+    def test_separate_clones_compare_equal(self):
+        tree = KiCadParser(SAMPLE).to_list()
+        first = clone(share(tree))
+        second = clone(share(tree))
+        self.assertIsNot(first.node, second.node)
+
+        self.assertEqual(first, second)
+        self.assertEqual(clone(share(tree)), clone(share(tree)))
+        self.assertFalse(clone(share(tree)) != clone(share(tree)))
+        self.assertEqual(clone(share(tree)) + [], tree)
+
+        changed = clone(share(tree))
+        changed[2][1][1] = "30"
+        self.assertNotEqual(clone(share(tree)), changed)
+        self.assertLess(clone(share(tree)), changed)
+
+    def test_equals_other_lazy_forms(self):
+        s = "(a (b 1) (pts (xy 1 2) (xy 3 4)) (c (d x)))"
+        others = {
+            "lazy": KiCadParser(s).to_lazy_list(),
+            "packed": KiCadParser(s).to_list(packed=True),
+        }
+        for name, other in others.items():
+            with self.subTest(name=name):
+                self.assertTrue(share(KiCadParser(s).to_list()) == other)
+                self.assertFalse(clone(share(KiCadParser(s).to_list())) != other)
+                changed = share(KiCadParser(s.replace("x", "y")).to_list())
+                self.assertFalse(changed == other)
+
+    def test_plain_lists_are_copied(self):
+        tree = KiCadParser("(a (pts (xy 1 2) (xy 3 4)) (b (c 1)))").to_list(packed=True)
+        copied = clone(tree)
+        self.assertIsInstance(copied[1], PackedPts)
+        self.assertFalse(copied[1].loaded)
+        self.assertEqual(copied, tree)
+
+        copied[2][1][1] = "2"
+        self.assertEqual(tree[2], ["b", ["c", "1"]])
+
+    def test_write_without_loading(self):
+        tree = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list()
+        shared = clone(share(tree))
+        writer = KiCadWriter()
+
+        self.assertEqual(writer.to_string(shared), writer.to_string(tree))
+        self.assertFalse(shared.loaded)
+
+    def test_board_variant(self):
+        tree = KiCadParser(read_file(SAMPLE_PCB_FILENAME)).to_list()
+        base = share(tree)
+        variant = clone(base)
+        tool = KicadTool()
+        tool.set_object_location(variant, "SW201", Decimal(1), Decimal(2), Decimal(90))
+
+        self.assertEqual(
+            tool.find_footprint_at_by_reference(variant, "SW201")[:4],
+            ["at", "1", "2", "90"],
+        )
+        self.assertNotEqual(
+            tool.find_footprint_at_by_reference(clone(base), "SW201")[:4],
+            ["at", "1", "2", "90"],
+        )
+        self.assertEqual(base, tree)
+
+        # Only the footprints' own levels were read to find SW201
+        footprints = tool.find_objects_by_atom(
+            variant, "footprint", QueryRecursionLevel.HERE
+        )
+        pads = [
+            e
+            for footprint in footprints
+            for e in list.__iter__(footprint)
+            if isinstance(e, SharedSexp) and e.node is not None and e.node.head == "pad"
+        ]
+        self.assertGreater(len(pads), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from kicad_parser import KiCadParser, ScanMode
+from sexp_hash import group_by_hash, structural_hash
+from tests.helpers import read_file
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+
+class TestStructuralHash(unittest.TestCase):
+    def test_equal_trees_hash_equal(self):
+        s = read_file(SAMPLE_PCB_FILENAME)
+        expected = structural_hash(KiCadParser(s).to_list(ScanMode.SLICE))
+        self.assertEqual(structural_hash(KiCadParser(s).to_lazy_list()), expected)
+        self.assertEqual(
+            structural_hash(KiCadParser(s).to_lazy_list(typed=True)), expected
+        )
+
+    def test_layout_does_not_matter(self):
+        a = KiCadParser('(a (b 1)\n  (c "x y"))').to_lazy_list()
+        b = KiCadParser('(a (b 1) (c "x y"))').to_lazy_list()
+        self.assertEqual(structural_hash(a), structural_hash(b))
+
+    def test_different_trees_hash_different(self):
+        trees = [
+            ["a", "bc"],
+            ["ab", "c"],
+            ["a", ["bc"]],
+            ["a", [], "bc"],
+            ["a", "bc", []],
+            [["a", "bc"]],
+        ]
+        hashes = {structural_hash(tree) for tree in trees}
+        self.assertEqual(len(hashes), len(trees))
+
+    def test_hash_is_kept(self):
+        lazy = KiCadParser("(root (a 1 (b 2)) (c 3))").to_lazy_list()
+        self.assertIsNone(lazy.digest)
+        digest = structural_hash(lazy)
+        self.assertEqual(lazy.digest, digest)
+        self.assertIsNotNone(lazy[1][2].digest)
+
+    def test_change_clears_hashes_up_the_parents(self):
+        lazy = KiCadParser("(root (a 1 (b 2)) (c 3))").to_lazy_list()
+        before = structural_hash(lazy)
+        c_digest = lazy[2].digest
+
+        lazy[1][2][1] = "5"
+
+        self.assertIsNone(lazy[1][2].digest)
+        self.assertIsNone(lazy[1].digest)
+        self.assertIsNone(lazy.digest)
+        self.assertEqual(lazy[2].digest, c_digest)
+
+        after = structural_hash(lazy)
+        self.assertNotEqual(after, before)
+        self.assertEqual(
+            after, structural_hash(["root", ["a", "1", ["b", "5"]], ["c", "3"]])
+        )
+
+        # A second change after hashing again clears them again
+        lazy[1][2][1] = "2"
+        self.assertEqual(structural_hash(lazy), before)
+
+    def test_plain_children_are_not_kept(self):
+        lazy = KiCadParser("(root (a 1))").to_lazy_list()
+        added = ["b", "2"]
+        lazy.append(added)
+        before = structural_hash(lazy)
+        self.assertIsNone(lazy.digest)
+        self.assertIsNotNone(lazy[1].digest)
+
+        # The parent cannot see this change, so nothing may be stale
+        added[1] = "3"
+        self.assertNotEqual(structural_hash(lazy), before)
+
+    def test_group_by_hash(self):
+        schematic = KiCadParser(read_file(SAMPLE_KEYBOARD_SCH_FILENAME)).to_lazy_list()
+        strokes = [
+            e
+            for wire in schematic
+            if wire[0] == "wire"
+            for e in wire
+            if isinstance(e, list) and e[0] == "stroke"
+        ]
+
+        groups = group_by_hash(strokes)
+        self.assertLess(len(groups), len(strokes))
+        self.assertEqual(sum(len(g) for g in groups.values()), len(strokes))
+        for group in groups.values():
+            for node in group:
+                self.assertEqual(node, group[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from kicad_parser import KiCadParser, ScanMode
+from sexp_node import SexpNode
+from tests.helpers import read_file
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+
+
+class TestSexpNode(unittest.TestCase):
+    def test_from_sexp(self):
+        node = SexpNode.from_sexp(["a", "1", ["b", "2"], ["c"]])
+        self.assertEqual(node.head, "a")
+        self.assertEqual(node.children[0], "1")
+        self.assertEqual(node.children[1], SexpNode("b", ("2",)))
+        self.assertEqual(node.children[2], SexpNode("c"))
+
+    def test_headless_lists(self):
+        root = [["a", "1"], "x"]
+        node = SexpNode.from_sexp(root)
+        self.assertIsNone(node.head)
+        self.assertEqual(node.to_sexp(), root)
+        self.assertEqual(SexpNode.from_sexp([]).to_sexp(), [])
+
+    def test_round_trip(self):
+        for name in [SAMPLE_PCB_FILENAME, SAMPLE_KEYBOARD_SCH_FILENAME]:
+            with self.subTest(name=name):
+                root = KiCadParser(read_file(name)).to_list(ScanMode.SLICE)
+                self.assertEqual(SexpNode.from_sexp(root).to_sexp(), root)
+
+    def test_to_nodes_matches_from_sexp(self):
+        s = read_file(SAMPLE_PCB_FILENAME)
+        root = KiCadParser(s).to_list(ScanMode.SLICE)
+        self.assertEqual(KiCadParser(s).to_nodes(), SexpNode.from_sexp(root))
+
+    def test_atoms_are_shared(self):
+        node = KiCadParser("(a (at 0 0) (at 0 1))").to_nodes()
+        first, second = node.children
+        assert isinstance(first, SexpNode) and isinstance(second, SexpNode)
+        self.assertIs(first.head, second.head)
+        self.assertIs(first.children[0], second.children[0])
+        self.assertIs(first.children[1], second.children[0])
+
+    def test_deep_tree_is_not_recursive(self):
+        root = ["leaf"]
+        for _ in range(5000):
+            root = ["node", root]
+        back = SexpNode.from_sexp(root).to_sexp()
+        for _ in range(5000):
+            self.assertEqual(back[0], "node")
+            back = back[1]
+        self.assertEqual(back, ["leaf"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import unittest
+from kicad_parser import KiCadParser, ScanMode
+from kicad_tools import Layer
+from sexp_printer import SexpPrinter
+from tests.helpers import read_file
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME
+
+
+def print_to_string(printer: SexpPrinter, root) -> str:
+    out = io.StringIO()
+    printer.write(root, out)
+    return out.getvalue()
+
+
+class TestSexpPrinter(unittest.TestCase):
+    def test_prints_like_print(self):
+        s = read_file(SAMPLE_KEYBOARD_SCH_FILENAME)
+        root = KiCadParser(s).to_list(ScanMode.SLICE)
+        self.assertEqual(print_to_string(SexpPrinter(), root), repr(root) + "\n")
+
+        lazy = KiCadParser(s).to_lazy_list(typed=True)
+        self.assertEqual(print_to_string(SexpPrinter(), lazy), repr(root) + "\n")
+
+    def test_writes_to_the_current_stdout(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            SexpPrinter().write(["at", "1", "2"])
+        self.assertEqual(out.getvalue(), "['at', '1', '2']\n")
+
+    def test_atoms_print_as_strings(self):
+        root = ["layer", Layer.F_CU]
+        self.assertEqual(
+            print_to_string(SexpPrinter(), root), "['layer', '\"F.Cu\"']\n"
+        )
+
+    def test_max_depth(self):
+        root = ["a", ["b", ["c", "1"]], [], "d"]
+        self.assertEqual(
+            print_to_string(SexpPrinter(max_depth=0), root),
+            "['a', [...], [...], 'd']\n",
+        )
+        self.assertEqual(
+            print_to_string(SexpPrinter(max_depth=1), root),
+            "['a', ['b', [...]], [], 'd']\n",
+        )
+
+    def test_filter_by_head(self):
+        root = ["root", ["a", "1"], ["b", ["a", "2"]], ["a", ["a", "3"]]]
+        self.assertEqual(
+            print_to_string(SexpPrinter(heads=("a",)), root),
+            "['a', '1']\n['a', '2']\n['a', ['a', '3']]\n",
+        )
+
+    def test_filter_by_reference(self):
+        s = read_file(SAMPLE_KEYBOARD_SCH_FILENAME)
+        lazy = KiCadParser(s).to_lazy_list()
+        printer = SexpPrinter(max_depth=0, heads=("symbol",), reference="SW2*")
+        lines = print_to_string(printer, lazy).splitlines()
+
+        self.assertGreater(len(lines), 0)
+        for line in lines:
+            self.assertTrue(line.startswith("['symbol', [...]"))
+
+        placed = [e for e in lazy if e[0] == "symbol"]
+        with_sw2 = [e for e in placed if '"Reference" "SW2' in e.source_text()]
+        self.assertEqual(len(lines), len(with_sw2))
+
+    def test_streams_in_batches(self):
+        writes = []
+
+        class Recorder(io.StringIO):
+            def write(self, s):
+                writes.append(s)
+                return super().write(s)
+
+        root = KiCadParser(read_file(SAMPLE_KEYBOARD_SCH_FILENAME)).to_list()
+        printer = SexpPrinter()
+        printer.FLUSH_PARTS = 64
+        printer.write(root, Recorder())
+        self.assertGreater(len(writes), 10)
+        self.assertEqual("".join(writes), repr(root) + "\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
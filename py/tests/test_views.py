@@ -0,0 +1,168 @@
+import unittest
+from decimal import Decimal
+from kicad_parser import KiCadParser
+from kicad_tools import KicadTool, Layer, QueryRecursionLevel
+from sexptype import makeDecimal
+from tests.helpers import read_tree
+from tests.test_filepaths import SAMPLE_KEYBOARD_SCH_FILENAME, SAMPLE_PCB_FILENAME
+from views import Footprint
+
+
+class TestViews(unittest.TestCase):
+    def test_footprint(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        node = tool.find_footprint_by_reference(pcb, "SW201")
+        fp = tool.view_footprint(node)
+
+        self.assertIs(tool.view_footprint(node), fp)
+        self.assertEqual(fp.reference, "SW201")
+        self.assertEqual(fp.layer, '"F.Cu"')
+        at = tool.find_object_by_atom(node, "at", QueryRecursionLevel.HERE)
+        self.assertEqual(fp.position[:2], (makeDecimal(at[1]), makeDecimal(at[2])))
+
+        value = fp.texts["value"]
+        self.assertEqual(value.kind, "value")
+        self.assertEqual(fp.value, value.text)
+        self.assertIs(
+            value.node,
+            [
+                e
+                for e in tool.find_objects_by_atom(
+                    node, "fp_text", QueryRecursionLevel.DEEP
+                )
+                if e[1] == "value"
+            ][0],
+        )
+
+    def test_every_footprint_matches_searches(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        for node in tool.find_objects_by_atom(
+            pcb, "footprint", QueryRecursionLevel.HERE
+        ):
+            fp = tool.view_footprint(node)
+            for text in tool.find_objects_by_atom(
+                node, "fp_text", QueryRecursionLevel.DEEP
+            ):
+                if text[1] not in ("reference", "value"):
+                    continue
+                layer = tool.find_object_by_atom(
+                    text, "layer", QueryRecursionLevel.DEEP
+                )
+                view = fp.texts[text[1]]
+                self.assertIs(view.node, text)
+                self.assertEqual(view.layer, layer[1])
+                self.assertEqual(view.hidden, "hide" in text)
+            self.assertIs(
+                fp.at, tool.find_object_by_atom(node, "at", QueryRecursionLevel.HERE)
+            )
+
+    def test_writes_go_to_the_tree(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        journal = tool.record_changes(pcb)
+        fp = tool.view_footprint(tool.find_footprint_by_reference(pcb, "SW202"))
+
+        fp.position = (Decimal(1), Decimal(2), Decimal(90))
+        fp.texts["value"].layer = Layer.B_Silkscreen
+        fp.texts["value"].hidden = True
+        fp.texts["value"].hidden = True
+
+        at = tool.find_footprint_at_by_reference(pcb, "SW202")
+        self.assertEqual(at, ["at", "1", "2", "90"])
+        text = tool._get_text_obj_by_type(pcb, "SW202", "value")
+        self.assertEqual(text[-1], "hide")
+        self.assertEqual(text.count("hide"), 1)
+        self.assertEqual(
+            tool.find_object_by_atom(text, "layer", QueryRecursionLevel.HERE)[1],
+            Layer.B_Silkscreen,
+        )
+        self.assertGreater(len(journal), 0)
+
+    def test_view_follows_new_texts(self):
+        pcb = read_tree(SAMPLE_PCB_FILENAME)
+        tool = KicadTool()
+        node = tool.find_footprint_by_reference(pcb, "D201")
+        fp = tool.view_footprint(node)
+        self.assertNotIn("user", fp.texts)
+
+        tool.copy_to_back_silkscreen(pcb, "D201", "reference")
+        fp = tool.view_footprint(node)
+        self.assertIsInstance(fp, Footprint)
+        self.assertEqual(fp.texts["user"].layer, Layer.B_Silkscreen)
+
+    def test_edits_without_an_index(self):
+        footprint = KiCadParser(
+            '(footprint "X" (layer "F.Cu") (at 1 2)'
+            ' (fp_text reference "R1" (at 0 0) (layer "F.SilkS"))'
+            ' (fp_text value "10k" (at 0 1) (layer "F.Fab")))'
+        ).to_list()
+        tool = KicadTool()
+        fp = tool.view_footprint(footprint)
+        reference = fp.texts["reference"]
+        self.assertEqual(fp.value, "10k")
+        self.assertEqual(reference.layer, '"F.SilkS"')
+
+        tool.set_atom(footprint[5], 1, "user")
+        self.assertIsNone(fp.value)
+        self.assertEqual(fp.texts["user"].text, "10k")
+
+        tool.delete_item(reference.node, 4)
+        self.assertIsNone(reference.layer)
+
+        tool.insert_item(footprint, 2, ["at", "5", "6"])
+        self.assertEqual(fp.position, (Decimal(5), Decimal(6), Decimal(0)))
+        self.assertIs(tool.view_footprint(footprint), fp)
+
+    def test_found_fields_are_kept_until_a_change(self):
+        board = KiCadParser(
+            '(kicad_pcb (footprint "X" (layer "F.Cu") (at 1 2)'
+            ' (fp_text reference "R1" (at 0 0) (layer "F.SilkS"))))'
+        ).to_list()
+        tool = KicadTool()
+        footprint = board[1]
+        fp = tool.view_footprint(footprint)
+        texts = fp.texts
+        reference = texts["reference"]
+        self.assertIs(fp.texts, texts)
+        self.assertIs(reference.layer_node, reference.layer_node)
+
+        tool.set_atom(reference.node, 2, '"R2"')
+        self.assertIsNot(fp.texts, texts)
+        self.assertIs(fp.texts["reference"], reference)
+        self.assertEqual(fp.reference, "R2")
+
+        tool.delete_item(board, 1)
+        self.assertEqual(tool.views, {})
+        self.assertEqual(tool.view_parts, {})
+
+    def test_symbol(self):
+        schematic = read_tree(SAMPLE_KEYBOARD_SCH_FILENAME)
+        tool = KicadTool()
+        symbols = tool.find_objects_by_atom(
+            schematic, "symbol", QueryRecursionLevel.HERE
+        )
+        self.assertGreater(len(symbols), 0)
+
+        for symbol in symbols[::20]:
+            sym = tool.view_symbol(symbol)
+            with self.subTest(reference=sym.reference):
+                self.assertEqual(
+                    sym.properties["Value"].node[2],
+                    tool.get_symbol_property(
+                        schematic, sym.reference, "Value", "missing"
+                    ),
+                )
+                self.assertEqual(
+                    sym.lib_id,
+                    tool.find_object_by_atom(
+                        symbol, "lib_id", QueryRecursionLevel.HERE
+                    )[1].strip('"'),
+                )
+                self.assertIn(sym.unit, ("1", "2"))
+                self.assertIsNone(sym.property_text("No such property"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+from decimal import Decimal
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from sexptype import SexpType, SexpTypeValue, makeDecimal, makeText
+
+if TYPE_CHECKING:
+    from kicad_tools import KicadTool
+
+PositionType = Tuple[Decimal, Decimal, Decimal]
+
+
+def _children(node: SexpType, heads: Tuple[str, ...]) -> Dict[str, SexpType]:
+    """The first list directly inside `node` for each of `heads`."""
+    found: Dict[str, SexpType] = {}
+    for e in node:
+        if isinstance(e, list) and len(e) > 0:
+            head = e[0]
+            if head in heads and head not in found:
+                found[head] = e  # type: ignore[index]
+    return found
+
+
+def _position(at: Optional[SexpType]) -> PositionType:
+    if at is None:
+        raise Exception("No at list")
+    rotation = makeDecimal(at[3]) if len(at) > 3 else Decimal(0)
+    return (makeDecimal(at[1]), makeDecimal(at[2]), rotation)
+
+
+def _set_position(tool: "KicadTool", at: Optional[SexpType], value) -> None:
+    if at is None:
+        raise Exception("No at list")
+    while len(at) < 4:
+        tool.insert_item(at, len(at), "0")
+    for i, v in enumerate(value):
+        tool.set_atom(at, i + 1, str(v))
+
+
+class TextItem:
+    """
+    A (fp_text kind "text" ...) of a footprint, or a (property "Name"
+    "text" ...) of a symbol, with its at and layer lists found once and
+    kept until the tool changes the node.  Atoms are always read from the
+    tree, and changes are made through the tool, so its indexes and
+    journal see them.
+    """
+
+    HEADS = ("at", "layer")
+
+    def __init__(self, node: SexpType, tool: "KicadTool", owner: "NodeView"):
+        self.node = node
+        self.tool = tool
+        self.owner = owner
+        self._children: Optional[Dict[str, SexpType]] = None
+
+    def forget(self) -> None:
+        """Drops the lists found so far; the tool calls this on a change."""
+        self._children = None
+
+    def _child(self, head: str) -> Optional[SexpType]:
+        children = self._children
+        if children is None:
+            children = self._children = _children(self.node, self.HEADS)
+        return children.get(head)
+
+    @property
+    def at(self) -> Optional[SexpType]:
+        return self._child("at")
+
+    @property
+    def layer_node(self) -> Optional[SexpType]:
+        return self._child("layer")
+
+    @property
+    def kind(self) -> str:
+        """reference, value or user for a text, the name for a property."""
+        return makeText(self.node[1])
+
+    @property
+    def text(self) -> str:
+        return makeText(self.node[2])
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.tool.set_atom(self.node, 2, '"' + value + '"')
+
+    @property
+    def layer(self) -> Optional[SexpTypeValue]:
+        node = self.layer_node
+        return None if node is None else node[1]
+
+    @layer.setter
+    def layer(self, value: str) -> None:
+        node = self.layer_node
+        if node is None:
+            raise Exception(f"{self.kind} has no layer")
+        self.tool.set_atom(node, 1, value)
+
+    @property
+    def hidden(self) -> bool:
+        return "hide" in self.node
+
+    @hidden.setter
+    def hidden(self, value: bool) -> None:
+        # A hide atom is moved to the end, where KiCad writes it
+        if value and self.node[-1] == "hide":
+            return
+        if "hide" in self.node:
+            self.tool.delete_item(self.node, self.node.index("hide"))
+        if value:
+            self.tool.insert_item(self.node, len(self.node), "hide")
+
+    @property
+    def position(self) -> PositionType:
+        return _position(self.at)
+
+    @position.setter
+    def position(self, value: PositionType) -> None:
+        _set_position(self.tool, self.at, value)
+
+
+class NodeView:
+    """
+    What Footprint and SchematicSymbol share: the lists of HEADS and the
+    ITEMS lists directly inside the node, each found in one look at its
+    children and kept until KicadTool changes the node or one of the
+    items, when it calls forget().
+    """
+
+    HEADS: Tuple[str, ...] = ()
+    ITEMS = ""
+
+    def __init__(self, node: SexpType, tool: "KicadTool"):
+        self.node = node
+        self.tool = tool
+        self._children: Optional[Dict[str, SexpType]] = None
+        self._items: Optional[Dict[str, TextItem]] = None
+
+    def forget(self) -> None:
+        self._children = None
+        self._items = None
+
+    def drop(self) -> None:
+        """Forgets the node's items too, once it has left the tree."""
+        for item in self._by_name().values():
+            self.tool.view_parts.pop(id(item.node), None)
+        self.forget()
+
+    def _child(self, head: str) -> Optional[SexpType]:
+        children = self._children
+        if children is None:
+            children = self._children = _children(self.node, self.HEADS)
+        return children.get(head)
+
+    def _by_name(self) -> Dict[str, TextItem]:
+        """The ITEMS lists by name, the first one winning."""
+        items = self._items
+        if items is not None:
+            return items
+        items = self._items = {}
+        # One TextItem per list for as long as the tool has the view, so
+        # one kept by a caller hears of changes too
+        parts = self.tool.view_parts
+        for e in self.node:
+            if isinstance(e, list) and len(e) > 2 and e[0] == self.ITEMS:
+                name = makeText(e[1])
+                if name not in items:
+                    item = parts.get(id(e))
+                    if item is None or item.node is not e:
+                        item = parts[id(e)] = TextItem(e, self.tool, self)
+                    items[name] = item
+        return items
+
+    @property
+    def at(self) -> Optional[SexpType]:
+        return self._child("at")
+
+    @property
+    def position(self) -> PositionType:
+        return _position(self.at)
+
+    @position.setter
+    def position(self, value: PositionType) -> None:
+        _set_position(self.tool, self.at, value)
+
+
+class Footprint(NodeView):
+    """
+    A footprint of a board, with its at, layer and texts found in one look
+    at its children.  fp.texts["value"].layer = Layer.F_Silkscreen moves
+    the value text, fp.position = (x, y, rotation) the footprint itself.
+
+    Get one from KicadTool.view_footprint, which keeps it, and forgets
+    what it found whenever the tool changes the footprint or a text.
+    """
+
+    HEADS = ("at", "layer")
+    ITEMS = "fp_text"
+
+    @property
+    def texts(self) -> Dict[str, TextItem]:
+        """By kind; the first one wins, as in the searches this replaces."""
+        return self._by_name()
+
+    @property
+    def layer_node(self) -> Optional[SexpType]:
+        return self._child("layer")
+
+    @property
+    def reference(self) -> Optional[str]:
+        text = self.texts.get("reference")
+        return None if text is None else text.text
+
+    @property
+    def value(self) -> Optional[str]:
+        text = self.texts.get("value")
+        return None if text is None else text.text
+
+    @property
+    def layer(self) -> Optional[SexpTypeValue]:
+        node = self.layer_node
+        return None if node is None else node[1]
+
+
+class SchematicSymbol(NodeView):
+    """
+    A symbol placed on a schematic, with its properties by name, so
+    sym.properties["Value"].text is its value.  Like Footprint, get one
+    from KicadTool.view_symbol.
+    """
+
+    HEADS = ("at", "lib_id", "unit")
+    ITEMS = "property"
+
+    @property
+    def properties(self) -> Dict[str, TextItem]:
+        return self._by_name()
+
+    def property_text(self, name: str) -> Optional[str]:
+        """The text of property `name`, or None if there is none."""
+        item = self.properties.get(name)
+        return None if item is None else item.text
+
+    @property
+    def reference(self) -> Optional[str]:
+        return self.property_text("Reference")
+
+    @property
+    def value(self) -> Optional[str]:
+        return self.property_text("Value")
+
+    @property
+    def lib_id(self) -> Optional[str]:
+        node = self._child("lib_id")
+        return None if node is None else makeText(node[1])
+
+    @property
+    def unit(self) -> Optional[str]:
+        node = self._child("unit")
+        return None if node is None else makeText(node[1])